@@ -38,6 +38,10 @@ class UserSerializerForLike(UserSerializerWithProfile):
     pass
 
 
+class UserSerializerForNotification(UserSerializerWithProfile):
+    pass
+
+
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField()
@@ -16,6 +16,7 @@ class AccountApiTests(TestCase):
 
     def setUp(self):
         # setUp() function would be executed before each test function starts
+        self.clear_cache()
         self.client = APIClient()
         self.user = self.create_user(
             username='admin',
@@ -136,6 +137,9 @@ class AccountApiTests(TestCase):
 
 class UserProfileAPITests(TestCase):
 
+    def setUp(self):
+        self.clear_cache()
+
     def test_update(self):
         hanyuan, hanyuan_client = self.create_user_and_client('hanyuan')
         p = hanyuan.profile
@@ -0,0 +1,9 @@
+def invalidate_profile_cache(sender, instance, **kwargs):
+    # import inside the function to avoid circular import
+    from accounts.services import UserService
+    UserService.invalidate_profile(instance.user_id)
+
+
+def invalidate_user_cache(sender, instance, **kwargs):
+    from accounts.services import UserService
+    UserService.invalidate_user(instance.id)
@@ -1,5 +1,8 @@
+from accounts.listeners import invalidate_profile_cache, invalidate_user_cache
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from utils.listeners import add_existing_id, remove_existing_id
 
 
 class UserProfile(models.Model):
@@ -13,11 +16,22 @@ class UserProfile(models.Model):
         return '{} {}'.format(self.user, self.nickname)
 
 def get_profile(user):
+    # import inside the function to avoid circular import
+    from accounts.services import UserService
+
     if hasattr(user, '_cached_user_profile'):
         return getattr(user, '_cached_user_profile')
-    profile, _ = UserProfile.objects.get_or_create(user=user)
+    profile = UserService.get_profile_through_cache(user.id)
 
     setattr(user, '_cached_user_profile', profile)
     return profile
 
-User.profile = property(get_profile)
\ No newline at end of file
+User.profile = property(get_profile)
+
+
+post_save.connect(invalidate_profile_cache, sender=UserProfile)
+post_delete.connect(invalidate_profile_cache, sender=UserProfile)
+post_save.connect(invalidate_user_cache, sender=User)
+post_delete.connect(invalidate_user_cache, sender=User)
+post_save.connect(add_existing_id, sender=User)
+post_delete.connect(remove_existing_id, sender=User)
@@ -0,0 +1,144 @@
+from accounts.models import UserProfile
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from twitter.cache import USER_PATTERN, USER_PROFILE_PATTERN
+
+cache = caches['default']
+local_cache = caches['local']
+
+
+class UserService(object):
+    # the only columns of User read by the serializers. The cached users are
+    # loaded with these only, so password hashes and emails never leave the
+    # database. Other columns are still loaded on access, with a query.
+    CACHED_USER_FIELDS = ('id', 'username')
+
+    @classmethod
+    def get_profile_through_cache(cls, user_id):
+        key = USER_PROFILE_PATTERN.format(user_id=user_id)
+        profile = cache.get(key)
+        if profile is not None:
+            return profile
+        # the profile is created the first time it is used
+        profile, _ = UserProfile.objects.get_or_create(user_id=user_id)
+        cache.set(key, profile)
+        return profile
+
+    @classmethod
+    def get_profiles(cls, user_ids):
+        """
+        Return {user_id: profile} of the users who have a profile. The cached
+        ones are read with one get_many, the others with one IN query.
+        """
+        keys = {
+            user_id: USER_PROFILE_PATTERN.format(user_id=user_id)
+            for user_id in user_ids
+        }
+        profiles = cls._get_many(cache, keys)
+        missing_user_ids = [
+            user_id for user_id in keys if user_id not in profiles
+        ]
+        if not missing_user_ids:
+            return profiles
+
+        loaded_profiles = {
+            profile.user_id: profile
+            for profile in UserProfile.objects.filter(user_id__in=missing_user_ids)
+        }
+        cache.set_many({
+            keys[user_id]: profile
+            for user_id, profile in loaded_profiles.items()
+        })
+        profiles.update(loaded_profiles)
+        return profiles
+
+    @classmethod
+    def invalidate_profile(cls, user_id):
+        cache.delete(USER_PROFILE_PATTERN.format(user_id=user_id))
+
+    @classmethod
+    def get_users_by_ids(cls, user_ids):
+        """
+        Return {user_id: user}. Users are read from the local cache of the
+        process first, then from the shared cache with one get_many, and the
+        rest from database with one IN query. Only CACHED_USER_FIELDS of the
+        users are loaded.
+        """
+        keys = {
+            user_id: USER_PATTERN.format(user_id=user_id)
+            for user_id in set(user_ids)
+        }
+        users = cls._get_many(local_cache, keys)
+
+        missing_keys = {
+            user_id: key for user_id, key in keys.items() if user_id not in users
+        }
+        shared_users = cls._get_many(cache, missing_keys)
+        local_cache.set_many({
+            keys[user_id]: user for user_id, user in shared_users.items()
+        })
+        users.update(shared_users)
+
+        missing_ids = [user_id for user_id in missing_keys if user_id not in users]
+        if missing_ids:
+            loaded_users = User.objects.only(
+                *cls.CACHED_USER_FIELDS,
+            ).in_bulk(missing_ids)
+            data = {keys[user_id]: user for user_id, user in loaded_users.items()}
+            cache.set_many(data)
+            local_cache.set_many(data)
+            users.update(loaded_users)
+        return users
+
+    @classmethod
+    def _get_many(cls, backend, keys):
+        if not keys:
+            return {}
+        cached_objects = backend.get_many(keys.values())
+        return {
+            object_id: cached_objects[key]
+            for object_id, key in keys.items()
+            if key in cached_objects
+        }
+
+    @classmethod
+    def invalidate_user(cls, user_id):
+        # the local caches of the other processes expire by themselves
+        key = USER_PATTERN.format(user_id=user_id)
+        cache.delete(key)
+        local_cache.delete(key)
+
+    @classmethod
+    def get_users_with_profiles(cls, user_ids):
+        """
+        Same as get_users_by_ids, with the profiles of the users loaded too,
+        so that user.profile does not query them one by one.
+        """
+        users = cls.get_users_by_ids(user_ids)
+        profiles = cls.get_profiles(users.keys())
+        for user_id, user in users.items():
+            # same cache used by User.profile, see accounts/models.py. Users
+            # without a profile yet are left to get_profile to create one.
+            if user_id in profiles:
+                setattr(user, '_cached_user_profile', profiles[user_id])
+        return users
+
+    @classmethod
+    def preload_users(cls, objects, field_name='user'):
+        """
+        Load the users of the objects (e.g. tweet.user) and their profiles
+        with one IN query each, instead of 2 queries per object when they are
+        serialized one by one.
+        """
+        user_ids = {
+            getattr(obj, field_name + '_id')
+            for obj in objects
+        } - {None}
+        if not user_ids:
+            return
+
+        users = cls.get_users_with_profiles(user_ids)
+        for obj in objects:
+            user = users.get(getattr(obj, field_name + '_id'))
+            if user is not None:
+                setattr(obj, field_name, user)
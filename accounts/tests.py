@@ -1,12 +1,86 @@
 from accounts.models import UserProfile
+from accounts.services import UserService
+from django.contrib.auth.models import User
+from django.core.cache import caches
 from testing.testcases import TestCase
+from twitter.cache import USER_PATTERN
 
 
 class UserProfileTests(TestCase):
 
+    def setUp(self):
+        self.clear_cache()
+
     def test_profile_property(self):
         hanyuan = self.create_user('hanyuan')
         self.assertEqual(UserProfile.objects.count(), 0)
         p = hanyuan.profile
         self.assertEqual(isinstance(p, UserProfile), True)
-        self.assertEqual(UserProfile.objects.count(), 1)
\ No newline at end of file
+        self.assertEqual(UserProfile.objects.count(), 1)
+    def test_profile_cache(self):
+        hanyuan = self.create_user('hanyuan')
+        eric = self.create_user('eric')
+        profile = hanyuan.profile
+        profile.nickname = 'hy'
+        profile.save()
+
+        # saving invalidates the cached profile, the next read caches it again
+        User.objects.get(id=hanyuan.id).profile
+        # a new User instance reads the profile from cache
+        user = User.objects.get(id=hanyuan.id)
+        with self.assertNoQueries():
+            self.assertEqual(user.profile.nickname, 'hy')
+            self.assertEqual(UserService.get_profiles([hanyuan.id])[hanyuan.id].id, profile.id)
+
+        # profiles not in cache are loaded in bulk, users without a profile
+        # are skipped
+        self.clear_cache()
+        with self.assertNumQueries(1):
+            profiles = UserService.get_profiles([hanyuan.id, eric.id])
+        self.assertEqual(list(profiles.keys()), [hanyuan.id])
+        with self.assertNoQueries():
+            UserService.get_profiles([hanyuan.id])
+
+        # updating the profile invalidates the cache
+        profile.nickname = 'hanyuan'
+        profile.save()
+        user = User.objects.get(id=hanyuan.id)
+        self.assertEqual(user.profile.nickname, 'hanyuan')
+
+
+class UserServiceTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.hanyuan = self.create_user('hanyuan')
+        self.eric = self.create_user('eric')
+
+    def test_get_users_by_ids(self):
+        user_ids = [self.hanyuan.id, self.eric.id]
+        with self.assertNumQueries(1):
+            users = UserService.get_users_by_ids(user_ids)
+        self.assertEqual(users[self.eric.id].username, 'eric')
+        with self.assertNoQueries():
+            users = UserService.get_users_by_ids(user_ids)
+        self.assertEqual(users[self.hanyuan.id].username, 'hanyuan')
+
+        # the local cache is filled in from the shared cache
+        caches['local'].clear()
+        with self.assertNoQueries():
+            UserService.get_users_by_ids(user_ids)
+        self.assertEqual(
+            caches['local'].get(USER_PATTERN.format(user_id=self.eric.id)).id,
+            self.eric.id,
+        )
+
+        # nothing but the serialized fields is cached
+        cached_user = caches['default'].get(USER_PATTERN.format(user_id=self.eric.id))
+        self.assertNotIn('password', cached_user.__dict__)
+        self.assertNotIn('email', cached_user.__dict__)
+
+        # saving the user invalidates the cache
+        self.eric.username = 'eric_updated'
+        self.eric.save()
+        users = UserService.get_users_by_ids(user_ids)
+        self.assertEqual(users[self.eric.id].username, 'eric_updated')
+        self.assertEqual(UserService.get_users_by_ids([0]), {})
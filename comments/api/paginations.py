@@ -0,0 +1,69 @@
+from comments.constants import COMMENT_PAGE_SIZE
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from utils.paginations import encode_cursor, filter_after_cursor
+
+
+class CommentPagination(BasePagination):
+    # https:// .../api/comments/?tweet_id=1&cursor=xxx&size=10
+    # comments are listed oldest first, paginated by keyset on
+    # (created_at, id), served by the (tweet, created_at) index
+    page_size = COMMENT_PAGE_SIZE
+    page_size_query_param = 'size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+
+    def __init__(self):
+        super(CommentPagination, self).__init__()
+        self.has_next_page = False
+        self.comments = []
+
+    def to_html(self):
+        pass
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def is_first_page(self, request):
+        # the first page of the default size is the one cached
+        return self.cursor_query_param not in request.query_params and \
+            self.get_page_size(request) == self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if self.cursor_query_param in request.query_params:
+            queryset = filter_after_cursor(
+                queryset,
+                request.query_params[self.cursor_query_param],
+            )
+        comments = list(queryset.order_by('created_at', 'id')[:page_size + 1])
+        return self.paginate_ordered_list(comments, request)
+
+    def paginate_ordered_list(self, ordered_list, request):
+        """
+        Same as paginate_queryset, on the comments of the page and the one
+        after it, sorted by (created_at, id)
+        """
+        page_size = self.get_page_size(request)
+        self.has_next_page = len(ordered_list) > page_size
+        self.comments = ordered_list[:page_size]
+        return self.comments
+
+    def get_next_cursor(self):
+        if not self.has_next_page:
+            return None
+        last = self.comments[-1]
+        return encode_cursor(last.created_at, last.id)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'has_next_page': self.has_next_page,
+            'next_cursor': self.get_next_cursor(),
+            'comments': data,
+        })
@@ -1,9 +1,37 @@
 from accounts.api.serializers import UserSerializerForComment
+from accounts.services import UserService
 from comments.models import Comment
+from django.db.models import Manager
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from tweets.models import Tweet
+from utils.existence import ExistenceService
 from likes.services import LikeService
+from utils.redis_counters import RedisCounter
+
+
+class CommentListSerializer(serializers.ListSerializer):
+    """
+    Used by CommentSerializer(many=True). Loads the likes and users of all the
+    comments in bulk before serializing them.
+    """
+
+    def to_representation(self, data):
+        comments = list(data.all() if isinstance(data, Manager) else data)
+        comment_ids = [comment.id for comment in comments]
+        user = self.context['request'].user
+
+        UserService.preload_users(comments)
+        likes_counts = RedisCounter.get_counts(comments, 'likes_count')
+        liked_comment_ids = LikeService.get_liked_object_ids(
+            user,
+            Comment,
+            comment_ids,
+        )
+        for comment in comments:
+            setattr(comment, '_cached_likes_count', likes_counts[comment.id])
+            setattr(comment, '_cached_has_liked', comment.id in liked_comment_ids)
+        return super(CommentListSerializer, self).to_representation(comments)
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -22,14 +50,27 @@ class CommentSerializer(serializers.ModelSerializer):
             'likes_count',
             'has_liked',
         )
+        list_serializer_class = CommentListSerializer
 
+    # the _cached_* attributes are filled in by CommentListSerializer
     def get_likes_count(self, obj):
-        return obj.like_set.count()
+        if hasattr(obj, '_cached_likes_count'):
+            return obj._cached_likes_count
+        return RedisCounter.get_count(obj, 'likes_count')
 
     def get_has_liked(self, obj):
+        if hasattr(obj, '_cached_has_liked'):
+            return obj._cached_has_liked
         return LikeService.has_liked(self.context['request'].user, obj)
 
 
+class CommentSerializerForNotification(serializers.ModelSerializer):
+
+    class Meta:
+        model = Comment
+        fields = ('id', 'tweet_id', 'user_id', 'content', 'created_at')
+
+
 class CommentSerializerForCreate(serializers.ModelSerializer):
     # These 2 param must be added manually
     # because by default ModelSerializer includes only user and tweet, not
@@ -43,7 +84,7 @@ class CommentSerializerForCreate(serializers.ModelSerializer):
 
     def validate(self, data):
         tweet_id = data['tweet_id']
-        if not Tweet.objects.filter(id=tweet_id).exists():
+        if not ExistenceService.exists(Tweet, tweet_id):
             raise ValidationError({'message': 'tweet does not exist'})
         # must return validated data
         # which is input data after validation and being dealt with
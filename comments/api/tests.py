@@ -1,3 +1,4 @@
+from comments.constants import COMMENT_PAGE_SIZE
 from comments.models import Comment
 from django.utils import timezone
 from rest_framework.test import APIClient
@@ -12,6 +13,7 @@ NEWSFEED_LIST_API = '/api/newsfeeds/'
 class CommentApiTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.hanyuan = self.create_user('hanyuan')
         self.hanyuan_client = APIClient()
         self.hanyuan_client.force_authenticate(self.hanyuan)
@@ -141,6 +143,74 @@ class CommentApiTests(TestCase):
         })
         self.assertEqual(len(response.data['comments']), 2)
 
+    def test_list_pagination(self):
+        comments = [
+            self.create_comment(self.eric, self.tweet, str(i))
+            for i in range(COMMENT_PAGE_SIZE * 2 + 1)
+        ]
+        self.create_like(self.hanyuan, comments[1])
+
+        # the first page is cached
+        response = self.hanyuan_client.get(COMMENT_URL, {'tweet_id': self.tweet.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [comment['id'] for comment in response.data['comments']],
+            [comment.id for comment in comments[:COMMENT_PAGE_SIZE]],
+        )
+        self.assertEqual(response.data['comments'][1]['has_liked'], True)
+        self.assertEqual(response.data['comments'][1]['likes_count'], 1)
+        with self.assertNoQueries():
+            response = self.anonymous_client.get(
+                COMMENT_URL,
+                {'tweet_id': self.tweet.id},
+            )
+        self.assertEqual(len(response.data['comments']), COMMENT_PAGE_SIZE)
+        # has_liked of the current user is still read from the like shards
+        with self.assertNumQueries(0):
+            response = self.hanyuan_client.get(
+                COMMENT_URL,
+                {'tweet_id': self.tweet.id},
+            )
+        self.assertEqual(response.data['comments'][1]['has_liked'], True)
+
+        # next pages
+        response = self.anonymous_client.get(COMMENT_URL, {
+            'tweet_id': self.tweet.id,
+            'cursor': response.data['next_cursor'],
+        })
+        self.assertEqual(
+            [comment['id'] for comment in response.data['comments']],
+            [comment.id for comment in comments[COMMENT_PAGE_SIZE:COMMENT_PAGE_SIZE * 2]],
+        )
+        response = self.anonymous_client.get(COMMENT_URL, {
+            'tweet_id': self.tweet.id,
+            'cursor': response.data['next_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(response.data['next_cursor'], None)
+        self.assertEqual(response.data['comments'][0]['id'], comments[-1].id)
+
+        response = self.anonymous_client.get(COMMENT_URL, {
+            'tweet_id': self.tweet.id,
+            'size': 5,
+        })
+        self.assertEqual(len(response.data['comments']), 5)
+        response = self.anonymous_client.get(COMMENT_URL, {
+            'tweet_id': self.tweet.id,
+            'cursor': 'invalid',
+        })
+        self.assertEqual(response.status_code, 404)
+
+        # the cached first page is invalidated by changes of the comments
+        self.eric_client.delete('{}{}/'.format(COMMENT_URL, comments[0].id))
+        self.eric_client.put('{}{}/'.format(COMMENT_URL, comments[1].id), {
+            'content': 'updated',
+        })
+        response = self.anonymous_client.get(COMMENT_URL, {'tweet_id': self.tweet.id})
+        self.assertEqual(response.data['comments'][0]['id'], comments[1].id)
+        self.assertEqual(response.data['comments'][0]['content'], 'updated')
+        self.assertEqual(response.data['comments'][0]['likes_count'], 1)
 
     def test_comments_count(self):
         # test tweet detail api
@@ -1,7 +1,9 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from comments.api.paginations import CommentPagination
 from comments.models import Comment
+from comments.services import CommentService
 from comments.api.serializers import (
     CommentSerializer,
     CommentSerializerForCreate,
@@ -22,6 +24,7 @@ class CommentViewSet(viewsets.GenericViewSet):
     serializer_class = CommentSerializerForCreate
     queryset = Comment.objects.all()
     filterset_fields = ('tweet_id',)
+    pagination_class = CommentPagination
 
     # methods
     # POST /api/comments/ -> create
@@ -43,24 +46,25 @@ class CommentViewSet(viewsets.GenericViewSet):
 
     @required_params(params=['tweet_id'])
     def list(self, request, *args, **kwargs):
-        # tweet_id = request.query_params['tweet_id']
-        # comments = Comment.objects.filter(tweet_id=tweet_id)
-        # serializer = CommentSerializer(comments, many=True)
-        # return ...
-        queryset = self.get_queryset()
-        # Here use prefetch_related('user') to reduce sql queries
-        comments = self.filter_queryset(queryset)\
-            .prefetch_related('user')\
-            .order_by('created_at')
+        # GET /api/comments/?tweet_id=1&cursor=xxx
+        # comments are paginated oldest first, the first page is cached.
+        # The users, likes counts and has_liked of the page are loaded in
+        # bulk by CommentListSerializer.
+        tweet_id = request.query_params['tweet_id']
+        if tweet_id.isdigit() and self.paginator.is_first_page(request):
+            comments = self.paginator.paginate_ordered_list(
+                CommentService.get_first_page(int(tweet_id)),
+                request,
+            )
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+            comments = self.paginate_queryset(queryset)
         serializer = CommentSerializer(
             comments,
             context={'request': request},
             many=True,
         )
-        return Response(
-            {'comments': serializer.data},
-            status=status.HTTP_200_OK,
-        )
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         data = {
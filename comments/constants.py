@@ -0,0 +1,2 @@
+# comments per page of /api/comments/, the first page of a tweet is cached
+COMMENT_PAGE_SIZE = 20
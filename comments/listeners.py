@@ -0,0 +1,26 @@
+from utils.redis_counters import RedisCounter
+
+
+def incr_comments_count(sender, instance, created, **kwargs):
+    if not created or instance.tweet_id is None:
+        return
+
+    # import inside the function to avoid circular import
+    from tweets.models import Tweet
+    RedisCounter.incr(Tweet, 'comments_count', instance.tweet_id)
+
+
+def invalidate_first_page(sender, instance, **kwargs):
+    if instance.tweet_id is None:
+        return
+
+    from comments.services import CommentService
+    CommentService.invalidate_first_page(instance.tweet_id)
+
+
+def decr_comments_count(sender, instance, **kwargs):
+    if instance.tweet_id is None:
+        return
+
+    from tweets.models import Tweet
+    RedisCounter.decr(Tweet, 'comments_count', instance.tweet_id)
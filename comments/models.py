@@ -1,8 +1,14 @@
+from comments.listeners import (
+    decr_comments_count,
+    incr_comments_count,
+    invalidate_first_page,
+)
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from tweets.models import Tweet
-from likes.models import Like
-from django.contrib.contenttypes.models import ContentType
+from utils.listeners import add_existing_id, remove_existing_id
+from likes.services import LikeService
 
 
 class Comment(models.Model):
@@ -22,6 +28,9 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # denormalized counter of likes
+    likes_count = models.IntegerField(default=0, null=True)
+
     class Meta:
         # query of sorted-by-time comments under a certain tweet
         index_together = (('tweet', 'created_at'),)
@@ -36,7 +45,12 @@ class Comment(models.Model):
 
     @property
     def like_set(self):
-        return Like.objects.filter(
-            content_type=ContentType.objects.get_for_model(Comment),
-            object_id=self.id,
-        ).order_by('-created_at')
\ No newline at end of file
+        return LikeService.get_likes(Comment, self.id)
+
+
+post_save.connect(incr_comments_count, sender=Comment)
+post_delete.connect(decr_comments_count, sender=Comment)
+post_save.connect(invalidate_first_page, sender=Comment)
+post_delete.connect(invalidate_first_page, sender=Comment)
+post_save.connect(add_existing_id, sender=Comment)
+post_delete.connect(remove_existing_id, sender=Comment)
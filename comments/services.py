@@ -0,0 +1,34 @@
+from comments.constants import COMMENT_PAGE_SIZE
+from comments.models import Comment
+from django.core.cache import caches
+from twitter.cache import TWEET_COMMENTS_FIRST_PAGE_PATTERN
+
+cache = caches['default']
+
+
+class CommentService(object):
+
+    @classmethod
+    def get_first_page(cls, tweet_id):
+        """
+        The oldest COMMENT_PAGE_SIZE + 1 comments of the tweet, the extra one
+        tells if there is a next page. Most readers never scroll past the
+        first page, so it is cached until a comment of the tweet is changed.
+        """
+        key = TWEET_COMMENTS_FIRST_PAGE_PATTERN.format(tweet_id=tweet_id)
+        comments = cache.get(key)
+        # the likes_count columns of the cached comments may be older than the
+        # last counter flush, the serializer reads the counters from redis
+        if comments is not None:
+            return comments
+
+        comments = list(
+            Comment.objects.filter(tweet_id=tweet_id)
+            .order_by('created_at', 'id')[:COMMENT_PAGE_SIZE + 1]
+        )
+        cache.set(key, comments)
+        return comments
+
+    @classmethod
+    def invalidate_first_page(cls, tweet_id):
+        cache.delete(TWEET_COMMENTS_FIRST_PAGE_PATTERN.format(tweet_id=tweet_id))
@@ -4,6 +4,7 @@ from testing.testcases import TestCase
 class CommentModelTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.hanyuan = self.create_user('hanyuan')
         self.tweet = self.create_tweet(self.hanyuan)
         self.comment = self.create_comment(self.hanyuan, self.tweet)
@@ -1,5 +1,6 @@
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from utils.paginations import encode_cursor, filter_before_cursor
 
 
 class FriendshipPagination(PageNumberPagination):
@@ -9,11 +10,67 @@ class FriendshipPagination(PageNumberPagination):
     page_size_query_param = 'size'
     max_page_size = 20
 
+    # https:// .../api/friendships/1/followers/?pagination=cursor&size=10
+    # https:// .../api/friendships/1/followers/?cursor=xxx&size=10
+    # opt-in keyset pagination on (created_at, id). No COUNT(*) and no OFFSET
+    # scan, deep pages are as fast as the first one. Page numbers are still
+    # the default.
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    # ?with_total=1 adds an approximate total_results read from the cached
+    # counters, see FriendshipViewSet.get_approximate_total
+    total_query_param = 'with_total'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        params = request.query_params
+        self.use_page_number = self.cursor_query_param not in params and \
+            params.get(self.mode_query_param) != self.cursor_mode
+        if self.use_page_number:
+            return super(FriendshipPagination, self).paginate_queryset(
+                queryset,
+                request,
+                view,
+            )
+
+        page_size = self.get_page_size(request)
+        if self.cursor_query_param in request.query_params:
+            queryset = filter_before_cursor(
+                queryset,
+                request.query_params[self.cursor_query_param],
+            )
+        friendships = list(
+            queryset.order_by('-created_at', '-id')[:page_size + 1]
+        )
+        self.has_next_page = len(friendships) > page_size
+        self.friendships = friendships[:page_size]
+        return self.friendships
+
+    def get_next_cursor(self):
+        if not self.has_next_page:
+            return None
+        last = self.friendships[-1]
+        return encode_cursor(last.created_at, last.id)
+
     def get_paginated_response(self, data):
-        return Response({
-            'total_results': self.page.paginator.count,
-            'total_pages': self.page.paginator.num_pages,
-            'page_number': self.page.number,
-            'has_next_page': self.page.has_next(),
+        if self.use_page_number:
+            return Response({
+                'total_results': self.page.paginator.count,
+                'total_pages': self.page.paginator.num_pages,
+                'page_number': self.page.number,
+                'has_next_page': self.page.has_next(),
+                'results': data,
+            })
+
+        response = {
+            'has_next_page': self.has_next_page,
+            'next_cursor': self.get_next_cursor(),
             'results': data,
-        })
\ No newline at end of file
+        }
+        with_total = self.request.query_params.get(self.total_query_param)
+        if with_total in ('1', 'true') and \
+                hasattr(self.view, 'get_approximate_total'):
+            response['total_results'] = self.view.get_approximate_total()
+        return Response(response)
@@ -4,6 +4,16 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
 from friendships.services import FriendshipService
+from utils.existence import ExistenceService
+
+def _has_followed(context, user):
+    # followed_user_ids is resolved for a whole page by FriendshipViewSet
+    if 'followed_user_ids' in context:
+        return user.id in context['followed_user_ids']
+    if context['request'].user.is_anonymous:
+        return False
+    return FriendshipService.has_followed(context['request'].user, user)
+
 
 # source=xxx to get xxx method from model instance(here the model instance
 # is Friendship)
@@ -19,9 +29,7 @@ class FollowerSerializer(serializers.ModelSerializer):
         fields = ('user', 'created_at', 'has_followed')
 
     def get_has_followed(self, obj):
-        if self.context['request'].user.is_anonymous:
-            return False
-        return FriendshipService.has_followed(self.context['request'].user, obj.from_user)
+        return _has_followed(self.context, obj.from_user)
 
 
 class FollowingSerializer(serializers.ModelSerializer):
@@ -34,9 +42,7 @@ class FollowingSerializer(serializers.ModelSerializer):
         fields = ('user', 'created_at', 'has_followed')
 
     def get_has_followed(self, obj):
-        if self.context['request'].user.is_anonymous:
-            return False
-        return FriendshipService.has_followed(self.context['request'].user, obj.to_user)
+        return _has_followed(self.context, obj.to_user)
 
 
 class FriendshipSerializerForCreate(serializers.ModelSerializer):
@@ -52,7 +58,7 @@ class FriendshipSerializerForCreate(serializers.ModelSerializer):
             raise ValidationError({
                 'message': 'You can not follow yourself.',
             })
-        if not User.objects.filter(id=attrs['to_user_id']).exists():
+        if not ExistenceService.exists(User, attrs['to_user_id']):
             raise ValidationError({
                 'message': 'You can not follow a non-exist user.',
             })
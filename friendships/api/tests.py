@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from friendships.models import Friendship
 from rest_framework.test import APIClient
 from testing.testcases import TestCase
@@ -12,6 +14,7 @@ FOLLOWINGS_URL = '/api/friendships/{}/followings/'
 class FriendshipApiTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         # create
         self.hanyuan = self.create_user('hanyuan')
         self.hanyuan_client = APIClient()
@@ -190,6 +193,87 @@ class FriendshipApiTests(TestCase):
         for result in response.data['results']:
             self.assertEqual(result['has_followed'], True)
 
+    def test_followers_queries_do_not_grow_with_page_size(self):
+        def count_followers_queries(user):
+            # the first request creates the missing profiles of the users
+            self.eric_client.get(FOLLOWERS_URL.format(user.id))
+            with CaptureQueriesContext(connection) as context:
+                response = self.eric_client.get(FOLLOWERS_URL.format(user.id))
+            self.assertEqual(response.status_code, 200)
+            return len(context.captured_queries), response
+
+        lonely = self.create_user('lonely')
+        Friendship.objects.create(from_user=self.hanyuan, to_user=lonely)
+        one_follower_queries, _ = count_followers_queries(lonely)
+
+        page_size = FriendshipPagination.page_size
+        for i in range(page_size):
+            follower = self.create_user('hanyuan_follower{}'.format(i))
+            Friendship.objects.create(from_user=follower, to_user=self.hanyuan)
+            if i % 2 == 0:
+                Friendship.objects.create(from_user=self.eric, to_user=follower)
+        many_followers_queries, response = count_followers_queries(self.hanyuan)
+        self.assertEqual(many_followers_queries, one_follower_queries)
+        self.assertEqual(len(response.data['results']), page_size)
+        for result in response.data['results']:
+            has_followed = result['user']['username'].endswith(
+                ('0', '2', '4', '6', '8'),
+            )
+            self.assertEqual(result['has_followed'], has_followed)
+
+    def test_followers_cursor_pagination(self):
+        friendships = []
+        for i in range(5):
+            follower = self.create_user('hanyuan_follower{}'.format(i))
+            friendships.append(
+                Friendship.objects.create(from_user=follower, to_user=self.hanyuan),
+            )
+        # friendships created at the same time are ordered by id
+        Friendship.objects.filter(
+            id__in=[friendships[1].id, friendships[2].id],
+        ).update(created_at=friendships[1].created_at)
+
+        url = FOLLOWERS_URL.format(self.hanyuan.id)
+        usernames, cursor = [], None
+        for _ in range(3):
+            params = {'size': 2, 'pagination': 'cursor'}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.anonymous_client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('total_results', response.data)
+            usernames += [result['user']['username'] for result in response.data['results']]
+            cursor = response.data['next_cursor']
+            self.assertEqual(response.data['has_next_page'], cursor is not None)
+        self.assertEqual(cursor, None)
+        self.assertEqual(
+            usernames,
+            ['hanyuan_follower{}'.format(i) for i in [4, 3, 2, 1, 0]],
+        )
+
+        response = self.anonymous_client.get(url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
+        # page numbers are the default
+        response = self.anonymous_client.get(url, {'size': 2})
+        self.assertEqual(response.data['total_results'], 5)
+        self.assertEqual(response.data['page_number'], 1)
+        self.assertNotIn('next_cursor', response.data)
+
+        # the approximate total comes from the cached counters
+        response = self.anonymous_client.get(url, {
+            'size': 2,
+            'pagination': 'cursor',
+            'with_total': 1,
+        })
+        self.assertEqual(response.data['total_results'], 5)
+        response = self.anonymous_client.get(
+            FOLLOWINGS_URL.format(self.hanyuan.id),
+            {'pagination': 'cursor', 'with_total': 1},
+        )
+        self.assertEqual(response.data['total_results'], 0)
+        self.assertEqual(response.data['next_cursor'], None)
+
     # test if pagination functions correctly
     def _test_friendship_pagination(self, url, page_size, max_page_size):
         response = self.anonymous_client.get(url, {'page': 1})
@@ -8,8 +8,10 @@ from friendships.api.serializers import (
     FollowerSerializer,
     FriendshipSerializerForCreate,
 )
+from accounts.services import UserService
 from django.contrib.auth.models import User
 from friendships.api.paginations import FriendshipPagination
+from friendships.services import FriendshipService
 
 class FriendshipViewSet(viewsets.GenericViewSet):
     # POST /api/friendships/1/follow is to follow the user with user_id=1
@@ -25,16 +27,51 @@ class FriendshipViewSet(viewsets.GenericViewSet):
     def followers(self, request, pk):
         friendships = Friendship.objects.filter(to_user_id=pk).order_by('-created_at')
         page = self.paginate_queryset(friendships)
-        serializer = FollowerSerializer(page, many=True, context={'request': request})
+        UserService.preload_users(page, field_name='from_user')
+        serializer = FollowerSerializer(
+            page,
+            many=True,
+            context=self._get_page_context(
+                request,
+                [friendship.from_user_id for friendship in page],
+            ),
+        )
         return self.get_paginated_response(serializer.data)
 
     @action(methods=['GET'], detail=True, permission_classes=[AllowAny])
     def followings(self, request, pk):
         friendships = Friendship.objects.filter(from_user_id=pk).order_by('-created_at')
         page = self.paginate_queryset(friendships)
-        serializer = FollowingSerializer(page, many=True, context={'request': request})
+        UserService.preload_users(page, field_name='to_user')
+        serializer = FollowingSerializer(
+            page,
+            many=True,
+            context=self._get_page_context(
+                request,
+                [friendship.to_user_id for friendship in page],
+            ),
+        )
         return self.get_paginated_response(serializer.data)
 
+    def get_approximate_total(self):
+        # called by FriendshipPagination for ?with_total=1, served by the
+        # cached counters instead of a COUNT(*) over the friendships
+        user_id = int(self.kwargs['pk'])
+        if self.action == 'followers':
+            return FriendshipService.get_follower_count(user_id)
+        return FriendshipService.get_following_count(user_id)
+
+    def _get_page_context(self, request, user_ids):
+        # whether the current user has followed the users of the page is
+        # resolved for the whole page at once, instead of one query per row
+        return {
+            'request': request,
+            'followed_user_ids': FriendshipService.has_followed_many(
+                request.user,
+                user_ids,
+            ),
+        }
+
     # follow method is just for login user
     @action(methods=['POST'], detail=True, permission_classes=[IsAuthenticated])
     def follow(self, request, pk):
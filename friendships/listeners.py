@@ -0,0 +1,41 @@
+def incr_follower_count(sender, instance, created, **kwargs):
+    if not created or instance.to_user_id is None:
+        return
+
+    # import inside the function to avoid circular import
+    from friendships.services import FriendshipService
+    FriendshipService.incr_follower_count(instance.to_user_id)
+
+
+def decr_follower_count(sender, instance, **kwargs):
+    if instance.to_user_id is None:
+        return
+
+    from friendships.services import FriendshipService
+    FriendshipService.decr_follower_count(instance.to_user_id)
+
+
+def incr_following_count(sender, instance, created, **kwargs):
+    if not created or instance.from_user_id is None:
+        return
+
+    from friendships.services import FriendshipService
+    FriendshipService.incr_following_count(instance.from_user_id)
+
+
+def decr_following_count(sender, instance, **kwargs):
+    if instance.from_user_id is None:
+        return
+
+    from friendships.services import FriendshipService
+    FriendshipService.decr_following_count(instance.from_user_id)
+
+
+def invalidate_friendship_ids(sender, instance, **kwargs):
+    # follow and unfollow both change the follower ids of to_user and the
+    # following ids of from_user
+    from friendships.services import FriendshipService
+    FriendshipService.invalidate_friendship_ids(
+        instance.from_user_id,
+        instance.to_user_id,
+    )
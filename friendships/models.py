@@ -1,5 +1,13 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from django.contrib.auth.models import User
+from friendships.listeners import (
+    decr_follower_count,
+    decr_following_count,
+    incr_follower_count,
+    incr_following_count,
+    invalidate_friendship_ids,
+)
 
 
 class Friendship(models.Model):
@@ -32,4 +40,12 @@ class Friendship(models.Model):
         ordering = ('-created_at',)
 
     def __str__(self):
-        return '{} followed {}'.format(self.from_user_id, self.to_user_id)
\ No newline at end of file
+        return '{} followed {}'.format(self.from_user_id, self.to_user_id)
+
+
+post_save.connect(incr_follower_count, sender=Friendship)
+post_delete.connect(decr_follower_count, sender=Friendship)
+post_save.connect(incr_following_count, sender=Friendship)
+post_delete.connect(decr_following_count, sender=Friendship)
+post_save.connect(invalidate_friendship_ids, sender=Friendship)
+post_delete.connect(invalidate_friendship_ids, sender=Friendship)
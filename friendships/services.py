@@ -1,44 +1,120 @@
+from django.db.models import Count
 from friendships.models import Friendship
+from twitter.cache import (
+    USER_FOLLOWER_IDS_PATTERN,
+    USER_FOLLOWERS_COUNT_PATTERN,
+    USER_FOLLOWINGS_COUNT_PATTERN,
+    USER_FOLLOWING_IDS_PATTERN,
+)
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
 
 
 class FriendshipService(object):
 
     @classmethod
-    def get_followers(cls, user):
-        # Wrong case 1:
-        # It could lead to N + 1 times queries
-        # filter() costs 1 query
-        # for loop to get frome_user from each friendship costs N queries
-        # friendships = Friendship.objects.filter(to_user=user)
-        # return [friendship.from_user for friendship in friendships]
+    def get_follower_ids(cls, to_user_id):
+        # only the ids are needed, no need to load the User objects
+        return list(RedisHelper.load_id_set(
+            USER_FOLLOWER_IDS_PATTERN.format(user_id=to_user_id),
+            lambda: cls._load_follower_ids(to_user_id),
+        ))
 
-        # Wrong case 2:
-        # SQL JOIN operation happens in select_related(). friendship table and
-        # user table are joined on the column from_user. joins are relatively
-        # slow in most cases.
-        # friendships = Friendship.objects.filter(
-        #     to_user=user
-        # ).select_related('from_user')
-        # return [friendship.from_user for friendship in friendships]
+    @classmethod
+    def get_following_ids(cls, from_user_id):
+        return list(RedisHelper.load_id_set(
+            USER_FOLLOWING_IDS_PATTERN.format(user_id=from_user_id),
+            lambda: cls._load_following_ids(from_user_id),
+        ))
+
+    @classmethod
+    def _load_follower_ids(cls, to_user_id):
+        return Friendship.objects.filter(
+            to_user_id=to_user_id,
+        ).values_list('from_user_id', flat=True)
+
+    @classmethod
+    def _load_following_ids(cls, from_user_id):
+        return Friendship.objects.filter(
+            from_user_id=from_user_id,
+        ).values_list('to_user_id', flat=True)
 
-        # Good case 1: manually filter id, using IN Query
-        # friendships = Friendship.objects.filter(to_user=user)
-        # follower_ids = [friendship.from_user_id for friendship in friendships]
-        # followers = User.objects.filter(id__in=follower_ids)
+    @classmethod
+    def invalidate_friendship_ids(cls, from_user_id, to_user_id):
+        # the id sets are reloaded from database on their next read
+        conn = RedisClient.get_connection()
+        conn.delete(
+            USER_FOLLOWING_IDS_PATTERN.format(user_id=from_user_id),
+            USER_FOLLOWER_IDS_PATTERN.format(user_id=to_user_id),
+        )
+
+    @classmethod
+    def get_follower_count(cls, user_id):
+        return cls.get_follower_counts([user_id])[user_id]
 
-        # 正确的写法二，使用 prefetch_related，会自动执行成两条语句，用 In Query 查询
-        # 实际执行的 SQL 查询和上面是一样的，一共两条 SQL Queries
-        # Good case 2: use prefetch_related, auto execute 2 sql queries, using
-        # In Query, which on the SQL perspective is using the same queries
-        friendships = Friendship.objects.filter(
-            to_user=user,
-        ).prefetch_related('from_user')
-        return [friendship.from_user for friendship in friendships]
+    @classmethod
+    def get_follower_counts(cls, user_ids):
+        """
+        Return {user_id: number of followers}. The counters are cached in
+        redis, the missing ones are counted in one GROUP BY query.
+        """
+        keys = {
+            user_id: USER_FOLLOWERS_COUNT_PATTERN.format(user_id=user_id)
+            for user_id in user_ids
+        }
+        return RedisHelper.get_counts(keys, cls._count_followers)
 
+    @classmethod
+    def _count_followers(cls, user_ids):
+        # order_by() clears the default ordering of Friendship, otherwise
+        # created_at is added into GROUP BY
+        rows = Friendship.objects.filter(
+            to_user_id__in=user_ids,
+        ).order_by().values('to_user_id').annotate(count=Count('id'))
+        return {row['to_user_id']: row['count'] for row in rows}
+
+    @classmethod
+    def get_following_count(cls, user_id):
+        keys = {user_id: USER_FOLLOWINGS_COUNT_PATTERN.format(user_id=user_id)}
+        return RedisHelper.get_counts(keys, cls._count_followings)[user_id]
+
+    @classmethod
+    def _count_followings(cls, user_ids):
+        rows = Friendship.objects.filter(
+            from_user_id__in=user_ids,
+        ).order_by().values('from_user_id').annotate(count=Count('id'))
+        return {row['from_user_id']: row['count'] for row in rows}
+
+    @classmethod
+    def incr_follower_count(cls, user_id):
+        RedisHelper.incr_count(USER_FOLLOWERS_COUNT_PATTERN.format(user_id=user_id))
+
+    @classmethod
+    def decr_follower_count(cls, user_id):
+        RedisHelper.decr_count(USER_FOLLOWERS_COUNT_PATTERN.format(user_id=user_id))
+
+    @classmethod
+    def incr_following_count(cls, user_id):
+        RedisHelper.incr_count(USER_FOLLOWINGS_COUNT_PATTERN.format(user_id=user_id))
+
+    @classmethod
+    def decr_following_count(cls, user_id):
+        RedisHelper.decr_count(USER_FOLLOWINGS_COUNT_PATTERN.format(user_id=user_id))
 
     @classmethod
     def has_followed(cls, from_user, to_user):
-        return Friendship.objects.filter(
-            from_user=from_user,
-            to_user=to_user,
-        ).exists()
\ No newline at end of file
+        return to_user.id in cls.has_followed_many(from_user, [to_user.id])
+
+    @classmethod
+    def has_followed_many(cls, from_user, to_user_ids):
+        """
+        Return the ids of to_user_ids followed by from_user, checked against
+        the cached following ids of from_user.
+        """
+        if from_user.is_anonymous:
+            return set()
+        return RedisHelper.filter_id_set_members(
+            USER_FOLLOWING_IDS_PATTERN.format(user_id=from_user.id),
+            to_user_ids,
+            lambda: cls._load_following_ids(from_user.id),
+        )
@@ -0,0 +1,102 @@
+from friendships.models import Friendship
+from friendships.services import FriendshipService
+from testing.testcases import TestCase
+
+
+class FriendshipServiceTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.hanyuan = self.create_user('hanyuan')
+        self.eric = self.create_user('eric')
+
+    def test_get_follower_counts(self):
+        user1 = self.create_user('user1')
+        user2 = self.create_user('user2')
+        self.create_friendship(user1, self.hanyuan)
+        self.create_friendship(user2, self.hanyuan)
+        self.create_friendship(user1, self.eric)
+
+        counts = FriendshipService.get_follower_counts([
+            self.hanyuan.id,
+            self.eric.id,
+            user1.id,
+        ])
+        self.assertEqual(counts, {self.hanyuan.id: 2, self.eric.id: 1, user1.id: 0})
+        # counters are cached
+        with self.assertNoQueries():
+            self.assertEqual(FriendshipService.get_follower_count(self.hanyuan.id), 2)
+
+        # follow and unfollow update the cached counters
+        self.create_friendship(self.eric, self.hanyuan)
+        self.assertEqual(FriendshipService.get_follower_count(self.hanyuan.id), 3)
+        Friendship.objects.filter(from_user=user1).delete()
+        with self.assertNoQueries():
+            self.assertEqual(FriendshipService.get_follower_count(self.hanyuan.id), 2)
+            self.assertEqual(FriendshipService.get_follower_count(self.eric.id), 0)
+
+    def test_get_follower_and_following_ids(self):
+        user1 = self.create_user('user1')
+        self.create_friendship(user1, self.hanyuan)
+        self.create_friendship(self.eric, self.hanyuan)
+        self.create_friendship(self.hanyuan, self.eric)
+
+        self.assertEqual(
+            set(FriendshipService.get_follower_ids(self.hanyuan.id)),
+            {user1.id, self.eric.id},
+        )
+        self.assertEqual(
+            FriendshipService.get_following_ids(self.hanyuan.id),
+            [self.eric.id],
+        )
+
+    def test_friendship_ids_cache(self):
+        user1 = self.create_user('user1')
+        self.create_friendship(self.eric, self.hanyuan)
+        self.assertEqual(FriendshipService.get_follower_ids(self.hanyuan.id), [self.eric.id])
+        self.assertEqual(FriendshipService.get_follower_ids(user1.id), [])
+        with self.assertNoQueries():
+            self.assertEqual(FriendshipService.get_follower_ids(self.hanyuan.id), [self.eric.id])
+            # empty sets are cached as well
+            self.assertEqual(FriendshipService.get_follower_ids(user1.id), [])
+
+        # follow and unfollow invalidate the cached ids
+        self.create_friendship(user1, self.hanyuan)
+        self.assertEqual(
+            set(FriendshipService.get_follower_ids(self.hanyuan.id)),
+            {self.eric.id, user1.id},
+        )
+        Friendship.objects.filter(from_user=self.eric).delete()
+        self.assertEqual(FriendshipService.get_follower_ids(self.hanyuan.id), [user1.id])
+        self.assertEqual(FriendshipService.get_following_ids(self.eric.id), [])
+
+    def test_has_followed_many(self):
+        user1 = self.create_user('user1')
+        user2 = self.create_user('user2')
+        self.create_friendship(self.hanyuan, self.eric)
+        self.create_friendship(self.hanyuan, user2)
+
+        to_user_ids = [self.eric.id, user1.id, user2.id]
+        self.assertEqual(
+            FriendshipService.has_followed_many(self.hanyuan, to_user_ids),
+            {self.eric.id, user2.id},
+        )
+        with self.assertNoQueries():
+            self.assertEqual(
+                FriendshipService.has_followed_many(self.hanyuan, to_user_ids),
+                {self.eric.id, user2.id},
+            )
+            self.assertTrue(FriendshipService.has_followed(self.hanyuan, user2))
+            self.assertFalse(FriendshipService.has_followed(self.hanyuan, user1))
+        self.assertEqual(FriendshipService.has_followed_many(self.eric, to_user_ids), set())
+
+    def test_get_following_count(self):
+        user1 = self.create_user('user1')
+        self.create_friendship(self.hanyuan, self.eric)
+        self.assertEqual(FriendshipService.get_following_count(self.hanyuan.id), 1)
+        self.create_friendship(self.hanyuan, user1)
+        with self.assertNoQueries():
+            self.assertEqual(FriendshipService.get_following_count(self.hanyuan.id), 2)
+        Friendship.objects.filter(from_user=self.hanyuan, to_user=user1).delete()
+        with self.assertNoQueries():
+            self.assertEqual(FriendshipService.get_following_count(self.hanyuan.id), 1)
@@ -0,0 +1,63 @@
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from utils.paginations import encode_cursor, filter_before_cursor
+
+
+class NotificationPagination(BasePagination):
+    # https:// .../api/notifications/?unread=true&cursor=xxx&size=10
+    # the latest notifications first, paginated by keyset on
+    # (timestamp, id). Served by the (recipient, unread, timestamp) and
+    # (recipient, timestamp) indexes, see inbox/migrations. No COUNT(*) and
+    # no OFFSET scan, deep pages are as fast as the first one.
+    # An aggregated like notification moves to the top when it is updated
+    # (see NotificationService._aggregate), so it can show up again on a
+    # later page. Clients dedupe the notifications by id.
+    page_size = 20
+    page_size_query_param = 'size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+
+    def __init__(self):
+        super(NotificationPagination, self).__init__()
+        self.has_next_page = False
+        self.notifications = []
+
+    def to_html(self):
+        pass
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if self.cursor_query_param in request.query_params:
+            queryset = filter_before_cursor(
+                queryset,
+                request.query_params[self.cursor_query_param],
+                field='timestamp',
+            )
+        notifications = list(
+            queryset.order_by('-timestamp', '-id')[:page_size + 1]
+        )
+        self.has_next_page = len(notifications) > page_size
+        self.notifications = notifications[:page_size]
+        return self.notifications
+
+    def get_next_cursor(self):
+        if not self.has_next_page:
+            return None
+        last = self.notifications[-1]
+        return encode_cursor(last.timestamp, last.id)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'has_next_page': self.has_next_page,
+            'next_cursor': self.get_next_cursor(),
+            'results': data,
+        })
@@ -1,8 +1,47 @@
+from accounts.api.serializers import UserSerializer, UserSerializerForNotification
+from accounts.services import UserService
+from comments.api.serializers import CommentSerializerForNotification
+from comments.models import Comment
+from django.db.models import Manager
 from rest_framework import serializers
+from tweets.api.serializers import TweetSerializerForNotification
+from tweets.models import Tweet
+from inbox.services import NotificationService
 from notifications.models import Notification
 
 
+def _get_sample_actor_ids(notification):
+    # aggregated notifications keep their latest actors in data, see
+    # NotificationService._aggregate
+    if notification.data and 'sample_actor_ids' in notification.data:
+        return notification.data['sample_actor_ids']
+    return [int(notification.actor_object_id)]
+
+
+class NotificationListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        notifications = list(data.all() if isinstance(data, Manager) else data)
+        # load the sample actors of the whole page in bulk
+        users = UserService.get_users_by_ids({
+            actor_id
+            for notification in notifications
+            for actor_id in _get_sample_actor_ids(notification)
+        })
+        for notification in notifications:
+            setattr(notification, '_cached_sample_actors', [
+                users[actor_id]
+                for actor_id in _get_sample_actor_ids(notification)
+                if actor_id in users
+            ])
+        return super(NotificationListSerializer, self).to_representation(
+            notifications,
+        )
+
+
 class NotificationSerializer(serializers.ModelSerializer):
+    actor_count = serializers.SerializerMethodField()
+    sample_actors = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
@@ -10,6 +49,8 @@ class NotificationSerializer(serializers.ModelSerializer):
             'id',
             'actor_content_type',
             'actor_object_id',
+            'actor_count',
+            'sample_actors',
             'verb',
             'action_object_content_type',
             'action_object_object_id',
@@ -18,6 +59,79 @@ class NotificationSerializer(serializers.ModelSerializer):
             'timestamp',
             'unread',
         )
+        list_serializer_class = NotificationListSerializer
+
+    def get_actor_count(self, obj):
+        if obj.data and 'actor_count' in obj.data:
+            return obj.data['actor_count']
+        return 1
+
+    def get_sample_actors(self, obj):
+        # _cached_sample_actors is filled in by NotificationListSerializer
+        if hasattr(obj, '_cached_sample_actors'):
+            actors = obj._cached_sample_actors
+        else:
+            users = UserService.get_users_by_ids(_get_sample_actor_ids(obj))
+            actors = [
+                users[actor_id]
+                for actor_id in _get_sample_actor_ids(obj)
+                if actor_id in users
+            ]
+        return UserSerializer(actors, many=True).data
+
+
+class ExpandedNotificationListSerializer(NotificationListSerializer):
+
+    def to_representation(self, data):
+        notifications = list(data.all() if isinstance(data, Manager) else data)
+        NotificationService.preload_notifications(notifications)
+        return super(ExpandedNotificationListSerializer, self).to_representation(
+            notifications,
+        )
+
+
+class NotificationSerializerForExpand(NotificationSerializer):
+    """
+    GET /api/notifications/?expand=true, with the actor and the target of
+    each notification, so that clients can render them without looking them
+    up one by one.
+    """
+    # {target model: (name, serializer)}
+    TARGET_SERIALIZERS = {
+        Tweet: ('tweet', TweetSerializerForNotification),
+        Comment: ('comment', CommentSerializerForNotification),
+    }
+
+    actor = serializers.SerializerMethodField()
+    target = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Notification
+        fields = NotificationSerializer.Meta.fields + ('actor', 'target')
+        list_serializer_class = ExpandedNotificationListSerializer
+
+    def _preload(self, obj):
+        # the _cached_* attributes are filled in by
+        # ExpandedNotificationListSerializer
+        if not hasattr(obj, '_cached_actor'):
+            NotificationService.preload_notifications([obj])
+
+    def get_actor(self, obj):
+        self._preload(obj)
+        if obj._cached_actor is None:
+            return None
+        return UserSerializerForNotification(obj._cached_actor).data
+
+    def get_target(self, obj):
+        self._preload(obj)
+        target = obj._cached_target
+        if target is None or target.__class__ not in self.TARGET_SERIALIZERS:
+            return None
+        name, serializer_class = self.TARGET_SERIALIZERS[target.__class__]
+        return {
+            'content_type': name,
+            'object': serializer_class(target).data,
+        }
 
 
 class NotificationSerializerForUpdate(serializers.ModelSerializer):
@@ -30,6 +144,11 @@ class NotificationSerializerForUpdate(serializers.ModelSerializer):
         fields = ('unread',)
 
     def update(self, instance, validated_data):
+        was_unread = instance.unread
         instance.unread = validated_data['unread']
         instance.save()
+        if instance.unread and not was_unread:
+            NotificationService.incr_unread_count(instance.recipient_id)
+        if was_unread and not instance.unread:
+            NotificationService.decr_unread_count(instance.recipient_id)
         return instance
\ No newline at end of file
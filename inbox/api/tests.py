@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from notifications.models import Notification
 from testing.testcases import TestCase
 
@@ -10,6 +12,7 @@ NOTIFICATION_URL = '/api/notifications/'
 class NotificationTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.hanyuan, self.hanyuan_client = self.create_user_and_client('hanyuan')
         self.eric, self.eric_client = self.create_user_and_client('eric')
         self.eric_tweet = self.create_tweet(self.eric)
@@ -34,6 +37,7 @@ class NotificationTests(TestCase):
 class NotificationApiTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.hanyuan, self.hanyuan_client = self.create_user_and_client('hanyuan')
         self.eric, self.eric_client = self.create_user_and_client('eric')
         self.hanyuan_tweet = self.create_tweet(self.hanyuan)
@@ -109,21 +113,21 @@ class NotificationApiTests(TestCase):
         # eric 看不到任何 notifications
         response = self.eric_client.get(NOTIFICATION_URL)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data['count'], 0)
+        self.assertEqual(len(response.data['results']), 0)
         # hanyuan 看到两个 notifications
         response = self.hanyuan_client.get(NOTIFICATION_URL)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['results']), 2)
         # 标记之后看到一个未读
         notification = self.hanyuan.notifications.first()
         notification.unread = False
         notification.save()
         response = self.hanyuan_client.get(NOTIFICATION_URL)
-        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['results']), 2)
         response = self.hanyuan_client.get(NOTIFICATION_URL, {'unread': True})
-        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(len(response.data['results']), 1)
         response = self.hanyuan_client.get(NOTIFICATION_URL, {'unread': False})
-        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(len(response.data['results']), 1)
 
 
     def test_update(self):
@@ -171,4 +175,179 @@ class NotificationApiTests(TestCase):
         response = self.hanyuan_client.put(url, {'verb': 'newverb', 'unread': False})
         self.assertEqual(response.status_code, 200)
         notification.refresh_from_db() # reload data from db
-        self.assertNotEqual(notification.verb, 'newverb')
\ No newline at end of file
+        self.assertNotEqual(notification.verb, 'newverb')
+    def test_aggregated_likes(self):
+        clients = [
+            self.create_user_and_client('user{}'.format(i))
+            for i in range(5)
+        ]
+        for _, client in clients:
+            client.post(LIKE_URL, {
+                'content_type': 'tweet',
+                'object_id': self.hanyuan_tweet.id,
+            })
+        self.eric_client.post(COMMENT_URL, {
+            'tweet_id': self.hanyuan_tweet.id,
+            'content': 'a ha',
+        })
+
+        # the likes of the tweet are collapsed into one notification
+        response = self.hanyuan_client.get(NOTIFICATION_URL)
+        self.assertEqual(len(response.data['results']), 2)
+        like_notification = response.data['results'][1]
+        self.assertEqual(like_notification['verb'], 'liked your tweet')
+        self.assertEqual(like_notification['actor_count'], 5)
+        self.assertEqual(
+            [actor['id'] for actor in like_notification['sample_actors']],
+            [user.id for user, _ in clients[::-1][:3]],
+        )
+        self.assertEqual(
+            like_notification['actor_object_id'],
+            str(clients[-1][0].id),
+        )
+        comment_notification = response.data['results'][0]
+        self.assertEqual(comment_notification['actor_count'], 1)
+        self.assertEqual(
+            comment_notification['sample_actors'],
+            [{'id': self.eric.id, 'username': 'eric'}],
+        )
+        response = self.hanyuan_client.get('/api/notifications/unread-count/')
+        self.assertEqual(response.data['unread_count'], 2)
+
+        # likes after the notification is read start a new one
+        self.hanyuan_client.post('/api/notifications/mark-all-as-read/')
+        self.eric_client.post(LIKE_URL, {
+            'content_type': 'tweet',
+            'object_id': self.hanyuan_tweet.id,
+        })
+        response = self.hanyuan_client.get(NOTIFICATION_URL, {'unread': True})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['actor_count'], 1)
+
+    def test_list_pagination(self):
+        comments = [
+            self.create_comment(self.hanyuan, self.hanyuan_tweet)
+            for _ in range(5)
+        ]
+        # one notification per comment, likes of different targets are not
+        # aggregated
+        for comment in comments:
+            self.eric_client.post(LIKE_URL, {
+                'content_type': 'comment',
+                'object_id': comment.id,
+            })
+        notifications = list(
+            Notification.objects.filter(recipient=self.hanyuan)
+            .order_by('-timestamp', '-id')
+        )
+        self.assertEqual(len(notifications), 5)
+        notifications[0].unread = False
+        notifications[0].save()
+
+        response = self.hanyuan_client.get(NOTIFICATION_URL, {'size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [n['id'] for n in response.data['results']],
+            [n.id for n in notifications[:2]],
+        )
+        response = self.hanyuan_client.get(NOTIFICATION_URL, {
+            'size': 2,
+            'cursor': response.data['next_cursor'],
+        })
+        self.assertEqual(
+            [n['id'] for n in response.data['results']],
+            [n.id for n in notifications[2:4]],
+        )
+
+        # unread only
+        response = self.hanyuan_client.get(NOTIFICATION_URL, {
+            'unread': True,
+            'size': 3,
+        })
+        self.assertEqual(
+            [n['id'] for n in response.data['results']],
+            [n.id for n in notifications[1:4]],
+        )
+        response = self.hanyuan_client.get(NOTIFICATION_URL, {
+            'unread': True,
+            'size': 3,
+            'cursor': response.data['next_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(response.data['next_cursor'], None)
+        self.assertEqual(
+            [n['id'] for n in response.data['results']],
+            [notifications[4].id],
+        )
+
+    def test_list_expand(self):
+        comment = self.create_comment(self.hanyuan, self.hanyuan_tweet)
+        self.eric_client.post(COMMENT_URL, {
+            'tweet_id': self.hanyuan_tweet.id,
+            'content': 'hello',
+        })
+        self.eric_client.post(LIKE_URL, {
+            'content_type': 'comment',
+            'object_id': comment.id,
+        })
+
+        response = self.hanyuan_client.get(NOTIFICATION_URL)
+        self.assertEqual('target' in response.data['results'][0], False)
+
+        response = self.hanyuan_client.get(NOTIFICATION_URL, {'expand': 'true'})
+        self.assertEqual(response.status_code, 200)
+        like_data, comment_data = response.data['results']
+        self.assertEqual(like_data['actor']['username'], 'eric')
+        self.assertEqual('nickname' in like_data['actor'], True)
+        self.assertEqual(like_data['target']['content_type'], 'comment')
+        self.assertEqual(like_data['target']['object']['id'], comment.id)
+        self.assertEqual(
+            like_data['target']['object']['tweet_id'],
+            self.hanyuan_tweet.id,
+        )
+        self.assertEqual(comment_data['target']['content_type'], 'tweet')
+        self.assertEqual(
+            comment_data['target']['object']['id'],
+            self.hanyuan_tweet.id,
+        )
+
+        # deleted target
+        comment.delete()
+        response = self.hanyuan_client.get(NOTIFICATION_URL, {'expand': 1})
+        self.assertEqual(response.data['results'][0]['target'], None)
+
+    def test_list_expand_queries(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.hanyuan_client.get(
+                    NOTIFICATION_URL,
+                    {'expand': 'true'},
+                )
+            self.assertEqual(response.status_code, 200)
+            return len(response.data['results']), len(context.captured_queries)
+
+        def notify(client):
+            # one notification targeting a tweet, one targeting a comment
+            client.post(COMMENT_URL, {
+                'tweet_id': self.create_tweet(self.hanyuan).id,
+                'content': 'hello',
+            })
+            client.post(LIKE_URL, {
+                'content_type': 'comment',
+                'object_id': self.create_comment(self.hanyuan, self.hanyuan_tweet).id,
+            })
+
+        notify(self.eric_client)
+        self.clear_cache()
+        size, queries = count_queries()
+        self.assertEqual(size, 2)
+
+        # more actors and targets, same number of queries
+        for i in range(3):
+            _, client = self.create_user_and_client('user{}'.format(i))
+            notify(client)
+        self.clear_cache()
+        size, more_queries = count_queries()
+        self.assertEqual(size, 8)
+        self.assertEqual(more_queries, queries)
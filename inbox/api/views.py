@@ -1,5 +1,6 @@
 from inbox.api.serializers import (
     NotificationSerializer,
+    NotificationSerializerForExpand,
     NotificationSerializerForUpdate,
 )
 from rest_framework import viewsets, status
@@ -7,6 +8,8 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from utils.decorators import required_params
+from inbox.api.paginations import NotificationPagination
+from inbox.services import NotificationService
 from notifications.models import Notification
 
 
@@ -17,6 +20,13 @@ class NotificationViewSet(
     serializer_class = NotificationSerializer
     permission_classes = (IsAuthenticated,)
     filterset_fields = ('unread',)
+    pagination_class = NotificationPagination
+
+    def get_serializer_class(self):
+        expand = self.request.query_params.get('expand')
+        if self.action == 'list' and expand in ('1', 'true'):
+            return NotificationSerializerForExpand
+        return NotificationSerializer
 
     def get_queryset(self):
         return Notification.objects.filter(recipient=self.request.user)
@@ -24,13 +34,15 @@ class NotificationViewSet(
     @action(methods=['GET'], detail=False, url_path='unread-count')
     def unread_count(self, request, *args, **kwargs):
         # GET /api/notifications/unread-count/
-        count = self.get_queryset().filter(unread=True).count()
+        # clients poll it, it is one read of the counter cached in redis
+        count = NotificationService.get_unread_count(request.user.id)
         return Response({'unread_count': count}, status=status.HTTP_200_OK)
 
     @action(methods=['POST'], detail=False, url_path='mark-all-as-read')
     def mark_all_as_read(self, request, *args, **kwargs):
         # SQL: UPDATE ... WHERE
         updated_count = self.get_queryset().filter(unread=True).update(unread=False)
+        NotificationService.decr_unread_count(request.user.id, updated_count)
         return Response({'marked_count': updated_count}, status=status.HTTP_200_OK)
 
     @required_params(method='POST', params=['unread'])
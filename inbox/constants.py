@@ -0,0 +1,12 @@
+from utils.time_constants import ONE_HOUR
+
+# events popped from the notification queue and inserted with one bulk_create
+NOTIFICATION_BATCH_SIZE = 500
+# batches delivered by one run of deliver_notifications_task at most
+NOTIFICATION_MAX_BATCHES_PER_RUN = 100
+# likes of the same target are collapsed into the unread notification of the
+# last NOTIFICATION_AGGREGATION_WINDOW seconds, e.g. "X and 41 others liked
+# your tweet"
+NOTIFICATION_AGGREGATION_WINDOW = ONE_HOUR
+# latest actors kept in an aggregated notification
+NOTIFICATION_SAMPLE_ACTORS_LIMIT = 3
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+# Notification belongs to django-notifications-hq, its indexes can not be
+# declared on the model, so they are added to its table here.
+NOTIFICATION_INDEXES = (
+    models.Index(
+        fields=['recipient', 'unread', 'timestamp'],
+        name='notification_unread_time_idx',
+    ),
+    models.Index(
+        fields=['recipient', 'timestamp'],
+        name='notification_time_idx',
+    ),
+)
+
+
+def add_indexes(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    for index in NOTIFICATION_INDEXES:
+        schema_editor.add_index(Notification, index)
+
+
+def remove_indexes(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    for index in NOTIFICATION_INDEXES:
+        schema_editor.remove_index(Notification, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0008_index_together_recipient_unread'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_indexes, remove_indexes),
+    ]
@@ -1,38 +1,432 @@
-from comments.models import Comment
+import json
+
+from collections import Counter
+from dateutil import parser
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
-from notifications.signals import notify
-from tweets.models import Tweet
+from django.db.models import Count
+from django.utils import timezone
+from datetime import timedelta
+from inbox.constants import (
+    NOTIFICATION_AGGREGATION_WINDOW,
+    NOTIFICATION_BATCH_SIZE,
+    NOTIFICATION_MAX_BATCHES_PER_RUN,
+    NOTIFICATION_SAMPLE_ACTORS_LIMIT,
+)
+from likes.content_types import LikeContentTypes
+from notifications.models import Notification
+from twitter.cache import (
+    NOTIFICATION_ACTORS_PATTERN,
+    NOTIFICATION_QUEUE_KEY,
+    USER_UNREAD_NOTIFICATIONS_COUNT_PATTERN,
+)
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
+
+LIKE_EVENT = 'like'
+COMMENT_EVENT = 'comment'
+LIKE_TWEET_VERB = 'liked your tweet'
+LIKE_COMMENT_VERB = 'liked your comment'
+LIKE_VERBS = (LIKE_TWEET_VERB, LIKE_COMMENT_VERB)
 
 
 class NotificationService(object):
+    """
+    Notifications are not created in the request. send_*_notification only
+    push an event with the ids at hand to a redis queue, without reading
+    anything. deliver_queued_notifications (run by the celery worker, see
+    inbox/tasks.py) resolves the recipients of a batch of events in bulk and
+    inserts the notifications with one bulk_create.
+    Likes of the same target are aggregated: they update the unread
+    notification of the target from the last NOTIFICATION_AGGREGATION_WINDOW
+    in place, which keeps actor_count and the latest sample_actor_ids in its
+    data, instead of inserting one row per like.
+    With settings.NOTIFICATIONS_DELIVER_INLINE, e.g. in tests or local dev
+    without a worker, the queue is delivered in process right away.
+
+    The number of unread notifications of each user is a counter in redis,
+    kept up to date by the delivery and the read / unread apis, and checked
+    against the database by reconcile_unread_counts.
+    """
+
+    @classmethod
+    def send_like_notification(cls, like, pipeline=None):
+        # with pipeline, the event is queued when the caller executes the
+        # pipeline, who then calls deliver_inline
+        cls._enqueue({
+            'event': LIKE_EVENT,
+            'actor_id': like.user_id,
+            'content_type_id': like.content_type_id,
+            'object_id': like.object_id,
+            'timestamp': timezone.now().isoformat(),
+        }, pipeline)
+
+    @classmethod
+    def send_comment_notification(cls, comment):
+        cls._enqueue({
+            'event': COMMENT_EVENT,
+            'actor_id': comment.user_id,
+            'tweet_id': comment.tweet_id,
+            'timestamp': timezone.now().isoformat(),
+        })
 
     @classmethod
-    def send_like_notification(cls, like):
-        target = like.content_object
-        if like.user == target.user:
+    def _enqueue(cls, event, pipeline=None):
+        if pipeline is not None:
+            pipeline.rpush(NOTIFICATION_QUEUE_KEY, json.dumps(event))
             return
-        if like.content_type == ContentType.objects.get_for_model(Tweet):
-            notify.send(
-                like.user,
-                recipient=target.user,
-                verb='liked your tweet',
-                target=target,
+        conn = RedisClient.get_connection()
+        conn.rpush(NOTIFICATION_QUEUE_KEY, json.dumps(event))
+        cls.deliver_inline()
+
+    @classmethod
+    def deliver_inline(cls):
+        if settings.NOTIFICATIONS_DELIVER_INLINE:
+            cls.deliver_queued_notifications()
+
+    @classmethod
+    def deliver_queued_notifications(
+        cls,
+        batch_size=NOTIFICATION_BATCH_SIZE,
+        max_batches=NOTIFICATION_MAX_BATCHES_PER_RUN,
+    ):
+        # return the number of events delivered as new or updated
+        # notifications
+        delivered = 0
+        for _ in range(max_batches):
+            events = cls._pop_events(batch_size)
+            if not events:
+                break
+            notifications = cls._build_notifications(events)
+            delivered += len(notifications)
+            new_notifications, updated_notifications = cls._aggregate(
+                notifications,
+            )
+            Notification.objects.bulk_create(new_notifications)
+            Notification.objects.bulk_update(
+                updated_notifications,
+                ['actor_object_id', 'timestamp', 'data'],
             )
-        if like.content_type == ContentType.objects.get_for_model(Comment):
-            notify.send(
-                like.user,
-                recipient=target.user,
-                verb='liked your comment',
-                target=target,
+            # the updated ones are unread already
+            recipient_counts = Counter(
+                notification.recipient_id for notification in new_notifications
             )
+            for recipient_id, count in recipient_counts.items():
+                cls.incr_unread_count(recipient_id, count)
+            if len(events) < batch_size:
+                break
+        return delivered
 
     @classmethod
-    def send_comment_notification(cls, comment):
-        if comment.user == comment.tweet.user:
-            return
-        notify.send(
-            comment.user,
-            recipient=comment.tweet.user,
-            verb='commented on your tweet',
-            target=comment.tweet,
-        )
\ No newline at end of file
+    def _pop_events(cls, batch_size):
+        # lrange + ltrim in one transaction, so two workers never pop the
+        # same events. Events popped by a worker which dies are lost, which
+        # is acceptable for notifications.
+        conn = RedisClient.get_connection()
+        pipeline = conn.pipeline()
+        pipeline.lrange(NOTIFICATION_QUEUE_KEY, 0, batch_size - 1)
+        pipeline.ltrim(NOTIFICATION_QUEUE_KEY, batch_size, -1)
+        serialized_events, _ = pipeline.execute()
+        return [json.loads(event) for event in serialized_events]
+
+    @classmethod
+    def _build_notifications(cls, events):
+        # import inside the function to avoid circular import
+        from comments.models import Comment
+        from tweets.services import TweetService
+
+        tweet_content_type_id = LikeContentTypes.tweet_id()
+        comment_content_type_id = LikeContentTypes.comment_id()
+        tweet_ids, comment_ids = set(), set()
+        for event in events:
+            if event['event'] == COMMENT_EVENT:
+                tweet_ids.add(event['tweet_id'])
+            elif event['content_type_id'] == tweet_content_type_id:
+                tweet_ids.add(event['object_id'])
+            elif event['content_type_id'] == comment_content_type_id:
+                comment_ids.add(event['object_id'])
+
+        # {(content_type_id, object_id): user id of the author}
+        authors = {
+            (tweet_content_type_id, tweet_id): tweet.user_id
+            for tweet_id, tweet in TweetService.get_tweets_by_ids(tweet_ids).items()
+        }
+        if comment_ids:
+            authors.update({
+                (comment_content_type_id, comment_id): user_id
+                for comment_id, user_id in Comment.objects.filter(
+                    id__in=comment_ids,
+                ).values_list('id', 'user_id')
+            })
+
+        user_content_type = ContentType.objects.get_for_model(User)
+        notifications = []
+        for event in events:
+            if event['event'] == COMMENT_EVENT:
+                target = (tweet_content_type_id, event['tweet_id'])
+                verb = 'commented on your tweet'
+            else:
+                target = (event['content_type_id'], event['object_id'])
+                if target[0] == tweet_content_type_id:
+                    verb = LIKE_TWEET_VERB
+                else:
+                    verb = LIKE_COMMENT_VERB
+            recipient_id = authors.get(target)
+            # deleted targets, and users liking / commenting their own stuff
+            if recipient_id is None or recipient_id == event['actor_id']:
+                continue
+            notifications.append(Notification(
+                recipient_id=recipient_id,
+                actor_content_type=user_content_type,
+                actor_object_id=event['actor_id'],
+                verb=verb,
+                target_content_type_id=target[0],
+                target_object_id=target[1],
+                timestamp=parser.isoparse(event['timestamp']),
+            ))
+        return notifications
+
+    @classmethod
+    def preload_notifications(cls, notifications):
+        """
+        Resolve the actors (with their profiles) and the targets of a page of
+        notifications in bulk, one IN query per content type at most, into
+        _cached_actor and _cached_target. Deleted actors / targets are None.
+        """
+        # import inside the function to avoid circular import
+        from accounts.services import UserService
+        from tweets.models import Tweet
+        from tweets.services import TweetService
+
+        actors = UserService.get_users_with_profiles({
+            int(notification.actor_object_id)
+            for notification in notifications
+        })
+
+        target_ids_by_content_type = {}
+        for notification in notifications:
+            if notification.target_content_type_id is None:
+                continue
+            target_ids_by_content_type.setdefault(
+                notification.target_content_type_id,
+                set(),
+            ).add(int(notification.target_object_id))
+        targets = {}
+        for content_type_id, object_ids in target_ids_by_content_type.items():
+            model_class = ContentType.objects.get_for_id(
+                content_type_id,
+            ).model_class()
+            if model_class is Tweet:
+                # tweets are read through their cache
+                objects = TweetService.get_tweets_by_ids(object_ids)
+            else:
+                objects = model_class.objects.in_bulk(object_ids)
+            for object_id, obj in objects.items():
+                targets[(content_type_id, object_id)] = obj
+
+        for notification in notifications:
+            setattr(
+                notification,
+                '_cached_actor',
+                actors.get(int(notification.actor_object_id)),
+            )
+            target = None
+            if notification.target_content_type_id is not None:
+                target = targets.get((
+                    notification.target_content_type_id,
+                    int(notification.target_object_id),
+                ))
+            setattr(notification, '_cached_target', target)
+
+    @classmethod
+    def _aggregation_key(cls, notification):
+        return (
+            notification.recipient_id,
+            notification.verb,
+            notification.target_content_type_id,
+            str(notification.target_object_id),
+        )
+
+    @classmethod
+    def _aggregate(cls, notifications):
+        """
+        Merge the like notifications of the same target, oldest first, into
+        the unread notification of the target within the window if there is
+        one, otherwise into a new one. Return (new notifications, updated
+        notifications).
+        The distinct actors are counted by a hyperloglog per aggregated
+        notification in redis, which expires with the window, so the row only
+        keeps actor_count and the latest sample_actor_ids.
+        An updated notification takes the timestamp of its latest like, so it
+        moves to the top of the list. A client paging through the list while
+        it is updated may see it again on a later page, and should dedupe the
+        notifications by id.
+        """
+        new_notifications, groups = [], {}
+        for notification in notifications:
+            if notification.verb in LIKE_VERBS:
+                groups.setdefault(
+                    cls._aggregation_key(notification),
+                    [],
+                ).append(notification)
+            else:
+                new_notifications.append(notification)
+        if not groups:
+            return new_notifications, []
+
+        # one query for the notifications to merge into, the latest one of
+        # each target wins
+        window_start = timezone.now() - timedelta(
+            seconds=NOTIFICATION_AGGREGATION_WINDOW,
+        )
+        existing = {}
+        for notification in Notification.objects.filter(
+            recipient_id__in={key[0] for key in groups},
+            verb__in=LIKE_VERBS,
+            target_object_id__in={key[3] for key in groups},
+            unread=True,
+            timestamp__gte=window_start,
+        ).order_by('timestamp'):
+            existing[cls._aggregation_key(notification)] = notification
+
+        # one round trip for all the actors of the batch. pfadd returns 1 if
+        # the actor is new to the notification.
+        conn = RedisClient.get_connection()
+        pipeline = conn.pipeline()
+        aggregated_groups, updated_notifications = [], []
+        for key, group in groups.items():
+            actors_key = cls._actors_key(key)
+            is_new = key not in existing
+            if not is_new:
+                aggregated = existing[key]
+                updated_notifications.append(aggregated)
+                # the hyperloglog may have expired before the window, e.g.
+                # the notification was aggregated before it was kept
+                aggregated.data = aggregated.data or cls._aggregated_data(
+                    aggregated.actor_object_id,
+                )
+                pipeline.pfadd(actors_key, *aggregated.data['sample_actor_ids'])
+            else:
+                aggregated = group.pop(0)
+                aggregated.data = cls._aggregated_data(aggregated.actor_object_id)
+                new_notifications.append(aggregated)
+                # left from a notification which is read or out of the window
+                pipeline.delete(actors_key)
+                pipeline.pfadd(actors_key, aggregated.actor_object_id)
+            for notification in group:
+                pipeline.pfadd(actors_key, notification.actor_object_id)
+            pipeline.expire(actors_key, NOTIFICATION_AGGREGATION_WINDOW)
+            aggregated_groups.append((aggregated, group, is_new))
+        results = iter(pipeline.execute())
+
+        for aggregated, group, is_new in aggregated_groups:
+            # skip the results of seeding / resetting the hyperloglog
+            next(results)
+            if is_new:
+                next(results)
+            for notification in group:
+                aggregated.data = cls._add_actor(
+                    aggregated.data,
+                    notification.actor_object_id,
+                    is_new_actor=next(results) == 1,
+                )
+                aggregated.actor_object_id = notification.actor_object_id
+                aggregated.timestamp = notification.timestamp
+            # the result of expire
+            next(results)
+        return new_notifications, updated_notifications
+
+    @classmethod
+    def _actors_key(cls, aggregation_key):
+        recipient_id, verb, content_type_id, object_id = aggregation_key
+        return NOTIFICATION_ACTORS_PATTERN.format(
+            recipient_id=recipient_id,
+            verb=verb.replace(' ', '_'),
+            content_type_id=content_type_id,
+            object_id=object_id,
+        )
+
+    @classmethod
+    def _aggregated_data(cls, actor_id):
+        return {
+            'actor_count': 1,
+            'sample_actor_ids': [int(actor_id)],
+        }
+
+    @classmethod
+    def _add_actor(cls, data, actor_id, is_new_actor):
+        # an actor who likes the target again, e.g. after canceling the like,
+        # is moved to the front of the samples instead of being counted twice
+        actor_id = int(actor_id)
+        sample_actor_ids = [actor_id] + [
+            other for other in data['sample_actor_ids'] if other != actor_id
+        ]
+        return {
+            'actor_count': data['actor_count'] + (1 if is_new_actor else 0),
+            'sample_actor_ids': sample_actor_ids[:NOTIFICATION_SAMPLE_ACTORS_LIMIT],
+        }
+
+    @classmethod
+    def _unread_count_key(cls, user_id):
+        return USER_UNREAD_NOTIFICATIONS_COUNT_PATTERN.format(user_id=user_id)
+
+    @classmethod
+    def get_unread_count(cls, user_id):
+        keys = {user_id: cls._unread_count_key(user_id)}
+        return RedisHelper.get_counts(keys, cls._count_unread)[user_id]
+
+    @classmethod
+    def _count_unread(cls, user_ids):
+        # uses the <recipient, unread> index of Notification. order_by()
+        # clears the default ordering, which would be added to the GROUP BY
+        return dict(
+            Notification.objects.filter(recipient_id__in=user_ids, unread=True)
+            .order_by()
+            .values('recipient_id')
+            .annotate(count=Count('id'))
+            .values_list('recipient_id', 'count')
+        )
+
+    @classmethod
+    def incr_unread_count(cls, user_id, amount=1):
+        RedisHelper.incr_count(cls._unread_count_key(user_id), amount)
+
+    @classmethod
+    def decr_unread_count(cls, user_id, amount=1):
+        RedisHelper.decr_count(cls._unread_count_key(user_id), amount)
+
+    @classmethod
+    def reconcile_unread_counts(cls, batch_size=1000):
+        """
+        Recount the unread notifications of the users whose counter is
+        cached, and drop the counters which drifted (e.g. a delivery between
+        mark-all-as-read and its decrement), they are recounted on their next
+        read. Return the number of counters dropped.
+        """
+        conn = RedisClient.get_connection()
+        pattern = USER_UNREAD_NOTIFICATIONS_COUNT_PATTERN.format(user_id='*')
+        prefix = pattern[:-1]
+        dropped = 0
+        keys = []
+        for key in conn.scan_iter(match=pattern, count=batch_size):
+            keys.append(key.decode())
+            if len(keys) >= batch_size:
+                dropped += cls._drop_drifted_counts(conn, keys, prefix)
+                keys = []
+        if keys:
+            dropped += cls._drop_drifted_counts(conn, keys, prefix)
+        return dropped
+
+    @classmethod
+    def _drop_drifted_counts(cls, conn, keys, prefix):
+        user_ids = [int(key[len(prefix):]) for key in keys]
+        real_counts = cls._count_unread(user_ids)
+        drifted_keys = [
+            key
+            for key, user_id, value in zip(keys, user_ids, conn.mget(keys))
+            if value is not None and int(value) != real_counts.get(user_id, 0)
+        ]
+        if drifted_keys:
+            conn.delete(*drifted_keys)
+        return len(drifted_keys)
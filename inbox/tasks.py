@@ -0,0 +1,15 @@
+from celery import shared_task
+from inbox.services import NotificationService
+from utils.time_constants import ONE_MINUTE
+
+
+@shared_task(time_limit=ONE_MINUTE)
+def deliver_notifications_task():
+    created = NotificationService.deliver_queued_notifications()
+    return '{} notifications delivered'.format(created)
+
+
+@shared_task(time_limit=5 * ONE_MINUTE)
+def reconcile_unread_counts_task():
+    dropped = NotificationService.reconcile_unread_counts()
+    return '{} unread counts reconciled'.format(dropped)
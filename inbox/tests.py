@@ -1,11 +1,15 @@
+from django.test import override_settings
 from testing.testcases import TestCase
 from inbox.services import NotificationService
+from inbox.tasks import deliver_notifications_task, reconcile_unread_counts_task
 from notifications.models import Notification
+from utils.redis_client import RedisClient
 
 
 class NotificationServiceTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.hanyuan = self.create_user('hanyuan')
         self.eric = self.create_user('eric')
         self.hanyuan_tweet = self.create_tweet(self.hanyuan)
@@ -30,4 +34,111 @@ class NotificationServiceTests(TestCase):
         # dispatch notification if tweet user != comment user
         like = self.create_like(self.eric, self.hanyuan_tweet)
         NotificationService.send_like_notification(like)
-        self.assertEqual(Notification.objects.count(), 1)
\ No newline at end of file
+        self.assertEqual(Notification.objects.count(), 1)
+
+    @override_settings(NOTIFICATIONS_DELIVER_INLINE=False)
+    def test_deliver_queued_notifications(self):
+        comment = self.create_comment(self.hanyuan, self.hanyuan_tweet)
+        likes = [
+            self.create_like(self.eric, self.hanyuan_tweet),
+            self.create_like(self.eric, comment),
+            self.create_like(self.hanyuan, comment),
+        ]
+        eric_comment = self.create_comment(self.eric, self.hanyuan_tweet)
+
+        # only the ids are queued, nothing is read or written
+        with self.assertNoQueries():
+            for like in likes:
+                NotificationService.send_like_notification(like)
+            NotificationService.send_comment_notification(eric_comment)
+        self.assertEqual(Notification.objects.count(), 0)
+
+        self.assertEqual(
+            deliver_notifications_task(),
+            '3 notifications delivered',
+        )
+        self.assertEqual(
+            sorted(Notification.objects.values_list('verb', flat=True)),
+            ['commented on your tweet', 'liked your comment', 'liked your tweet'],
+        )
+        notification = Notification.objects.get(verb='liked your comment')
+        self.assertEqual(notification.recipient, self.hanyuan)
+        self.assertEqual(notification.actor, self.eric)
+        self.assertEqual(notification.target, comment)
+        self.assertEqual(deliver_notifications_task(), '0 notifications delivered')
+
+        # delivered in batches
+        for _ in range(5):
+            NotificationService.send_like_notification(likes[0])
+        self.assertEqual(NotificationService.deliver_queued_notifications(
+            batch_size=2,
+            max_batches=2,
+        ), 4)
+        self.assertEqual(deliver_notifications_task(), '1 notifications delivered')
+        # aggregated into the unread notification of the tweet, the same
+        # actor is counted once
+        self.assertEqual(Notification.objects.count(), 3)
+        notification = Notification.objects.get(verb='liked your tweet')
+        self.assertEqual(notification.data['actor_count'], 1)
+        self.assertEqual(notification.data['sample_actor_ids'], [self.eric.id])
+
+        ming = self.create_user('ming')
+        for user in (ming, self.eric):
+            NotificationService.send_like_notification(
+                self.create_like(user, self.hanyuan_tweet),
+            )
+        deliver_notifications_task()
+        notification.refresh_from_db()
+        self.assertEqual(notification.data, {
+            'actor_count': 2,
+            'sample_actor_ids': [self.eric.id, ming.id],
+        })
+
+        # the actors are counted in redis, the samples stay bounded
+        users = [self.create_user('user{}'.format(i)) for i in range(4)]
+        for user in users + [ming]:
+            NotificationService.send_like_notification(
+                self.create_like(user, self.hanyuan_tweet),
+            )
+        deliver_notifications_task()
+        notification.refresh_from_db()
+        self.assertEqual(notification.data, {
+            'actor_count': 6,
+            'sample_actor_ids': [ming.id, users[3].id, users[2].id],
+        })
+
+        # the actors are lost with redis, the samples are still not counted
+        # twice
+        RedisClient.get_connection().flushdb()
+        NotificationService.send_like_notification(
+            self.create_like(users[3], self.hanyuan_tweet),
+        )
+        deliver_notifications_task()
+        notification.refresh_from_db()
+        self.assertEqual(notification.data['actor_count'], 6)
+
+    def test_unread_count(self):
+        self.assertEqual(NotificationService.get_unread_count(self.hanyuan.id), 0)
+        self.create_like(self.eric, self.hanyuan_tweet)
+        comment = self.create_comment(self.eric, self.hanyuan_tweet)
+        NotificationService.send_comment_notification(comment)
+        # incremented by the delivery, read without any query
+        with self.assertNoQueries():
+            self.assertEqual(
+                NotificationService.get_unread_count(self.hanyuan.id),
+                1,
+            )
+        NotificationService.send_like_notification(
+            self.create_like(self.eric, self.hanyuan_tweet),
+        )
+        self.assertEqual(NotificationService.get_unread_count(self.hanyuan.id), 2)
+
+        # counters which drifted are dropped and recounted
+        NotificationService.get_unread_count(self.eric.id)
+        Notification.objects.filter(verb='liked your tweet').update(unread=False)
+        self.assertEqual(
+            reconcile_unread_counts_task(),
+            '1 unread counts reconciled',
+        )
+        self.assertEqual(NotificationService.get_unread_count(self.hanyuan.id), 1)
+        self.assertEqual(NotificationService.get_unread_count(self.eric.id), 0)
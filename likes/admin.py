@@ -1,5 +1,46 @@
 from django.contrib import admin
+from django.http import QueryDict
+from likes.content_types import LikeContentTypes
 from likes.models import Like
+from likes.shards import LikeShards
+
+
+def _get_shard_alias(request):
+    """
+    admin can not query across the shards, the likes of one shard are listed
+    at a time, the first shard by default. The change page of a like keeps
+    the shard of the list in _changelist_filters.
+    """
+    params = request.GET
+    if LikeShardListFilter.parameter_name not in params:
+        params = QueryDict(params.get('_changelist_filters', ''))
+    alias = params.get(LikeShardListFilter.parameter_name)
+    if alias in LikeShards.get_aliases():
+        return alias
+    return LikeShards.get_aliases()[0]
+
+
+class LikeShardListFilter(admin.SimpleListFilter):
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in LikeShards.get_aliases()]
+
+    def choices(self, changelist):
+        # no "All" choice, there is no list of the likes of all the shards
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': (self.value() or self.lookup_choices[0][0]) == alias,
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: alias},
+                ),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        # the shard is already picked by LikeAdmin.get_queryset
+        return queryset
 
 
 @admin.register(Like)
@@ -8,8 +49,21 @@ class LikeAdmin(admin.ModelAdmin):
         'user',
         'content_type',
         'object_id',
-        'content_object',
+        'liked_object',
         'created_at',
     )
-    list_filter = ('content_type',)
-    date_hierarchy = 'created_at'
\ No newline at end of file
+    list_filter = (LikeShardListFilter, 'content_type')
+    date_hierarchy = 'created_at'
+
+    def liked_object(self, obj):
+        # like.content_object would look the content type up in the shard of
+        # the like, where there is no content type table
+        model_class = LikeContentTypes.get_model_class_by_id(obj.content_type_id)
+        if model_class is None:
+            return None
+        return model_class.objects.filter(id=obj.object_id).first()
+
+    def get_queryset(self, request):
+        return super(LikeAdmin, self).get_queryset(request).using(
+            _get_shard_alias(request),
+        )
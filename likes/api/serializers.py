@@ -1,10 +1,23 @@
 from accounts.api.serializers import UserSerializerForLike
-from comments.models import Comment
-from django.contrib.contenttypes.models import ContentType
+from accounts.services import UserService
+from django.db.models import Manager
+from likes.constants import LIKE_STATUS_BATCH_LIMIT
+from likes.content_types import LikeContentTypes
+from likes.intents import LikeIntents
 from likes.models import Like
+from likes.services import LikeService
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from tweets.models import Tweet
+from utils.existence import ExistenceService
+
+
+class LikeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        likes = list(data.all() if isinstance(data, Manager) else data)
+        # load the users of all the likes in bulk
+        UserService.preload_users(likes)
+        return super(LikeListSerializer, self).to_representation(likes)
 
 
 class LikeSerializer(serializers.ModelSerializer):
@@ -13,10 +26,11 @@ class LikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Like
         fields = ('user', 'created_at')
+        list_serializer_class = LikeListSerializer
 
 
 class BaseLikeSerializerForCreateAndCancel(serializers.ModelSerializer):
-    content_type = serializers.ChoiceField(choices=['comment', 'tweet'])
+    content_type = serializers.ChoiceField(choices=LikeContentTypes.CHOICES)
     object_id = serializers.IntegerField()
 
     class Meta:
@@ -24,18 +38,13 @@ class BaseLikeSerializerForCreateAndCancel(serializers.ModelSerializer):
         fields = ('content_type', 'object_id')
 
     def _get_model_class(self, data):
-        if data['content_type'] == 'comment':
-            return Comment
-        if data['content_type'] == 'tweet':
-            return Tweet
-        return None
+        return LikeContentTypes.get_model_class(data['content_type'])
 
     def validate(self, data):
         model_class = self._get_model_class(data)
         if model_class is None:
             raise ValidationError({'content_type': 'Content type does not exist'})
-        liked_object = model_class.objects.filter(id=data['object_id']).first()
-        if liked_object is None:
+        if not ExistenceService.exists(model_class, data['object_id']):
             raise ValidationError({'object_id': 'Object does not exist'})
         return data
 
@@ -43,13 +52,18 @@ class BaseLikeSerializerForCreateAndCancel(serializers.ModelSerializer):
 class LikeSerializerForCreate(BaseLikeSerializerForCreateAndCancel):
 
     def get_or_create(self):
-        validated_data = self.validated_data
-        model_class = self._get_model_class(validated_data)
-        return Like.objects.get_or_create(
-            content_type=ContentType.objects.get_for_model(model_class),
-            object_id=validated_data['object_id'],
-            user=self.context['request'].user,
-        )
+        user = self.context['request'].user
+        content_type_id = LikeContentTypes.get_id(self.validated_data['content_type'])
+        object_id = self.validated_data['object_id']
+        if LikeIntents.is_enabled():
+            # the like is saved later, return the projected one
+            return LikeIntents.like(
+                user,
+                content_type_id,
+                object_id,
+                LikeService.has_liked_by_id(user, content_type_id, object_id),
+            )
+        return LikeService.get_or_create_like(user, content_type_id, object_id)
 
 
 class LikeSerializerForCancel(BaseLikeSerializerForCreateAndCancel):
@@ -59,10 +73,34 @@ class LikeSerializerForCancel(BaseLikeSerializerForCreateAndCancel):
         cancel 方法是一个自定义的方法，cancel 不会被 serializer.save 调用
         所以需要直接调用 serializer.cancel()
         """
-        model_class = self._get_model_class(self.validated_data)
-        deleted, _ = Like.objects.filter(
-            content_type=ContentType.objects.get_for_model(model_class),
-            object_id=self.validated_data['object_id'],
-            user=self.context['request'].user,
-        ).delete()
-        return deleted
+        user = self.context['request'].user
+        content_type_id = LikeContentTypes.get_id(self.validated_data['content_type'])
+        object_id = self.validated_data['object_id']
+        if LikeIntents.is_enabled():
+            return LikeIntents.cancel(
+                user,
+                content_type_id,
+                object_id,
+                LikeService.has_liked_by_id(user, content_type_id, object_id),
+            )
+        return LikeService.cancel_like(user, content_type_id, object_id)
+
+
+class LikeTargetSerializer(serializers.Serializer):
+    content_type = serializers.ChoiceField(choices=LikeContentTypes.CHOICES)
+    object_id = serializers.IntegerField()
+
+
+class LikeStatusSerializer(serializers.Serializer):
+    objects = serializers.ListField(
+        child=LikeTargetSerializer(),
+        allow_empty=False,
+        max_length=LIKE_STATUS_BATCH_LIMIT,
+    )
+
+    def get_statuses(self):
+        targets = [
+            (target['content_type'], target['object_id'])
+            for target in self.validated_data['objects']
+        ]
+        return LikeService.get_like_statuses(self.context['request'].user, targets)
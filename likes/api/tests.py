@@ -1,8 +1,15 @@
+from django.test import override_settings
+from likes.constants import LIKE_STATUS_BATCH_LIMIT
+from likes.services import LikeService
+from likes.tasks import flush_like_intents_task
+from notifications.models import Notification
 from testing.testcases import TestCase
+from tweets.models import Tweet
 
 
 LIKE_BASE_URL = '/api/likes/'
 LIKE_CANCEL_URL = '/api/likes/cancel/'
+LIKE_STATUS_URL = '/api/likes/status/'
 COMMENT_LIST_API = '/api/comments/'
 TWEET_LIST_API = '/api/tweets/'
 TWEET_DETAIL_API = '/api/tweets/{}/'
@@ -11,6 +18,7 @@ NEWSFEED_LIST_API = '/api/newsfeeds/'
 class LikeApiTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.hanyuan, self.hanyuan_client = self.create_user_and_client('hanyuan')
         self.eric, self.eric_client = self.create_user_and_client('eric')
 
@@ -217,4 +225,101 @@ class LikeApiTests(TestCase):
         response = self.eric_client.get(url)
         self.assertEqual(len(response.data['likes']), 2)
         self.assertEqual(response.data['likes'][0]['user']['id'], self.hanyuan.id)
-        self.assertEqual(response.data['likes'][1]['user']['id'], self.eric.id)
\ No newline at end of file
+        self.assertEqual(response.data['likes'][1]['user']['id'], self.eric.id)
+
+    def test_like_status(self):
+        tweet = self.create_tweet(self.hanyuan)
+        other_tweet = self.create_tweet(self.eric)
+        comment = self.create_comment(self.eric, tweet)
+        self.create_like(self.eric, tweet)
+        self.create_like(self.hanyuan, tweet)
+        self.create_like(self.eric, comment)
+        data = {'objects': [
+            {'content_type': 'tweet', 'object_id': tweet.id},
+            {'content_type': 'comment', 'object_id': comment.id},
+            {'content_type': 'tweet', 'object_id': other_tweet.id},
+            {'content_type': 'tweet', 'object_id': 0},
+        ]}
+
+        # anonymous is not allowed
+        response = self.anonymous_client.post(LIKE_STATUS_URL, data, format='json')
+        self.assertEqual(response.status_code, 403)
+        response = self.eric_client.get(LIKE_STATUS_URL)
+        self.assertEqual(response.status_code, 405)
+        response = self.eric_client.post(LIKE_STATUS_URL, {}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.eric_client.post(LIKE_STATUS_URL, {'objects': [
+            {'content_type': 'twitter', 'object_id': tweet.id},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.eric_client.post(LIKE_STATUS_URL, {'objects': [
+            {'content_type': 'tweet', 'object_id': tweet.id},
+        ] * (LIKE_STATUS_BATCH_LIMIT + 1)}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.eric_client.post(LIKE_STATUS_URL, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(
+            [(r['content_type'], r['object_id']) for r in results],
+            [(o['content_type'], o['object_id']) for o in data['objects']],
+        )
+        self.assertEqual([r['has_liked'] for r in results], [True, True, False, False])
+        self.assertEqual([r['likes_count'] for r in results], [2, 1, 0, 0])
+
+        response = self.hanyuan_client.post(LIKE_STATUS_URL, data, format='json')
+        self.assertEqual(
+            [r['has_liked'] for r in response.data['results']],
+            [True, False, False, False],
+        )
+
+    @override_settings(LIKE_WRITE_BEHIND=True)
+    def test_write_behind_likes(self):
+        tweet = self.create_tweet(self.hanyuan)
+        comment = self.create_comment(self.hanyuan, tweet)
+        self.create_like(self.eric, comment)
+        tweet_data = {'content_type': 'tweet', 'object_id': tweet.id}
+        comment_data = {'content_type': 'comment', 'object_id': comment.id}
+
+        # the api responds with the projected state, nothing is saved yet
+        response = self.eric_client.post(LIKE_BASE_URL, tweet_data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['user']['id'], self.eric.id)
+        self.assertEqual(tweet.like_set.count(), 0)
+        self.assertEqual(Notification.objects.count(), 0)
+        self.assertEqual(LikeService.has_liked(self.eric, tweet), True)
+        response = self.eric_client.post(LIKE_CANCEL_URL, comment_data)
+        self.assertEqual(response.data['deleted'], 1)
+        self.assertEqual(comment.like_set.count(), 1)
+        self.assertEqual(LikeService.has_liked(self.eric, comment), False)
+        response = self.eric_client.post(LIKE_STATUS_URL, {'objects': [
+            tweet_data,
+            comment_data,
+        ]}, format='json')
+        self.assertEqual(
+            [r['has_liked'] for r in response.data['results']],
+            [True, False],
+        )
+
+        # repeated intents of the same like are deduplicated, the last wins
+        self.eric_client.post(LIKE_CANCEL_URL, tweet_data)
+        self.eric_client.post(LIKE_BASE_URL, tweet_data)
+        self.hanyuan_client.post(LIKE_BASE_URL, tweet_data)
+        self.hanyuan_client.post(LIKE_CANCEL_URL, tweet_data)
+
+        self.assertEqual(flush_like_intents_task(), '2 likes flushed')
+        self.assertEqual(
+            [like.user_id for like in tweet.like_set],
+            [self.eric.id],
+        )
+        self.assertEqual(comment.like_set.count(), 0)
+        self.assertEqual(LikeService.has_liked(self.eric, tweet), True)
+        self.assertEqual(LikeService.has_liked(self.hanyuan, tweet), False)
+        self.assertEqual(Notification.objects.count(), 1)
+        response = self.hanyuan_client.get(TWEET_DETAIL_API.format(tweet.id))
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertEqual(response.data['comments'][0]['likes_count'], 0)
+
+        # nothing left to flush
+        self.assertEqual(flush_like_intents_task(), '0 likes flushed')
+        self.assertEqual(Tweet.objects.get(id=tweet.id).like_set.count(), 1)
@@ -2,7 +2,9 @@ from likes.api.serializers import (
     LikeSerializer,
     LikeSerializerForCreate,
     LikeSerializerForCancel,
+    LikeStatusSerializer,
 )
+from likes.intents import LikeIntents
 from likes.models import Like
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
@@ -29,7 +31,8 @@ class LikeViewSet(viewsets.GenericViewSet):
                 'errors': serializer.errors,
             }, status=status.HTTP_400_BAD_REQUEST)
         instance, created = serializer.get_or_create()
-        if created:
+        # written behind likes are notified when they are saved
+        if created and not LikeIntents.is_enabled():
             NotificationService.send_like_notification(instance)
         return Response(
             LikeSerializer(instance).data,
@@ -52,4 +55,26 @@ class LikeViewSet(viewsets.GenericViewSet):
         return Response({
             'success': True,
             'deleted': deleted,
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+        }, status=status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=False, url_path='status')
+    @required_params(method='POST', params=['objects'])
+    def like_status(self, request, *args, **kwargs):
+        """
+        POST /api/likes/status/ with
+        {"objects": [{"content_type": "tweet", "object_id": 1}, ...]}
+        returns has_liked and likes_count of all the objects at once, so that
+        clients can render a whole timeline with one request.
+        """
+        serializer = LikeStatusSerializer(
+            data=request.data,
+            context={'request': request},
+        )
+        if not serializer.is_valid():
+            return Response({
+                'message': 'Please check input',
+                'errors': serializer.errors,
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'results': serializer.get_statuses(),
+        }, status=status.HTTP_200_OK)
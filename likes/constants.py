@@ -0,0 +1,2 @@
+# max number of (content_type, object_id) pairs in one /api/likes/status/
+LIKE_STATUS_BATCH_LIMIT = 200
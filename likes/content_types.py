@@ -0,0 +1,81 @@
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+
+
+class LikeContentTypes(object):
+    """
+    Registry of the models which can be liked. Their content type ids are
+    resolved once and memoized for the life of the process, so like queries
+    filter by the integer content_type_id without going through model
+    metadata and ContentType.objects.get_for_model every time.
+    The ids are resolved lazily on first use instead of at import / ready()
+    time, when the database (or the test database) might not be ready yet.
+    """
+    TWEET = 'tweet'
+    COMMENT = 'comment'
+    CHOICES = (TWEET, COMMENT)
+
+    # content type name => (app_label, model)
+    _natural_keys = {
+        TWEET: ('tweets', 'tweet'),
+        COMMENT: ('comments', 'comment'),
+    }
+    _ids = {}
+    _names_by_id = {}
+
+    @classmethod
+    def _load(cls):
+        # all the likeable content types are resolved with one query
+        natural_keys = {
+            natural_key: name
+            for name, natural_key in cls._natural_keys.items()
+        }
+        content_types = ContentType.objects.filter(
+            app_label__in=[app_label for app_label, _ in natural_keys],
+            model__in=[model for _, model in natural_keys],
+        )
+        for content_type in content_types:
+            name = natural_keys.get((content_type.app_label, content_type.model))
+            if name is not None:
+                cls._ids[name] = content_type.id
+                cls._names_by_id[content_type.id] = name
+
+    @classmethod
+    def get_id(cls, name):
+        if not cls._ids:
+            cls._load()
+        return cls._ids[name]
+
+    @classmethod
+    def tweet_id(cls):
+        return cls.get_id(cls.TWEET)
+
+    @classmethod
+    def comment_id(cls):
+        return cls.get_id(cls.COMMENT)
+
+    @classmethod
+    def get_id_for_model(cls, model_class):
+        return cls.get_id(model_class._meta.model_name)
+
+    @classmethod
+    def get_name(cls, content_type_id):
+        if not cls._names_by_id:
+            cls._load()
+        return cls._names_by_id.get(content_type_id)
+
+    @classmethod
+    def get_model_class(cls, name):
+        if name not in cls._natural_keys:
+            return None
+        return apps.get_model(*cls._natural_keys[name])
+
+    @classmethod
+    def get_model_class_by_id(cls, content_type_id):
+        return cls.get_model_class(cls.get_name(content_type_id))
+
+    @classmethod
+    def clear(cls):
+        # the ids change when the database is recreated, e.g. by a test run
+        cls._ids.clear()
+        cls._names_by_id.clear()
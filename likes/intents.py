@@ -0,0 +1,229 @@
+from django.conf import settings
+from django.utils import timezone
+from inbox.services import NotificationService
+from likes.content_types import LikeContentTypes
+from likes.models import Like
+from likes.shards import LikeShards
+from twitter.cache import (
+    APPLYING_LIKE_INTENTS_PATTERN,
+    FLUSHING_LIKE_INTENTS_KEY,
+    LIKE_INTENTS_FLUSH_LOCK_KEY,
+    PENDING_LIKE_INTENTS_KEY,
+)
+from utils.redis_client import RedisClient
+from utils.redis_counters import RedisCounter
+from utils.time_constants import ONE_MINUTE
+
+
+class LikeIntents(object):
+    """
+    Write-behind of likes, enabled by settings.LIKE_WRITE_BEHIND. Liking and
+    canceling only record the intent in a redis hash of
+    {user_id:content_type_id:object_id: LIKE or CANCEL}, so the same like
+    clicked many times is one field and only the last intent counts.
+    flush() applies the intents to the database with one bulk insert and one
+    delete per shard, then updates the counters and sends the notifications
+    of the likes it inserted, shard by shard, see _apply.
+
+    Until then, has_liked of the user is projected from the intents, see
+    LikeService.
+    """
+
+    LIKE = b'1'
+    CANCEL = b'0'
+    FLUSH_LOCK_EXPIRE_TIME = ONE_MINUTE
+
+    @classmethod
+    def is_enabled(cls):
+        return settings.LIKE_WRITE_BEHIND
+
+    @classmethod
+    def _field(cls, user_id, content_type_id, object_id):
+        return '{}:{}:{}'.format(user_id, content_type_id, object_id)
+
+    @classmethod
+    def get_intents(cls, user, pairs):
+        """
+        pairs is a list of (content_type_id, object_id), return
+        {(content_type_id, object_id): is_like} of the ones with an intent not
+        yet applied to the database
+        """
+        if not cls.is_enabled() or user.is_anonymous or not pairs:
+            return {}
+        pairs = list(pairs)
+        fields = [
+            cls._field(user.id, content_type_id, object_id)
+            for content_type_id, object_id in pairs
+        ]
+        conn = RedisClient.get_connection()
+        pipeline = conn.pipeline()
+        pipeline.hmget(PENDING_LIKE_INTENTS_KEY, fields)
+        pipeline.hmget(FLUSHING_LIKE_INTENTS_KEY, fields)
+        pending_intents, flushing_intents = pipeline.execute()
+
+        intents = {}
+        for pair, pending, flushing in zip(pairs, pending_intents, flushing_intents):
+            # the pending intent is newer than the one being flushed
+            intent = pending if pending is not None else flushing
+            if intent is not None:
+                intents[pair] = intent == cls.LIKE
+        return intents
+
+    @classmethod
+    def _add(cls, user, content_type_id, object_id, intent):
+        conn = RedisClient.get_connection()
+        conn.hset(
+            PENDING_LIKE_INTENTS_KEY,
+            cls._field(user.id, content_type_id, object_id),
+            intent,
+        )
+
+    @classmethod
+    def like(cls, user, content_type_id, object_id, has_liked):
+        """
+        return the like as it will be saved and whether it is a new one.
+        has_liked is the projected state before this intent.
+        """
+        cls._add(user, content_type_id, object_id, cls.LIKE)
+        like = Like(
+            user=user,
+            content_type_id=content_type_id,
+            object_id=object_id,
+            created_at=timezone.now(),
+        )
+        return like, not has_liked
+
+    @classmethod
+    def cancel(cls, user, content_type_id, object_id, has_liked):
+        # return the number of likes to be deleted, like LikeService.cancel_like
+        cls._add(user, content_type_id, object_id, cls.CANCEL)
+        return 1 if has_liked else 0
+
+    @classmethod
+    def flush(cls):
+        """
+        Apply the intents to the database, return the number of likes created
+        and deleted. Same as RedisCounter.flush, the pending hash is renamed
+        first and a failed flush is retried by the next one.
+        """
+        conn = RedisClient.get_connection()
+        if not conn.set(
+            LIKE_INTENTS_FLUSH_LOCK_KEY,
+            1,
+            ex=cls.FLUSH_LOCK_EXPIRE_TIME,
+            nx=True,
+        ):
+            return 0
+        try:
+            return cls._flush(conn)
+        finally:
+            conn.delete(LIKE_INTENTS_FLUSH_LOCK_KEY)
+
+    @classmethod
+    def _flush(cls, conn):
+        if not conn.exists(FLUSHING_LIKE_INTENTS_KEY):
+            if not conn.exists(PENDING_LIKE_INTENTS_KEY):
+                return 0
+            conn.rename(PENDING_LIKE_INTENTS_KEY, FLUSHING_LIKE_INTENTS_KEY)
+
+        # {shard alias: {(user_id, content_type_id, object_id): is_like}}
+        intents_by_alias = {}
+        for field, intent in conn.hgetall(FLUSHING_LIKE_INTENTS_KEY).items():
+            key = cls._parse_field(field)
+            intents_by_alias.setdefault(
+                LikeShards.get_alias(key[2]),
+                {},
+            )[key] = intent == cls.LIKE
+
+        changed = 0
+        for alias, intents in intents_by_alias.items():
+            changed += cls._apply(conn, alias, intents)
+        conn.delete(FLUSHING_LIKE_INTENTS_KEY)
+        return changed
+
+    @classmethod
+    def _parse_field(cls, field):
+        return tuple(int(value) for value in field.split(b':'))
+
+    @classmethod
+    def _get_likes(cls, alias, keys):
+        # {(user_id, content_type_id, object_id): like} of the saved likes
+        # among keys, with one query
+        if not keys:
+            return {}
+        likes = Like.objects.using(alias).filter(
+            user_id__in={key[0] for key in keys},
+            content_type_id__in={key[1] for key in keys},
+            object_id__in={key[2] for key in keys},
+        )
+        likes_by_key = {}
+        for like in likes:
+            key = (like.user_id, like.content_type_id, like.object_id)
+            if key in keys:
+                likes_by_key[key] = like
+        return likes_by_key
+
+    @classmethod
+    def _apply(cls, conn, alias, intents):
+        """
+        Apply the intents of one shard, return the number of likes created
+        and deleted. The likes to insert are recorded in a redis set first.
+        The likes of the set which are saved get their counters and
+        notifications, together with the removal of the intents from the
+        flushing hash, in one redis transaction. So if anything fails, the
+        retry finds the likes inserted by the failed flush in the set, and
+        their counters and notifications are neither lost nor repeated.
+        """
+        applying_key = APPLYING_LIKE_INTENTS_PATTERN.format(alias=alias)
+        existing_likes = cls._get_likes(alias, set(intents))
+        new_keys = [
+            key for key, is_like in intents.items()
+            if is_like and key not in existing_likes
+        ]
+        if new_keys:
+            conn.sadd(applying_key, *[cls._field(*key) for key in new_keys])
+            # ignore_conflicts: a like saved by the synchronous api in the
+            # meantime is left as it is
+            Like.objects.using(alias).bulk_create([
+                Like(user_id=user_id, content_type_id=content_type_id, object_id=object_id)
+                for user_id, content_type_id, object_id in new_keys
+            ], ignore_conflicts=True)
+
+        deleted_ids = [
+            like.id
+            for key, like in existing_likes.items()
+            if not intents[key]
+        ]
+        deleted = 0
+        if deleted_ids:
+            # post_delete of each like decreases the likes counts
+            deleted, _ = Like.objects.using(alias).filter(
+                id__in=deleted_ids,
+            ).delete()
+
+        # the bulk insert sends no post_save, do what the listeners and the
+        # like api do for a new like
+        applying_keys = {
+            cls._parse_field(field)
+            for field in conn.smembers(applying_key)
+        }
+        created_likes = cls._get_likes(alias, applying_keys).values()
+        pipeline = conn.pipeline()
+        for like in created_likes:
+            model_class = LikeContentTypes.get_model_class_by_id(like.content_type_id)
+            if model_class is not None:
+                RedisCounter.incr(
+                    model_class,
+                    'likes_count',
+                    like.object_id,
+                    pipeline=pipeline,
+                )
+            NotificationService.send_like_notification(like, pipeline=pipeline)
+        pipeline.hdel(
+            FLUSHING_LIKE_INTENTS_KEY,
+            *[cls._field(*key) for key in intents],
+        )
+        pipeline.delete(applying_key)
+        pipeline.execute()
+        NotificationService.deliver_inline()
+        return len(created_likes) + deleted
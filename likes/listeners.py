@@ -0,0 +1,39 @@
+from likes.content_types import LikeContentTypes
+from utils.redis_counters import RedisCounter
+
+
+def _update_likes_count(instance, amount):
+    model_class = LikeContentTypes.get_model_class_by_id(instance.content_type_id)
+    if model_class is None:
+        return
+    # the increment is absorbed by redis and flushed into the likes_count
+    # column in batches, so a like storm does not lock the row of a hot tweet
+    RedisCounter.incr(model_class, 'likes_count', instance.object_id, amount)
+
+
+def incr_likes_count(sender, instance, created, **kwargs):
+    if not created or instance.content_type_id is None:
+        return
+    _update_likes_count(instance, 1)
+
+
+def decr_likes_count(sender, instance, **kwargs):
+    if instance.content_type_id is None:
+        return
+    _update_likes_count(instance, -1)
+
+
+def delete_user_likes(sender, instance, **kwargs):
+    # the likes are not deleted with the user, there is no foreign key across
+    # the databases. They are deleted one by one from every shard, so the
+    # likes_count of the liked objects is decreased too.
+    # import inside the function to avoid circular import
+    from likes.models import Like
+    from likes.shards import LikeShards
+    for alias in LikeShards.get_aliases():
+        Like.objects.using(alias).filter(user_id=instance.id).delete()
+
+
+def clear_like_content_types(sender, **kwargs):
+    # content type ids change when the database is migrated from scratch
+    LikeContentTypes.clear()
@@ -0,0 +1,151 @@
+from dateutil import parser
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from likes.models import Like
+from likes.shards import LikeShards
+from twitter.cache import LIKE_BACKFILL_PATTERN
+from utils.redis_client import RedisClient
+from utils.time_helpers import utc_now
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the likes saved before sharding from the likes table of the '
+        'default database into the LIKE_SHARDS databases, by '
+        'object_id % number of shards. The progress is kept in redis, the '
+        'next runs copy only the likes saved since and apply the likes '
+        'cancelled since.'
+    )
+    # Deploy order:
+    #   1. create the shard databases (see provision.sh) and run
+    #      `manage.py migrate --database <shard>` for each of them
+    #   2. run this command, while the old code still saves likes in default.
+    #      It must finish before step 3 starts.
+    #   3. deploy the code reading likes from the shards
+    #   4. run this command again for the likes saved and cancelled by the
+    #      old code during the deploy
+    # The first run records the last id it copied and the time it ended.
+    # The next runs copy the likes above that id only, so the likes
+    # cancelled on the new code are not copied back. The likes copied by the
+    # first run which are gone from the source were cancelled on the old
+    # code, they are deleted from the shards.
+    # The likes table of default is left as it is, drop it once the shards
+    # are checked.
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--source', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        source = options['source']
+        table_names = connections[source].introspection.table_names()
+        if Like._meta.db_table not in table_names:
+            self.stdout.write('no likes table in {}, nothing to copy'.format(source))
+            return
+
+        batch_size = options['batch_size']
+        conn = RedisClient.get_connection()
+        key = LIKE_BACKFILL_PATTERN.format(source=source)
+        state = conn.hgetall(key)
+        last_id = int(state.get(b'last_id', 0))
+        copied, last_id = self.backfill(source, last_id, batch_size)
+        self.stdout.write('{} likes copied into the shards'.format(copied))
+
+        if b'first_run_ended_at' in state:
+            first_run_ended_at = parser.isoparse(
+                state[b'first_run_ended_at'].decode(),
+            )
+            deleted = self.delete_cancelled_likes(
+                source,
+                first_run_ended_at,
+                batch_size,
+            )
+            self.stdout.write('{} likes deleted from the shards'.format(deleted))
+        else:
+            conn.hset(key, 'first_run_ended_at', utc_now().isoformat())
+        conn.hset(key, 'last_id', last_id)
+
+    @classmethod
+    def backfill(cls, source, last_id, batch_size):
+        # bulk_create sets created_at to now because of auto_now_add, the
+        # time of the likes is kept instead
+        created_at_field = Like._meta.get_field('created_at')
+        created_at_field.auto_now_add = False
+        try:
+            return cls._backfill(source, last_id, batch_size)
+        finally:
+            created_at_field.auto_now_add = True
+
+    @classmethod
+    def _backfill(cls, source, last_id, batch_size):
+        copied = 0
+        while True:
+            likes = list(
+                Like.objects.using(source)
+                .filter(id__gt=last_id)
+                .order_by('id')[:batch_size]
+            )
+            if not likes:
+                return copied, last_id
+            last_id = likes[-1].id
+
+            likes_by_alias = {}
+            for like in likes:
+                likes_by_alias.setdefault(
+                    LikeShards.get_alias(like.object_id),
+                    [],
+                ).append(Like(
+                    user_id=like.user_id,
+                    content_type_id=like.content_type_id,
+                    object_id=like.object_id,
+                    created_at=like.created_at,
+                ))
+            for alias, shard_likes in likes_by_alias.items():
+                # the shard ids are not kept, they would collide with the
+                # likes saved in the shard. ignore_conflicts on
+                # <user, content_type, object_id> skips the copied ones.
+                Like.objects.using(alias).bulk_create(
+                    shard_likes,
+                    ignore_conflicts=True,
+                )
+            copied += len(likes)
+
+    @classmethod
+    def delete_cancelled_likes(cls, source, first_run_ended_at, batch_size):
+        """
+        The likes in the shards created before the first run ended were
+        copied from the source, the ones missing from the source now were
+        cancelled on the old code since.
+        """
+        deleted = 0
+        for alias in LikeShards.get_aliases():
+            last_id = 0
+            while True:
+                likes = list(
+                    Like.objects.using(alias)
+                    .filter(id__gt=last_id, created_at__lte=first_run_ended_at)
+                    .order_by('id')
+                    .only('id', 'user_id', 'content_type_id', 'object_id')[:batch_size]
+                )
+                if not likes:
+                    break
+                last_id = likes[-1].id
+
+                source_keys = set(
+                    Like.objects.using(source).filter(
+                        user_id__in={like.user_id for like in likes},
+                        object_id__in={like.object_id for like in likes},
+                    ).values_list('user_id', 'content_type_id', 'object_id')
+                )
+                cancelled_ids = [
+                    like.id for like in likes
+                    if (like.user_id, like.content_type_id, like.object_id)
+                    not in source_keys
+                ]
+                if cancelled_ids:
+                    # no post_delete signals, the old code has already taken
+                    # the cancelled likes off the likes_count columns
+                    deleted += Like.objects.using(alias).filter(
+                        id__in=cancelled_ids,
+                    )._raw_delete(alias)
+        return deleted
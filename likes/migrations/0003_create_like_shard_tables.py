@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# The likes tables of the shards are created here instead of by 0001, whose
+# foreign key constraints refer to tables which only exist in default. The
+# router only runs this on the LIKE_SHARDS databases, see likes/routers.py.
+LIKE_SHARD_HINTS = {'model_name': 'like', 'like_shard': True}
+
+
+def create_like_table(apps, schema_editor):
+    Like = apps.get_model('likes', 'Like')
+    # the table may have been created by 0001 on databases without foreign
+    # key constraint checks, e.g. sqlite
+    table_names = schema_editor.connection.introspection.table_names()
+    if Like._meta.db_table not in table_names:
+        schema_editor.create_model(Like)
+
+
+def drop_like_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('likes', 'Like'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('likes', '0002_auto_20261018_2102'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_like_table,
+            drop_like_table,
+            hints=LIKE_SHARD_HINTS,
+        ),
+    ]
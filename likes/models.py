@@ -2,19 +2,36 @@ from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models.signals import post_delete, post_migrate, post_save
+from likes.listeners import (
+    clear_like_content_types,
+    decr_likes_count,
+    delete_user_likes,
+    incr_likes_count,
+)
 
 
 class Like(models.Model):
     # https://docs.djangoproject.com/en/3.1/ref/contrib/contenttypes/#generic-relations
+    # Likes are sharded by object_id into their own databases (see
+    # likes/routers.py). Users and content types stay in default, so there is
+    # no foreign key constraint. The likes of a deleted user are deleted by
+    # the delete_user_likes listener.
     object_id = models.PositiveIntegerField() # comment id or tweet id
     content_type = models.ForeignKey(
         ContentType, # specifically what type the object is
-        on_delete=models.SET_NULL,
+        on_delete=models.DO_NOTHING,
         null=True,
+        db_constraint=False,
     )
     # user liked content_object at created_at
     content_object = GenericForeignKey('content_type', 'object_id')
-    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        db_constraint=False,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -40,4 +57,10 @@ class Like(models.Model):
             self.user,
             self.content_type,
             self.object_id,
-        )
\ No newline at end of file
+        )
+
+
+post_save.connect(incr_likes_count, sender=Like)
+post_delete.connect(decr_likes_count, sender=Like)
+post_delete.connect(delete_user_likes, sender=User)
+post_migrate.connect(clear_like_content_types)
@@ -0,0 +1,46 @@
+from django.conf import settings
+
+LIKE_MODEL = 'likes.like'
+
+
+class LikeShardRouter(object):
+    """
+    Likes live in the LIKE_SHARDS databases, sharded by the id of the liked
+    object, everything else lives in default.
+    The shard of a query can not be told from the model alone, so queries of
+    likes must pick their shard with LikeShards (see likes/shards.py). Only
+    saving / deleting a like instance is routed here by its object_id.
+    """
+
+    def _get_like_alias(self, hints):
+        # import inside the function, routers are loaded before the apps
+        from likes.shards import LikeShards
+        instance = hints.get('instance')
+        if instance is None or instance._meta.label_lower != LIKE_MODEL:
+            return None
+        return LikeShards.get_alias(instance.object_id)
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower == LIKE_MODEL:
+            return self._get_like_alias(hints)
+        # also for the related objects of a like, e.g. like.user, which would
+        # be read from the shard of the like otherwise
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # likes refer to users and content types in default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        is_like = '{}.{}'.format(app_label, model_name) == LIKE_MODEL
+        if db in settings.LIKE_SHARDS:
+            # users and content types are not in the shards, the foreign key
+            # constraints of likes/migrations/0001 can not be created there.
+            # The shard tables are created by 0003 without them instead.
+            return is_like and hints.get('like_shard', False)
+        if is_like:
+            return False
+        return None
@@ -1,14 +1,196 @@
+import heapq
+
+from django.db.models import Count
+from likes.content_types import LikeContentTypes
+from likes.intents import LikeIntents
 from likes.models import Like
-from django.contrib.contenttypes.models import ContentType
+from likes.shards import LikeShards
+from utils.paginations import decode_cursor, encode_cursor, filter_before
+from utils.redis_counters import RedisCounter
+
 
 class LikeService(object):
+    """
+    Likes are sharded by object_id (see likes/shards.py), all the queries of
+    likes go through here to pick their shards.
+    has_liked is projected from the intents not yet saved when likes are
+    written behind, see likes/intents.py.
+    """
+
+    @classmethod
+    def get_likes(cls, model_class, object_id):
+        # served by the <content_type, object_id, created_at> index
+        return LikeShards.get_queryset(object_id).filter(
+            content_type_id=LikeContentTypes.get_id_for_model(model_class),
+            object_id=object_id,
+        ).order_by('-created_at')
+
+    @classmethod
+    def get_or_create_like(cls, user, content_type_id, object_id):
+        return LikeShards.get_queryset(object_id).get_or_create(
+            content_type_id=content_type_id,
+            object_id=object_id,
+            user=user,
+        )
+
+    @classmethod
+    def cancel_like(cls, user, content_type_id, object_id):
+        deleted, _ = LikeShards.get_queryset(object_id).filter(
+            content_type_id=content_type_id,
+            object_id=object_id,
+            user=user,
+        ).delete()
+        return deleted
 
     @classmethod
     def has_liked(cls, user, target):
+        return cls.has_liked_by_id(
+            user,
+            LikeContentTypes.get_id_for_model(target.__class__),
+            target.id,
+        )
+
+    @classmethod
+    def has_liked_by_id(cls, user, content_type_id, object_id):
         if user.is_anonymous:
             return False
-        return Like.objects.filter(
-            content_type=ContentType.objects.get_for_model(target.__class__),
-            object_id=target.id,
+        intents = LikeIntents.get_intents(user, [(content_type_id, object_id)])
+        if intents:
+            return intents[(content_type_id, object_id)]
+        return LikeShards.get_queryset(object_id).filter(
+            content_type_id=content_type_id,
+            object_id=object_id,
             user=user,
-        ).exists()
\ No newline at end of file
+        ).exists()
+
+    @classmethod
+    def get_liked_object_ids(cls, user, model_class, object_ids):
+        """
+        bulk version of has_liked, return the ids of the objects liked by the
+        user, in one query per shard on the <user, content_type, object_id>
+        index
+        """
+        if user.is_anonymous or not object_ids:
+            return set()
+        content_type_id = LikeContentTypes.get_id_for_model(model_class)
+        liked_object_ids = set()
+        for alias, shard_object_ids in LikeShards.group_object_ids(object_ids).items():
+            liked_object_ids.update(Like.objects.using(alias).filter(
+                content_type_id=content_type_id,
+                object_id__in=shard_object_ids,
+                user=user,
+            ).values_list('object_id', flat=True))
+
+        intents = LikeIntents.get_intents(
+            user,
+            [(content_type_id, object_id) for object_id in object_ids],
+        )
+        for (_, object_id), is_like in intents.items():
+            if is_like:
+                liked_object_ids.add(object_id)
+            else:
+                liked_object_ids.discard(object_id)
+        return liked_object_ids
+
+    @classmethod
+    def get_likes_counts(cls, model_class, object_ids):
+        """
+        return {object_id: number of likes} of the objects in one GROUP BY
+        query per shard on the <content_type, object_id, created_at> index
+        """
+        content_type_id = LikeContentTypes.get_id_for_model(model_class)
+        counts = {}
+        for alias, shard_object_ids in LikeShards.group_object_ids(object_ids).items():
+            rows = Like.objects.using(alias).filter(
+                content_type_id=content_type_id,
+                object_id__in=shard_object_ids,
+            ).values('object_id').annotate(count=Count('id'))
+            counts.update({row['object_id']: row['count'] for row in rows})
+        return counts
+
+    @classmethod
+    def get_user_likes(cls, user, limit, cursor=None):
+        """
+        The latest likes of the user, newest first, older than the cursor if
+        any (see utils/paginations.py). The likes of a user are spread over
+        all the shards, each shard returns its latest `limit` likes with the
+        <user, content_type, created_at> index and they are merged by
+        (created_at, global id), see LikeShards.get_global_id.
+        """
+        position = None if cursor is None else decode_cursor(cursor)
+        likes_lists = []
+        for alias in LikeShards.get_aliases():
+            queryset = Like.objects.using(alias).filter(user=user)
+            if position is not None:
+                created_at, global_id = position
+                queryset = filter_before(
+                    queryset,
+                    created_at,
+                    None if global_id is None else LikeShards.get_id_bound(alias, global_id),
+                )
+            likes_lists.append(list(
+                queryset.order_by('-created_at', '-id')[:limit]
+            ))
+        return list(heapq.merge(
+            *likes_lists,
+            key=lambda like: (like.created_at, LikeShards.get_global_id(like)),
+            reverse=True,
+        ))[:limit]
+
+    @classmethod
+    def get_user_likes_cursor(cls, likes):
+        # cursor of the page older than the likes returned by get_user_likes
+        if not likes:
+            return None
+        last = likes[-1]
+        return encode_cursor(last.created_at, LikeShards.get_global_id(last))
+
+    @classmethod
+    def get_like_statuses(cls, user, targets):
+        """
+        targets is a list of (content_type name, object_id). Return the
+        has_liked flag and the likes count of each of them, in the same order.
+        has_liked of all the targets is one query per shard on the
+        <user, content_type, object_id> index, the counts are read from the
+        redis counters.
+        """
+        object_ids_by_name = {}
+        for name, object_id in targets:
+            object_ids_by_name.setdefault(name, set()).add(object_id)
+
+        liked_pairs = set()
+        if not user.is_anonymous and targets:
+            content_type_ids = [
+                LikeContentTypes.get_id(name) for name in object_ids_by_name
+            ]
+            object_ids = {object_id for _, object_id in targets}
+            for alias, shard_object_ids in LikeShards.group_object_ids(object_ids).items():
+                liked_pairs.update(Like.objects.using(alias).filter(
+                    user=user,
+                    content_type_id__in=content_type_ids,
+                    object_id__in=shard_object_ids,
+                ).values_list('content_type_id', 'object_id'))
+            intents = LikeIntents.get_intents(user, [
+                (LikeContentTypes.get_id(name), object_id)
+                for name, object_id in targets
+            ])
+            for pair, is_like in intents.items():
+                if is_like:
+                    liked_pairs.add(pair)
+                else:
+                    liked_pairs.discard(pair)
+
+        counts_by_name = {
+            name: RedisCounter.get_counts_by_ids(
+                LikeContentTypes.get_model_class(name),
+                'likes_count',
+                list(object_ids),
+            )
+            for name, object_ids in object_ids_by_name.items()
+        }
+        return [{
+            'content_type': name,
+            'object_id': object_id,
+            'has_liked': (LikeContentTypes.get_id(name), object_id) in liked_pairs,
+            'likes_count': counts_by_name[name].get(object_id, 0),
+        } for name, object_id in targets]
@@ -0,0 +1,54 @@
+from django.conf import settings
+from likes.models import Like
+
+
+class LikeShards(object):
+    """
+    Likes of the same object are in the same shard, so the likes of a tweet
+    or a comment (and the likes count) are read from one database. Likes of
+    the same user are spread over all the shards.
+    """
+
+    @classmethod
+    def get_aliases(cls):
+        return settings.LIKE_SHARDS
+
+    @classmethod
+    def get_alias(cls, object_id):
+        aliases = cls.get_aliases()
+        return aliases[object_id % len(aliases)]
+
+    @classmethod
+    def get_global_id(cls, like):
+        """
+        Like ids are only unique in their shard. id * number of shards +
+        index of the shard is unique over all the shards, and keeps the order
+        of the ids in each shard. like must be loaded from its shard.
+        """
+        aliases = cls.get_aliases()
+        return like.id * len(aliases) + aliases.index(like._state.db)
+
+    @classmethod
+    def get_id_bound(cls, alias, global_id):
+        # the likes in the shard with a global id < global_id are the ones
+        # with an id < the returned bound
+        aliases = cls.get_aliases()
+        return -(-(global_id - aliases.index(alias)) // len(aliases))
+
+    @classmethod
+    def get_queryset(cls, object_id):
+        return Like.objects.using(cls.get_alias(object_id))
+
+    @classmethod
+    def group_object_ids(cls, object_ids):
+        """
+        return {alias: [object ids in the shard]}, only the shards with
+        objects are included
+        """
+        object_ids_by_alias = {}
+        for object_id in object_ids:
+            object_ids_by_alias.setdefault(
+                cls.get_alias(object_id),
+                [],
+            ).append(object_id)
+        return object_ids_by_alias
@@ -0,0 +1,9 @@
+from celery import shared_task
+from likes.intents import LikeIntents
+
+
+# shorter than LikeIntents.FLUSH_LOCK_EXPIRE_TIME, so the lock never expires
+# while the task is still running
+@shared_task(time_limit=50)
+def flush_like_intents_task():
+    return '{} likes flushed'.format(LikeIntents.flush())
@@ -0,0 +1,306 @@
+from comments.models import Comment
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connections
+from django.test import override_settings
+from io import StringIO
+from likes.content_types import LikeContentTypes
+from likes.intents import LikeIntents
+from likes.models import Like
+from likes.services import LikeService
+from likes.shards import LikeShards
+from notifications.models import Notification
+from testing.testcases import TestCase
+from tweets.models import Tweet
+from twitter.cache import (
+    APPLYING_LIKE_INTENTS_PATTERN,
+    FLUSHING_LIKE_INTENTS_KEY,
+    PENDING_LIKE_INTENTS_KEY,
+)
+from utils.redis_client import RedisClient
+from utils.redis_counters import RedisCounter
+from utils.time_helpers import utc_now
+
+
+class LikeContentTypesTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.hanyuan = self.create_user('hanyuan')
+        self.tweet = self.create_tweet(self.hanyuan)
+        self.comment = self.create_comment(self.hanyuan, self.tweet)
+
+    def test_content_type_ids(self):
+        tweet_id = ContentType.objects.get_for_model(Tweet).id
+        comment_id = ContentType.objects.get_for_model(Comment).id
+        self.assertEqual(LikeContentTypes.tweet_id(), tweet_id)
+        self.assertEqual(LikeContentTypes.comment_id(), comment_id)
+        self.assertEqual(LikeContentTypes.get_id_for_model(Comment), comment_id)
+        self.assertEqual(LikeContentTypes.get_model_class_by_id(tweet_id), Tweet)
+        self.assertEqual(LikeContentTypes.get_model_class('comment'), Comment)
+        self.assertIsNone(LikeContentTypes.get_model_class('user'))
+
+        # resolved once, no more content type queries
+        LikeContentTypes.clear()
+        ContentType.objects.clear_cache()
+        LikeContentTypes.tweet_id()
+        with self.assertNoQueries():
+            LikeContentTypes.get_name(comment_id)
+            LikeContentTypes.get_id_for_model(Tweet)
+
+    def test_like_queries_use_content_type_id(self):
+        like = self.create_like(self.hanyuan, self.comment)
+        self.create_like(self.hanyuan, self.tweet)
+        with self.assertNumQueries(
+            1,
+            using=LikeShards.get_alias(self.comment.id),
+        ):
+            self.assertEqual(list(self.comment.like_set), [like])
+        self.assertEqual(
+            LikeService.get_liked_object_ids(self.hanyuan, Comment, [self.comment.id]),
+            {self.comment.id},
+        )
+
+
+class LikeShardsTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.hanyuan = self.create_user('hanyuan')
+        self.ming = self.create_user('ming')
+
+    def test_like_is_stored_in_the_shard_of_the_object(self):
+        tweets = [self.create_tweet(self.ming) for _ in range(4)]
+        for tweet in tweets:
+            self.create_like(self.hanyuan, tweet)
+        for tweet in tweets:
+            alias = LikeShards.get_alias(tweet.id)
+            self.assertEqual(alias, settings.LIKE_SHARDS[tweet.id % 2])
+            self.assertTrue(Like.objects.using(alias).filter(
+                object_id=tweet.id,
+            ).exists())
+            for other_alias in settings.LIKE_SHARDS:
+                if other_alias == alias:
+                    continue
+                self.assertFalse(Like.objects.using(other_alias).filter(
+                    object_id=tweet.id,
+                ).exists())
+            self.assertEqual(tweet.like_set.count(), 1)
+            self.assertEqual(tweet.like_set.first().user, self.hanyuan)
+
+        self.assertEqual(
+            LikeService.get_liked_object_ids(
+                self.hanyuan,
+                Tweet,
+                [tweet.id for tweet in tweets],
+            ),
+            {tweet.id for tweet in tweets},
+        )
+        self.assertEqual(LikeService.cancel_like(
+            self.hanyuan,
+            LikeContentTypes.tweet_id(),
+            tweets[0].id,
+        ), 1)
+        self.assertFalse(LikeService.has_liked(self.hanyuan, tweets[0]))
+
+    def test_get_user_likes_across_shards(self):
+        tweets = [self.create_tweet(self.ming) for _ in range(5)]
+        likes = [self.create_like(self.hanyuan, tweet) for tweet in tweets]
+        self.create_like(self.ming, tweets[0])
+
+        user_likes = LikeService.get_user_likes(self.hanyuan, limit=3)
+        self.assertEqual(
+            [like.id for like in user_likes],
+            [like.id for like in likes[::-1][:3]],
+        )
+        user_likes = LikeService.get_user_likes(
+            self.hanyuan,
+            limit=3,
+            cursor=LikeService.get_user_likes_cursor(user_likes),
+        )
+        self.assertEqual(
+            [like.object_id for like in user_likes],
+            [tweets[1].id, tweets[0].id],
+        )
+
+        # likes created at the same time are ordered by global id, none of
+        # them is dropped at the page boundary
+        for like in likes:
+            Like.objects.using(LikeShards.get_alias(like.object_id)).filter(
+                id=like.id,
+            ).update(created_at=likes[0].created_at)
+        object_ids, cursor = [], None
+        for _ in range(3):
+            user_likes = LikeService.get_user_likes(self.hanyuan, 2, cursor)
+            object_ids += [like.object_id for like in user_likes]
+            cursor = LikeService.get_user_likes_cursor(user_likes)
+        self.assertEqual(sorted(object_ids), [tweet.id for tweet in tweets])
+
+    def test_shard_tables_have_no_foreign_keys(self):
+        for alias in settings.LIKE_SHARDS:
+            with connections[alias].cursor() as cursor:
+                constraints = connections[alias].introspection.get_constraints(
+                    cursor,
+                    Like._meta.db_table,
+                )
+            self.assertEqual(
+                [name for name, c in constraints.items() if c['foreign_key']],
+                [],
+            )
+
+    def test_backfill_like_shards(self):
+        out = StringIO()
+        call_command('backfill_like_shards', stdout=out)
+        self.assertIn('no likes table in default', out.getvalue())
+
+        # likes saved before sharding, another shard stands for the likes
+        # table of default here
+        source = settings.LIKE_SHARDS[1]
+        tweets = [
+            tweet for tweet in [self.create_tweet(self.ming) for _ in range(6)]
+            if LikeShards.get_alias(tweet.id) != source
+        ]
+        created_at = utc_now() - timedelta(days=1)
+        Like.objects.using(source).bulk_create([
+            Like(
+                user=self.hanyuan,
+                content_type_id=LikeContentTypes.tweet_id(),
+                object_id=tweet.id,
+            )
+            for tweet in tweets[:2]
+        ])
+        Like.objects.using(source).update(created_at=created_at)
+        # liked again after sharding
+        self.create_like(self.hanyuan, tweets[0])
+
+        out = StringIO()
+        call_command('backfill_like_shards', source=source, batch_size=1, stdout=out)
+        self.assertIn('2 likes copied into the shards', out.getvalue())
+        for tweet in tweets[:2]:
+            like = LikeShards.get_queryset(tweet.id).get(object_id=tweet.id)
+            self.assertEqual(like.user_id, self.hanyuan.id)
+        self.assertEqual(
+            LikeShards.get_queryset(tweets[1].id).get(object_id=tweets[1].id).created_at,
+            created_at,
+        )
+
+        # during the deploy: cancelled on the new code, cancelled on the old
+        # code, and liked on the old code
+        LikeService.cancel_like(
+            self.hanyuan,
+            LikeContentTypes.tweet_id(),
+            tweets[0].id,
+        )
+        Like.objects.using(source).filter(object_id=tweets[1].id).delete()
+        Like.objects.using(source).create(
+            user=self.hanyuan,
+            content_type_id=LikeContentTypes.tweet_id(),
+            object_id=tweets[2].id,
+        )
+
+        out = StringIO()
+        call_command('backfill_like_shards', source=source, batch_size=1, stdout=out)
+        self.assertIn('1 likes copied into the shards', out.getvalue())
+        self.assertIn('1 likes deleted from the shards', out.getvalue())
+        self.assertEqual(
+            [
+                tweet.id for tweet in tweets
+                if LikeShards.get_queryset(tweet.id).filter(
+                    object_id=tweet.id,
+                ).exists()
+            ],
+            [tweets[2].id],
+        )
+
+    def test_delete_user_likes(self):
+        tweets = [self.create_tweet(self.ming) for _ in range(2)]
+        for tweet in tweets:
+            self.create_like(self.hanyuan, tweet)
+            self.create_like(self.ming, tweet)
+        self.hanyuan.delete()
+        for tweet in tweets:
+            self.assertEqual(
+                list(LikeShards.get_queryset(tweet.id).filter(
+                    object_id=tweet.id,
+                ).values_list('user_id', flat=True)),
+                [self.ming.id],
+            )
+            self.assertEqual(RedisCounter.get_count(tweet, 'likes_count'), 1)
+
+    def test_admin_lists_likes_of_one_shard(self):
+        tweets = [self.create_tweet(self.ming) for _ in range(2)]
+        for tweet in tweets:
+            self.create_like(self.hanyuan, tweet)
+        admin = User.objects.create_superuser('admin', 'admin@twitter.com', 'password')
+        self.client.force_login(admin)
+        for tweet in tweets:
+            alias = LikeShards.get_alias(tweet.id)
+            response = self.client.get('/admin/likes/like/', {'shard': alias})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                [like.object_id for like in response.context['cl'].result_list],
+                [tweet.id],
+            )
+
+        like = LikeShards.get_queryset(tweets[1].id).get(object_id=tweets[1].id)
+        response = self.client.get(
+            '/admin/likes/like/{}/change/'.format(like.id),
+            {'_changelist_filters': 'shard={}'.format(like._state.db)},
+        )
+        self.assertEqual(response.context['original'].object_id, tweets[1].id)
+
+
+@override_settings(LIKE_WRITE_BEHIND=True)
+class LikeIntentsTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.hanyuan = self.create_user('hanyuan')
+        self.ming = self.create_user('ming')
+        self.tweets = [self.create_tweet(self.ming) for _ in range(2)]
+
+    def _add_intent(self, key, tweet):
+        conn = RedisClient.get_connection()
+        conn.hset(
+            key,
+            LikeIntents._field(self.hanyuan.id, LikeContentTypes.tweet_id(), tweet.id),
+            LikeIntents.LIKE,
+        )
+
+    def test_flush_skips_saved_likes(self):
+        # saved by the synchronous api, already counted and notified
+        self.create_like(self.hanyuan, self.tweets[0])
+        for tweet in self.tweets:
+            self._add_intent(PENDING_LIKE_INTENTS_KEY, tweet)
+        self.assertEqual(LikeIntents.flush(), 1)
+        for tweet in self.tweets:
+            self.assertEqual(RedisCounter.get_count(tweet, 'likes_count'), 1)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_flush_retried_after_failure(self):
+        # a flush inserted the likes of the first tweet and failed before
+        # counting them, another shard was not applied at all
+        for tweet in self.tweets:
+            self._add_intent(FLUSHING_LIKE_INTENTS_KEY, tweet)
+        tweet = self.tweets[0]
+        alias = LikeShards.get_alias(tweet.id)
+        RedisClient.get_connection().sadd(
+            APPLYING_LIKE_INTENTS_PATTERN.format(alias=alias),
+            LikeIntents._field(self.hanyuan.id, LikeContentTypes.tweet_id(), tweet.id),
+        )
+        Like.objects.using(alias).bulk_create([Like(
+            user=self.hanyuan,
+            content_type_id=LikeContentTypes.tweet_id(),
+            object_id=tweet.id,
+        )])
+
+        self.assertEqual(LikeIntents.flush(), 2)
+        for tweet in self.tweets:
+            self.assertEqual(RedisCounter.get_count(tweet, 'likes_count'), 1)
+            self.assertEqual(LikeService.has_liked(self.hanyuan, tweet), True)
+        # one notification per liked tweet
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(LikeIntents.flush(), 0)
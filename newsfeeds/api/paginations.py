@@ -0,0 +1,8 @@
+from utils.paginations import EndlessPagination
+
+
+class NewsFeedPagination(EndlessPagination):
+    # newsfeeds are paginated on (created_at, tweet_id) instead of
+    # (created_at, id), so that the pushed newsfeeds and the tweets pulled
+    # from celebrities share the same cursors, see NewsFeedViewSet
+    id_field = 'tweet_id'
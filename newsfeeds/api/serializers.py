@@ -1,6 +1,35 @@
+from django.db.models import Manager
 from rest_framework import serializers
 from newsfeeds.models import NewsFeed
 from tweets.api.serializers import TweetSerializer
+from tweets.services import TweetService
+
+
+class NewsFeedListSerializer(serializers.ListSerializer):
+    """
+    Used by NewsFeedSerializer(many=True). Loads the tweets of the newsfeeds in
+    one get_many from the tweet cache, and everything TweetSerializer needs for them in bulk.
+    """
+
+    def to_representation(self, data):
+        newsfeeds = list(data.all() if isinstance(data, Manager) else data)
+
+        # newsfeeds pulled from celebrities already have their tweets
+        tweet_ids = [
+            newsfeed.tweet_id
+            for newsfeed in newsfeeds
+            if not NewsFeed.tweet.is_cached(newsfeed)
+        ]
+        tweets = TweetService.get_tweets_by_ids(tweet_ids)
+        for newsfeed in newsfeeds:
+            if newsfeed.tweet_id in tweets:
+                newsfeed.tweet = tweets[newsfeed.tweet_id]
+
+        TweetService.preload_tweets(
+            [newsfeed.tweet for newsfeed in newsfeeds],
+            self.context['request'].user,
+        )
+        return super(NewsFeedListSerializer, self).to_representation(newsfeeds)
 
 
 class NewsFeedSerializer(serializers.ModelSerializer):
@@ -8,4 +37,5 @@ class NewsFeedSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = NewsFeed
-        fields = ('id', 'created_at', 'tweet')
\ No newline at end of file
+        fields = ('id', 'created_at', 'tweet')
+        list_serializer_class = NewsFeedListSerializer
@@ -1,8 +1,14 @@
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from newsfeeds.models import NewsFeed
+from newsfeeds.services import NewsFeedService
 from friendships.models import Friendship
 from rest_framework.test import APIClient
+from tweets.models import Tweet
 from testing.testcases import TestCase
-from utils.paginations import EndlessPagination
+from utils.paginations import EndlessPagination, encode_cursor
 
 
 NEWSFEEDS_URL = '/api/newsfeeds/'
@@ -13,6 +19,7 @@ FOLLOW_URL = '/api/friendships/{}/follow/'
 class NewsFeedApiTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.hanyuan = self.create_user('hanyuan')
         self.hanyuan_client = APIClient()
         self.hanyuan_client.force_authenticate(self.hanyuan)
@@ -46,9 +53,10 @@ class NewsFeedApiTests(TestCase):
         self.assertEqual(len(response.data['results']), 1)
         # can see other's tweets after following
         self.hanyuan_client.post(FOLLOW_URL.format(self.eric.id))
-        response = self.eric_client.post(POST_TWEETS_URL, {
-            'content': 'Hello Twitter',
-        })
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.eric_client.post(POST_TWEETS_URL, {
+                'content': 'Hello Twitter',
+            })
         posted_tweet_id = response.data['id']
         response = self.hanyuan_client.get(NEWSFEEDS_URL)
         self.assertEqual(len(response.data['results']), 2)
@@ -109,4 +117,233 @@ class NewsFeedApiTests(TestCase):
         )
         self.assertEqual(response.data['has_next_page'], False)
         self.assertEqual(len(response.data['results']), 1)
-        self.assertEqual(response.data['results'][0]['id'], new_newsfeed.id)
\ No newline at end of file
+        self.assertEqual(response.data['results'][0]['id'], new_newsfeed.id)
+
+    def test_cursor_pagination_in_cache(self):
+        followed_user = self.create_user('followed')
+        newsfeeds = [
+            self.create_newsfeed(self.hanyuan, self.create_tweet(followed_user))
+            for _ in range(3)
+        ]
+        # newsfeeds created at the same time are ordered by tweet id
+        NewsFeed.objects.filter(user=self.hanyuan).update(
+            created_at=newsfeeds[0].created_at,
+        )
+        self.clear_cache()
+        response = self.hanyuan_client.get(NEWSFEEDS_URL)
+        self.assertEqual(
+            [r['id'] for r in response.data['results']],
+            [f.id for f in newsfeeds[::-1]],
+        )
+
+        oldest = response.data['results'][-1]
+        response = self.hanyuan_client.get(NEWSFEEDS_URL, {
+            'since_cursor': encode_cursor(
+                NewsFeed.objects.get(id=oldest['id']).created_at,
+                oldest['tweet']['id'],
+            ),
+        })
+        self.assertEqual(response.data['has_newer_page'], False)
+        self.assertEqual(
+            [r['id'] for r in response.data['results']],
+            [newsfeeds[2].id, newsfeeds[1].id],
+        )
+
+    def test_cached_window(self):
+        page_size = EndlessPagination.page_size
+        list_limit = settings.REDIS_LIST_LENGTH_LIMIT
+        followed_user = self.create_user('followed')
+        newsfeeds = []
+        for i in range(list_limit + page_size):
+            tweet = self.create_tweet(followed_user)
+            newsfeeds.append(self.create_newsfeed(self.hanyuan, tweet))
+        newsfeeds = newsfeeds[::-1]
+
+        # only the latest list_limit newsfeeds are cached
+        cached_newsfeeds = NewsFeedService.get_cached_newsfeeds(self.hanyuan.id)
+        self.assertEqual(len(cached_newsfeeds), list_limit)
+        self.assertEqual(
+            [f.id for f in cached_newsfeeds],
+            [f.id for f in newsfeeds[:list_limit]],
+        )
+
+        # pages inside the cached window
+        response = self.hanyuan_client.get(NEWSFEEDS_URL)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [r['id'] for r in response.data['results']],
+            [f.id for f in newsfeeds[:page_size]],
+        )
+
+        # pages beyond the cached window are read from database
+        response = self.hanyuan_client.get(
+            NEWSFEEDS_URL,
+            {'created_at__lt': newsfeeds[list_limit - 1].created_at},
+        )
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [r['id'] for r in response.data['results']],
+            [f.id for f in newsfeeds[list_limit:]],
+        )
+
+    @override_settings(NEWSFEED_CELEBRITY_THRESHOLD=3)
+    def test_celebrity_newsfeeds(self):
+        page_size = EndlessPagination.page_size
+        # eric has 2 followers in setUp, hanyuan makes him a celebrity
+        self.hanyuan_client.post(FOLLOW_URL.format(self.eric.id))
+        self.assertEqual(NewsFeedService.is_celebrity(self.eric.id), True)
+        self.assertEqual(
+            NewsFeedService.get_followed_celebrity_ids(self.hanyuan.id),
+            [self.eric.id],
+        )
+
+        # tweets of celebrities are not fanned out
+        response = self.eric_client.post(POST_TWEETS_URL, {
+            'content': 'Hello from a celebrity',
+        })
+        celebrity_tweet_id = response.data['id']
+        self.assertEqual(
+            NewsFeed.objects.filter(tweet_id=celebrity_tweet_id).count(),
+            1,
+        )
+        self.assertEqual(
+            NewsFeed.objects.filter(
+                tweet_id=celebrity_tweet_id,
+                user=self.eric,
+            ).exists(),
+            True,
+        )
+
+        # but followers pull them when reading newsfeeds
+        self.hanyuan_client.post(POST_TWEETS_URL, {'content': 'Hello World'})
+        response = self.hanyuan_client.get(NEWSFEEDS_URL)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(
+            response.data['results'][1]['tweet']['id'],
+            celebrity_tweet_id,
+        )
+        self.assertEqual(response.data['results'][1]['id'], None)
+
+        # pulled tweets are merged with pushed newsfeeds by created_at
+        followed_user = self.create_user('followed')
+        tweets = []
+        for i in range(page_size):
+            tweets.append(self.create_tweet(self.eric))
+            tweet = self.create_tweet(followed_user)
+            self.create_newsfeed(self.hanyuan, tweet)
+            tweets.append(tweet)
+        tweets = tweets[::-1]
+
+        response = self.hanyuan_client.get(NEWSFEEDS_URL)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [r['tweet']['id'] for r in response.data['results']],
+            [t.id for t in tweets[:page_size]],
+        )
+        latest_created_at = response.data['results'][0]['created_at']
+        response = self.hanyuan_client.get(NEWSFEEDS_URL, {
+            'created_at__lt': response.data['results'][-1]['created_at'],
+        })
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [r['tweet']['id'] for r in response.data['results']],
+            [t.id for t in tweets[page_size:]],
+        )
+
+        # a new celebrity tweet is pulled by created_at__gt
+        new_tweet = self.create_tweet(self.eric)
+        response = self.hanyuan_client.get(NEWSFEEDS_URL, {
+            'created_at__gt': latest_created_at,
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [r['tweet']['id'] for r in response.data['results']],
+            [new_tweet.id],
+        )
+
+    @override_settings(NEWSFEED_CELEBRITY_THRESHOLD=3)
+    def test_celebrity_newsfeeds_cursor(self):
+        page_size = EndlessPagination.page_size
+        # eric and hanyuan both have 3 followers, both are celebrities
+        self.hanyuan_client.post(FOLLOW_URL.format(self.eric.id))
+        self.eric_client.post(FOLLOW_URL.format(self.hanyuan.id))
+        celebrity = self.create_user('celebrity')
+        for user in (self.hanyuan, self.eric):
+            Friendship.objects.create(from_user=user, to_user=celebrity)
+        self.create_user_and_client('fan')[1].post(FOLLOW_URL.format(celebrity.id))
+        self.assertEqual(
+            set(NewsFeedService.get_followed_celebrity_ids(self.hanyuan.id)),
+            {self.eric.id, celebrity.id},
+        )
+
+        # pushed newsfeeds and pulled tweets all created at the same time
+        followed_user = self.create_user('followed')
+        tweet_ids = []
+        for i in range(page_size):
+            tweet_ids.append(self.create_tweet(self.eric).id)
+            tweet_ids.append(self.create_tweet(celebrity).id)
+            tweet = self.create_tweet(followed_user)
+            self.create_newsfeed(self.hanyuan, tweet)
+            tweet_ids.append(tweet.id)
+        created_at = Tweet.objects.get(id=tweet_ids[0]).created_at
+        Tweet.objects.filter(id__in=tweet_ids).update(created_at=created_at)
+        NewsFeed.objects.filter(user=self.hanyuan).update(created_at=created_at)
+        self.clear_cache()
+
+        # ties are broken by tweet id, nothing is skipped or repeated
+        pulled_tweet_ids, cursor = [], None
+        for _ in range(3):
+            params = {'cursor': cursor} if cursor else {}
+            with CaptureQueriesContext(connection) as context:
+                response = self.hanyuan_client.get(NEWSFEEDS_URL, params)
+            pulled_tweet_ids += [r['tweet']['id'] for r in response.data['results']]
+            cursor = response.data['next_cursor']
+            # the tweets of each celebrity are pulled with a LIMITed query
+            sqls = [
+                query['sql'].replace('`', '"')
+                for query in context.captured_queries
+                if 'FROM "tweets_tweet"' in query['sql'].replace('`', '"')
+            ]
+            pulling_sqls = [
+                sql for sql in sqls
+                if '"tweets_tweet"."user_id" = ' in sql and 'LIMIT' in sql
+            ]
+            self.assertEqual(len(pulling_sqls), 2)
+            self.assertEqual(
+                [sql for sql in sqls if '"tweets_tweet"."user_id" IN' in sql],
+                [],
+            )
+        self.assertEqual(cursor, None)
+        self.assertEqual(pulled_tweet_ids, sorted(tweet_ids, reverse=True))
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        def count_list_queries():
+            # load newsfeeds into cache first, only the serialization is
+            # counted
+            self.hanyuan_client.get(NEWSFEEDS_URL)
+            with CaptureQueriesContext(connection) as context:
+                response = self.hanyuan_client.get(NEWSFEEDS_URL)
+            return len(context.captured_queries), response
+
+        self.create_newsfeed(self.hanyuan, self.create_tweet(self.eric))
+        one_newsfeed_queries, _ = count_list_queries()
+
+        for i in range(5):
+            user = self.create_user('user{}'.format(i))
+            tweet = self.create_tweet(user)
+            self.create_comment(user, tweet)
+            self.create_like(self.hanyuan, tweet)
+            self.create_newsfeed(self.hanyuan, tweet)
+        many_newsfeeds_queries, response = count_list_queries()
+        self.assertEqual(many_newsfeeds_queries, one_newsfeed_queries)
+        # users and profiles are served by cache when it is warm
+        with CaptureQueriesContext(connection) as context:
+            self.hanyuan_client.get(NEWSFEEDS_URL)
+        for query in context.captured_queries:
+            self.assertNotIn('auth_user', query['sql'])
+            self.assertNotIn('accounts_userprofile', query['sql'])
+        self.assertEqual(len(response.data['results']), 6)
+        for result in response.data['results'][:5]:
+            self.assertEqual(result['tweet']['comments_count'], 1)
+            self.assertEqual(result['tweet']['likes_count'], 1)
+            self.assertEqual(result['tweet']['has_liked'], True)
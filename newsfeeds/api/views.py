@@ -3,21 +3,83 @@ from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from newsfeeds.models import NewsFeed
+from newsfeeds.api.paginations import NewsFeedPagination
 from newsfeeds.api.serializers import NewsFeedSerializer
+from newsfeeds.services import NewsFeedService
+from tweets.models import Tweet
 from utils.paginations import EndlessPagination
 
 class NewsFeedViewSet(viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated]
-    pagination_class = EndlessPagination
+    pagination_class = NewsFeedPagination
 
     def get_queryset(self):
         return NewsFeed.objects.filter(user=self.request.user)
 
     def list(self, request):
-        page = self.paginate_queryset(self.get_queryset())
+        # the latest newsfeeds are served from cache
+        cached_newsfeeds = NewsFeedService.get_cached_newsfeeds(request.user.id)
+        page = self.paginator.paginate_cached_list(cached_newsfeeds, request)
+        # page is None when the requested page is beyond the cached newsfeeds
+        if page is None:
+            page = self.paginate_queryset(self.get_queryset())
+
+        celebrity_ids = NewsFeedService.get_followed_celebrity_ids(request.user.id)
+        if celebrity_ids:
+            page = self._merge_celebrity_newsfeeds(page, celebrity_ids, request)
+
         serializer = NewsFeedSerializer(
             page,
             context={'request': request},
             many=True,
         )
         return self.get_paginated_response(serializer.data)
+
+    def _merge_celebrity_newsfeeds(self, newsfeeds, celebrity_ids, request):
+        # tweets of celebrities are not fanned out. The same page of tweets
+        # of each celebrity is pulled with its own query, served by the
+        # (user, created_at) index with a LIMIT, and merged with the pushed
+        # newsfeeds by (created_at, tweet_id). A pulled tweet is at
+        # (created_at, id) of the tweet, so the cursor works for all of them.
+        newsfeed_lists = [list(newsfeeds)]
+        has_more = False
+        for celebrity_id in celebrity_ids:
+            paginator = EndlessPagination()
+            tweets = paginator.paginate_queryset(
+                Tweet.objects.filter(user_id=celebrity_id),
+                request,
+            )
+            has_more = has_more or (
+                paginator.has_newer_page
+                if paginator.is_newer_pull
+                else paginator.has_next_page
+            )
+            # pulled newsfeeds are not stored in database, so they have no id
+            newsfeed_lists.append([
+                NewsFeed(
+                    user=request.user,
+                    tweet=tweet,
+                    created_at=tweet.created_at,
+                )
+                for tweet in tweets
+            ])
+        merged_newsfeeds = NewsFeedService.merge_newsfeeds(newsfeed_lists)
+        page_size = self.paginator.page_size
+        if self.paginator.is_newer_pull:
+            # the newer ones right after the cursor are at the end
+            self.paginator.has_newer_page = (
+                self.paginator.has_newer_page or
+                has_more or
+                len(merged_newsfeeds) > page_size
+            )
+            page = merged_newsfeeds[-page_size:]
+        else:
+            self.paginator.has_next_page = (
+                self.paginator.has_next_page or
+                has_more or
+                len(merged_newsfeeds) > page_size
+            )
+            page = merged_newsfeeds[:page_size]
+        # the cursors of the response are taken from the merged page
+        self.paginator.page = page
+        return page
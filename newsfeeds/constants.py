@@ -0,0 +1,4 @@
+from django.conf import settings
+
+# number of followers in each fanout batch task
+FANOUT_BATCH_SIZE = 1000 if not settings.TESTING else 3
@@ -0,0 +1,8 @@
+def push_newsfeed_to_cache(sender, instance, created, **kwargs):
+    # only newly created newsfeeds need to be pushed
+    if not created:
+        return
+
+    # import inside the function to avoid circular import
+    from newsfeeds.services import NewsFeedService
+    NewsFeedService.push_newsfeed_to_cache(instance)
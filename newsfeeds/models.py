@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models.signals import post_save
 from django.contrib.auth.models import User
+from newsfeeds.listeners import push_newsfeed_to_cache
 from tweets.models import Tweet
 
 
@@ -22,4 +24,7 @@ class NewsFeed(models.Model):
         ordering = ('user', '-created_at',)
 
     def __str__(self):
-        return f'{self.created_at} inbox of {self.user}: {self.tweet}'
\ No newline at end of file
+        return f'{self.created_at} inbox of {self.user}: {self.tweet}'
+
+
+post_save.connect(push_newsfeed_to_cache, sender=NewsFeed)
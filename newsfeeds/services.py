@@ -1,5 +1,12 @@
+import heapq
+from django.conf import settings
+from django.db import transaction
 from friendships.services import FriendshipService
 from newsfeeds.models import NewsFeed
+from newsfeeds.tasks import fanout_newsfeeds_main_task
+from twitter.cache import USER_NEWSFEEDS_PATTERN
+from utils.redis_helper import RedisHelper
+
 
 class NewsFeedService(object):
 
@@ -7,19 +14,81 @@ class NewsFeedService(object):
     def fanout_to_followers(cls, tweet):
         # Wrong way to do the creation:
         # cannot put database op in a for loop, very inefficient
-        # for follower in FriendshipService.get_followers(tweet.user):
+        # for follower_id in FriendshipService.get_follower_ids(tweet.user_id):
         #     NewsFeed.objects.create(
-        #         user=follower,
+        #         user_id=follower_id,
         #         tweet=tweet,
         #     )
 
         # 正确的方法：使用 bulk_create，会把 insert 语句合成一条
         # Right way: use bulk_create, which combines all insert SQLs into one
-        # line
-        newsfeeds = [
-            # Request for update will not be made until .save()
-            NewsFeed(user=follower, tweet=tweet)
-            for follower in FriendshipService.get_followers(tweet.user)
+        # line. The bulk_create of followers' newsfeeds can still be very slow
+        # for users with lots of followers, so it is done in async tasks, see
+        # newsfeeds/tasks.py
+
+        # the newsfeed of the author is created right away, so the author can
+        # see the tweet immediately
+        NewsFeed.objects.create(user_id=tweet.user_id, tweet=tweet)
+
+        # only ids are sent to the task queue. The tweet object can not be
+        # sent as it can not be serialized by celery. The task is sent after
+        # the commit, otherwise a fast worker may not see the tweet yet.
+        transaction.on_commit(
+            lambda: fanout_newsfeeds_main_task.delay(tweet.id, tweet.user_id),
+        )
+
+    @classmethod
+    def get_cached_newsfeeds(cls, user_id):
+        # same (created_at, tweet_id) order as NewsFeedPagination
+        queryset = NewsFeed.objects.filter(
+            user_id=user_id,
+        ).order_by('-created_at', '-tweet_id')
+        key = USER_NEWSFEEDS_PATTERN.format(user_id=user_id)
+        return RedisHelper.load_objects(key, queryset)
+
+    @classmethod
+    def push_newsfeed_to_cache(cls, newsfeed):
+        cls.push_newsfeeds_to_cache([newsfeed])
+
+    @classmethod
+    def push_newsfeeds_to_cache(cls, newsfeeds):
+        RedisHelper.push_objects([
+            (USER_NEWSFEEDS_PATTERN.format(user_id=newsfeed.user_id), newsfeed)
+            for newsfeed in newsfeeds
+        ])
+
+    @classmethod
+    def is_celebrity(cls, user_id):
+        follower_count = FriendshipService.get_follower_count(user_id)
+        return follower_count >= settings.NEWSFEED_CELEBRITY_THRESHOLD
+
+    @classmethod
+    def get_followed_celebrity_ids(cls, user_id):
+        following_ids = FriendshipService.get_following_ids(user_id)
+        follower_counts = FriendshipService.get_follower_counts(following_ids)
+        return [
+            following_id
+            for following_id in following_ids
+            if follower_counts[following_id] >= settings.NEWSFEED_CELEBRITY_THRESHOLD
         ]
-        newsfeeds.append(NewsFeed(user=tweet.user, tweet=tweet))
-        NewsFeed.objects.bulk_create(newsfeeds) # create newsfeeds in a batch
\ No newline at end of file
+
+    @classmethod
+    def merge_newsfeeds(cls, newsfeed_lists):
+        """
+        k-way merge of several newsfeed lists, each sorted by
+        (created_at, tweet_id) in descending order. A tweet might be both
+        pushed and pulled (e.g. the author became a celebrity after
+        tweeting), only its first appearance is kept.
+        """
+        merged = []
+        tweet_ids = set()
+        for newsfeed in heapq.merge(
+            *newsfeed_lists,
+            key=lambda newsfeed: (newsfeed.created_at, newsfeed.tweet_id),
+            reverse=True,
+        ):
+            if newsfeed.tweet_id in tweet_ids:
+                continue
+            tweet_ids.add(newsfeed.tweet_id)
+            merged.append(newsfeed)
+        return merged
@@ -0,0 +1,54 @@
+from celery import shared_task
+from friendships.services import FriendshipService
+from newsfeeds.constants import FANOUT_BATCH_SIZE
+from newsfeeds.models import NewsFeed
+from utils.time_constants import ONE_HOUR
+
+
+@shared_task(time_limit=ONE_HOUR)
+def fanout_newsfeeds_batch_task(tweet_id, follower_ids):
+    # import inside the function to avoid circular import
+    from newsfeeds.services import NewsFeedService
+
+    newsfeeds = [
+        NewsFeed(user_id=follower_id, tweet_id=tweet_id)
+        for follower_id in follower_ids
+    ]
+    # ignore_conflicts makes the task safe to be retried, existing
+    # <user, tweet> pairs are skipped by the unique index
+    NewsFeed.objects.bulk_create(newsfeeds, ignore_conflicts=True)
+
+    # bulk_create neither triggers post_save signal nor sets the ids of the
+    # created objects (on MySQL), so read them back to push them into cache
+    NewsFeedService.push_newsfeeds_to_cache(NewsFeed.objects.filter(
+        tweet_id=tweet_id,
+        user_id__in=follower_ids,
+    ))
+    return '{} newsfeeds created'.format(len(newsfeeds))
+
+
+@shared_task(time_limit=ONE_HOUR)
+def fanout_newsfeeds_main_task(tweet_id, tweet_user_id):
+    # import inside the function to avoid circular import
+    from newsfeeds.services import NewsFeedService
+
+    # tweets of celebrities are not fanned out, otherwise each tweet writes
+    # hundreds of thousands of rows. Followers pull them when reading
+    # newsfeeds instead.
+    if NewsFeedService.is_celebrity(tweet_user_id):
+        return 'celebrity tweet, fanout skipped.'
+
+    # split the followers into batches, each batch is a separate task which
+    # can be picked up by any worker, so the batches are fanned out in
+    # parallel
+    follower_ids = FriendshipService.get_follower_ids(tweet_user_id)
+    index = 0
+    while index < len(follower_ids):
+        batch_ids = follower_ids[index: index + FANOUT_BATCH_SIZE]
+        fanout_newsfeeds_batch_task.delay(tweet_id, batch_ids)
+        index += FANOUT_BATCH_SIZE
+
+    return '{} newsfeeds going to fanout, {} batches created.'.format(
+        len(follower_ids),
+        (len(follower_ids) - 1) // FANOUT_BATCH_SIZE + 1,
+    )
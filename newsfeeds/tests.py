@@ -0,0 +1,129 @@
+from newsfeeds.models import NewsFeed
+from newsfeeds.constants import FANOUT_BATCH_SIZE
+from newsfeeds.services import NewsFeedService
+from newsfeeds.tasks import fanout_newsfeeds_main_task
+from testing.testcases import TestCase
+from twitter.cache import USER_NEWSFEEDS_PATTERN
+from utils.redis_client import RedisClient
+
+
+class NewsFeedServiceTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.hanyuan = self.create_user('hanyuan')
+        self.eric = self.create_user('eric')
+
+    def test_get_cached_newsfeeds(self):
+        newsfeed_ids = []
+        for i in range(3):
+            tweet = self.create_tweet(self.eric)
+            newsfeed = self.create_newsfeed(self.hanyuan, tweet)
+            newsfeed_ids.append(newsfeed.id)
+        newsfeed_ids = newsfeed_ids[::-1]
+
+        # cache miss, loaded from database
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(self.hanyuan.id)
+        self.assertEqual([f.id for f in newsfeeds], newsfeed_ids)
+
+        # cache hit, no database query
+        with self.assertNoQueries():
+            newsfeeds = NewsFeedService.get_cached_newsfeeds(self.hanyuan.id)
+        self.assertEqual([f.id for f in newsfeeds], newsfeed_ids)
+
+        # new newsfeed is pushed into the cache
+        tweet = self.create_tweet(self.hanyuan)
+        new_newsfeed = self.create_newsfeed(self.hanyuan, tweet)
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(self.hanyuan.id)
+        newsfeed_ids.insert(0, new_newsfeed.id)
+        self.assertEqual([f.id for f in newsfeeds], newsfeed_ids)
+
+    def test_create_newsfeed_before_get_cached_newsfeeds(self):
+        feed1 = self.create_newsfeed(self.hanyuan, self.create_tweet(self.hanyuan))
+
+        # pushing into a missing key does not create a partial list
+        conn = RedisClient.get_connection()
+        key = USER_NEWSFEEDS_PATTERN.format(user_id=self.hanyuan.id)
+        self.assertEqual(conn.exists(key), False)
+
+        feed2 = self.create_newsfeed(self.hanyuan, self.create_tweet(self.hanyuan))
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(self.hanyuan.id)
+        self.assertEqual([f.id for f in newsfeeds], [feed2.id, feed1.id])
+
+    def test_fanout_pushes_to_cache(self):
+        self.create_friendship(self.hanyuan, self.eric)
+        # load hanyuan's newsfeeds into cache
+        self.create_newsfeed(self.hanyuan, self.create_tweet(self.hanyuan))
+        NewsFeedService.get_cached_newsfeeds(self.hanyuan.id)
+
+        tweet = self.create_tweet(self.eric)
+        with self.captureOnCommitCallbacks(execute=True):
+            NewsFeedService.fanout_to_followers(tweet)
+        newsfeed = NewsFeed.objects.get(user=self.hanyuan, tweet=tweet)
+
+        with self.assertNoQueries():
+            newsfeeds = NewsFeedService.get_cached_newsfeeds(self.hanyuan.id)
+        self.assertEqual(len(newsfeeds), 2)
+        self.assertEqual(newsfeeds[0].id, newsfeed.id)
+        self.assertEqual(newsfeeds[0].tweet_id, tweet.id)
+        self.assertEqual(newsfeeds[0].created_at, newsfeed.created_at)
+
+        # eric's newsfeeds were not cached, they are loaded from database
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(self.eric.id)
+        self.assertEqual([f.tweet_id for f in newsfeeds], [tweet.id])
+
+
+class NewsFeedTaskTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.hanyuan = self.create_user('hanyuan')
+        self.eric = self.create_user('eric')
+
+    def test_fanout_main_task(self):
+        tweet = self.create_tweet(self.hanyuan, 'tweet 1')
+        self.create_friendship(self.eric, self.hanyuan)
+        msg = fanout_newsfeeds_main_task(tweet.id, self.hanyuan.id)
+        self.assertEqual(msg, '1 newsfeeds going to fanout, 1 batches created.')
+        self.assertEqual(NewsFeed.objects.count(), 1)
+        self.assertEqual(NewsFeed.objects.filter(user=self.eric).count(), 1)
+
+        # followers are split into batches
+        for i in range(FANOUT_BATCH_SIZE * 2):
+            user = self.create_user('follower{}'.format(i))
+            self.create_friendship(user, self.hanyuan)
+        tweet = self.create_tweet(self.hanyuan, 'tweet 2')
+        msg = fanout_newsfeeds_main_task(tweet.id, self.hanyuan.id)
+        self.assertEqual(
+            msg,
+            '{} newsfeeds going to fanout, 3 batches created.'.format(
+                FANOUT_BATCH_SIZE * 2 + 1,
+            ),
+        )
+        self.assertEqual(
+            NewsFeed.objects.filter(tweet=tweet).count(),
+            FANOUT_BATCH_SIZE * 2 + 1,
+        )
+
+        # running the task again does not create duplicated newsfeeds
+        fanout_newsfeeds_main_task(tweet.id, self.hanyuan.id)
+        self.assertEqual(
+            NewsFeed.objects.filter(tweet=tweet).count(),
+            FANOUT_BATCH_SIZE * 2 + 1,
+        )
+
+    def test_fanout_to_followers(self):
+        self.create_friendship(self.eric, self.hanyuan)
+        tweet = self.create_tweet(self.hanyuan)
+        # the followers are fanned out after the tweet is committed
+        with self.captureOnCommitCallbacks() as callbacks:
+            NewsFeedService.fanout_to_followers(tweet)
+        self.assertEqual(NewsFeed.objects.filter(tweet=tweet).count(), 1)
+        for callback in callbacks:
+            callback()
+        # the author and the follower can both see the tweet
+        self.assertEqual(NewsFeed.objects.filter(tweet=tweet).count(), 2)
+        self.assertEqual(
+            NewsFeed.objects.filter(user=self.hanyuan, tweet=tweet).exists(),
+            True,
+        )
@@ -18,6 +18,12 @@ sudo dpkg -i mysql-apt-config_0.8.15-1_all.deb
 sudo DEBIAN_FRONTEND=noninteractivate apt-get install -y mysql-server
 sudo apt-get install -y libmysqlclient-dev
 
+# install redis, used as cache of newsfeeds
+sudo apt-get install -y redis
+
+# install memcached, used as cache of user profiles
+sudo apt-get install -y memcached
+
 if [ ! -f "/usr/bin/pip" ]; then
   sudo apt-get install -y python3-pip
   sudo apt-get install -y python-setuptools
@@ -45,6 +51,8 @@ sudo mysql -u root << EOF
 	flush privileges;
 	show databases;
 	CREATE DATABASE IF NOT EXISTS twitter;
+	CREATE DATABASE IF NOT EXISTS twitter_likes_0;
+	CREATE DATABASE IF NOT EXISTS twitter_likes_1;
 EOF
 # fi
 
@@ -1,14 +1,60 @@
 from comments.models import Comment
+from contextlib import contextmanager, ExitStack
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.test import TestCase as DjangoTestCase  # to avoid name duplicate
-from likes.models import Like
+from friendships.models import Friendship
+from likes.content_types import LikeContentTypes
+from likes.services import LikeService
 from rest_framework.test import APIClient
 from tweets.models import Tweet
+from tweets.tasks import flush_counters_task
 from newsfeeds.models import NewsFeed
+from utils.redis_client import RedisClient
 
 
 class TestCase(DjangoTestCase):
+    # likes are stored in their own databases, see likes/routers.py
+    databases = '__all__'
+
+    @contextmanager
+    def assertNoQueries(self):
+        # assertNumQueries only counts the queries of one database, the like
+        # shards are checked too
+        with ExitStack() as stack:
+            for alias in settings.DATABASES:
+                stack.enter_context(self.assertNumQueries(0, using=alias))
+            yield
+
+    @contextmanager
+    def captureOnCommitCallbacks(self, using=DEFAULT_DB_ALIAS, execute=False):
+        # same as TestCase.captureOnCommitCallbacks of django 3.2, the
+        # transaction of a test case is never committed, so the on_commit
+        # callbacks are never run otherwise
+        callbacks = []
+        start_count = len(connections[using].run_on_commit)
+        try:
+            yield callbacks
+        finally:
+            run_on_commit = connections[using].run_on_commit[start_count:]
+            callbacks[:] = [func for sids, func in run_on_commit]
+            if execute:
+                for callback in callbacks:
+                    callback()
+
+    def flush_counters(self):
+        # the flushed deltas are dropped from redis on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return flush_counters_task()
+
+    def clear_cache(self):
+        # cache is not rolled back with the database after each test, it has
+        # to be cleared manually in setUp
+        RedisClient.clear()
+        caches['default'].clear()
+        caches['local'].clear()
 
     @property
     def anonymous_client(self):
@@ -40,10 +86,10 @@ class TestCase(DjangoTestCase):
 
     def create_like(self, user, target):
         # target is comment or tweet
-        instance, _ = Like.objects.get_or_create(
-            content_type=ContentType.objects.get_for_model(target.__class__),
-            object_id=target.id,
-            user=user,
+        instance, _ = LikeService.get_or_create_like(
+            user,
+            LikeContentTypes.get_id_for_model(target.__class__),
+            target.id,
         )
         return instance
 
@@ -53,5 +99,8 @@ class TestCase(DjangoTestCase):
         client.force_authenticate(user)
         return user, client
 
+    def create_friendship(self, from_user, to_user):
+        return Friendship.objects.create(from_user=from_user, to_user=to_user)
+
     def create_newsfeed(self, user, tweet):
         return NewsFeed.objects.create(user=user, tweet=tweet)
\ No newline at end of file
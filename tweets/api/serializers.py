@@ -1,12 +1,33 @@
+from comments.services import CommentService
+from django.db.models import Manager
+from django.urls import reverse
 from rest_framework import serializers
 from tweets.models import Tweet
 from accounts.api.serializers import UserSerializerForTweet
 from comments.api.serializers import CommentSerializer
+from comments.constants import COMMENT_PAGE_SIZE
 from likes.services import LikeService
 from likes.api.serializers import LikeSerializer
-from tweets.constants import TWEET_PHOTOS_UPLOAD_LIMIT
+from tweets.constants import (
+    TWEET_DETAIL_LIKES_PREVIEW_SIZE,
+    TWEET_PHOTOS_UPLOAD_LIMIT,
+)
 from rest_framework.exceptions import ValidationError
 from tweets.services import TweetService
+from utils.redis_counters import RedisCounter
+
+
+class TweetListSerializer(serializers.ListSerializer):
+    """
+    Used by TweetSerializer(many=True). Loads the likes, photos and users of the
+    whole page of tweets in bulk before serializing them.
+    """
+
+    def to_representation(self, data):
+        tweets = list(data.all() if isinstance(data, Manager) else data)
+        TweetService.preload_tweets(tweets, self.context['request'].user)
+        return super(TweetListSerializer, self).to_representation(tweets)
+
 
 # ModelSerializer: set the properties in the fields, the serializer will auto
 # gen the related variables in the program
@@ -32,18 +53,30 @@ class TweetSerializer(serializers.ModelSerializer):
             'has_liked',
             'photo_urls',
         )
+        list_serializer_class = TweetListSerializer
 
+    # the _cached_* attributes are filled in by TweetService.preload_tweets.
+    # The counters are read from redis first, the likes_count and
+    # comments_count columns lag behind until the next flush.
     def get_likes_count(self, obj):
-        return obj.like_set.count()
+        if hasattr(obj, '_cached_likes_count'):
+            return obj._cached_likes_count
+        return RedisCounter.get_count(obj, 'likes_count')
 
     def get_comments_count(self, obj):
-        return obj.comment_set.count()
+        if hasattr(obj, '_cached_comments_count'):
+            return obj._cached_comments_count
+        return RedisCounter.get_count(obj, 'comments_count')
 
     def get_has_liked(self, obj):
+        if hasattr(obj, '_cached_has_liked'):
+            return obj._cached_has_liked
         # current login user has this like
         return LikeService.has_liked(self.context['request'].user, obj)
 
     def get_photo_urls(self, obj):
+        if hasattr(obj, '_cached_photo_urls'):
+            return obj._cached_photo_urls
         photo_urls = []
         for photo in obj.tweetphoto_set.all().order_by('order'):
             photo_urls.append(photo.file.url)
@@ -51,8 +84,15 @@ class TweetSerializer(serializers.ModelSerializer):
 
 
 class TweetSerializerForDetail(TweetSerializer):
-    comments = CommentSerializer(source='comment_set', many=True)
-    likes = LikeSerializer(source='like_set', many=True)
+    """
+    Only previews of the comments and likes are embedded, so the size of the
+    response does not grow with the popularity of the tweet. The rest are
+    read from comments_url and likes_url page by page.
+    """
+    comments = serializers.SerializerMethodField()
+    likes = serializers.SerializerMethodField()
+    comments_url = serializers.SerializerMethodField()
+    likes_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Tweet
@@ -63,13 +103,36 @@ class TweetSerializerForDetail(TweetSerializer):
             'created_at',
             'content',
             'likes',
-            'comments',
+            'comments_url',
+            'likes_url',
             'likes_count',
             'comments_count',
             'has_liked',
             'photo_urls',
         )
 
+    def get_comments(self, obj):
+        # the cached first page of GET /api/comments/?tweet_id=
+        comments = CommentService.get_first_page(obj.id)[:COMMENT_PAGE_SIZE]
+        return CommentSerializer(comments, context=self.context, many=True).data
+
+    def get_likes(self, obj):
+        likes = obj.like_set[:TWEET_DETAIL_LIKES_PREVIEW_SIZE]
+        return LikeSerializer(likes, many=True).data
+
+    def get_comments_url(self, obj):
+        return '{}?tweet_id={}'.format(reverse('comments-list'), obj.id)
+
+    def get_likes_url(self, obj):
+        return reverse('tweets-likes', args=[obj.id])
+
+
+class TweetSerializerForNotification(serializers.ModelSerializer):
+
+    class Meta:
+        model = Tweet
+        fields = ('id', 'user_id', 'content', 'created_at')
+
 
 class TweetSerializerForCreate(serializers.ModelSerializer):
     content = serializers.CharField(min_length=6, max_length=140)
@@ -1,18 +1,24 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from testing.testcases import TestCase
+from comments.constants import COMMENT_PAGE_SIZE
+from tweets.constants import TWEET_DETAIL_LIKES_PREVIEW_SIZE
 from tweets.models import Tweet, TweetPhoto
-from django.core.files.uploadedfile import SimpleUploadedFile
 from utils.paginations import EndlessPagination
 
 # should end with '/', otherwise 301 redirect
 TWEET_LIST_API = '/api/tweets/'
 TWEET_CREATE_API = '/api/tweets/'
 TWEET_RETRIEVE_API = '/api/tweets/{}/'
+TWEET_LIKES_API = '/api/tweets/{}/likes/'
 
 
 class TweetApiTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.hanyuan = self.create_user('hanyuan', 'hanyuan@twitter.com')
         self.tweets1 = [
             self.create_tweet(self.hanyuan)
@@ -162,6 +168,57 @@ class TweetApiTests(TestCase):
         response = self.anonymous_client.get(url)
         self.assertEqual(len(response.data['comments']), 2)
 
+    def test_retrieve_previews(self):
+        tweet = self.create_tweet(self.hanyuan)
+        comments = [
+            self.create_comment(self.eric, tweet)
+            for _ in range(COMMENT_PAGE_SIZE + 2)
+        ]
+        users = [
+            self.create_user('user{}'.format(i))
+            for i in range(TWEET_DETAIL_LIKES_PREVIEW_SIZE + 5)
+        ]
+        for user in users:
+            self.create_like(user, tweet)
+
+        url = TWEET_RETRIEVE_API.format(tweet.id)
+        response = self.anonymous_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['comments_count'], len(comments))
+        self.assertEqual(response.data['likes_count'], len(users))
+        self.assertEqual(
+            [comment['id'] for comment in response.data['comments']],
+            [comment.id for comment in comments[:COMMENT_PAGE_SIZE]],
+        )
+        self.assertEqual(
+            [like['user']['id'] for like in response.data['likes']],
+            [user.id for user in users[::-1][:TWEET_DETAIL_LIKES_PREVIEW_SIZE]],
+        )
+        self.assertEqual(
+            response.data['comments_url'],
+            '/api/comments/?tweet_id={}'.format(tweet.id),
+        )
+        self.assertEqual(response.data['likes_url'], TWEET_LIKES_API.format(tweet.id))
+
+        # the rest of the likes
+        response = self.anonymous_client.get(TWEET_LIKES_API.format(tweet.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            len(response.data['results']),
+            EndlessPagination.page_size,
+        )
+        response = self.anonymous_client.get(TWEET_LIKES_API.format(tweet.id), {
+            'cursor': response.data['next_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [like['user']['id'] for like in response.data['results']],
+            [user.id for user in users[::-1][EndlessPagination.page_size:]],
+        )
+        response = self.anonymous_client.get(TWEET_LIKES_API.format(-1))
+        self.assertEqual(response.status_code, 404)
+
     def test_pagination(self):
         page_size = EndlessPagination.page_size
 
@@ -207,4 +264,115 @@ class TweetApiTests(TestCase):
         })
         self.assertEqual(response.data['has_next_page'], False)
         self.assertEqual(len(response.data['results']), 1)
-        self.assertEqual(response.data['results'][0]['id'], new_tweet.id)
\ No newline at end of file
+        self.assertEqual(response.data['results'][0]['id'], new_tweet.id)
+
+    def test_cursor_pagination(self):
+        page_size = EndlessPagination.page_size
+        for i in range(page_size * 2 + 1 - len(self.tweets1)):
+            self.tweets1.append(self.create_tweet(self.hanyuan, 'tweet{}'.format(i)))
+        # tweets created at the same time are ordered by id
+        Tweet.objects.filter(user=self.hanyuan).update(
+            created_at=self.tweets1[0].created_at,
+        )
+        tweet_ids = sorted([tweet.id for tweet in self.tweets1], reverse=True)
+
+        response = self.anonymous_client.get(TWEET_LIST_API, {'user_id': self.hanyuan.id})
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertNotIn('has_newer_page', response.data)
+        results = response.data['results']
+        self.assertEqual([r['id'] for r in results], tweet_ids[:page_size])
+
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': self.hanyuan.id,
+            'cursor': response.data['next_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [r['id'] for r in response.data['results']],
+            tweet_ids[page_size:page_size * 2],
+        )
+
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': self.hanyuan.id,
+            'cursor': response.data['next_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(response.data['next_cursor'], None)
+        self.assertEqual([r['id'] for r in response.data['results']], tweet_ids[-1:])
+        oldest_cursor = response.data['since_cursor']
+
+        # pulling newer tweets is bounded by page_size, the ones right after
+        # the cursor come first
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': self.hanyuan.id,
+            'since_cursor': oldest_cursor,
+        })
+        self.assertEqual(response.data['has_newer_page'], True)
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [r['id'] for r in response.data['results']],
+            tweet_ids[page_size:page_size * 2],
+        )
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': self.hanyuan.id,
+            'since_cursor': response.data['since_cursor'],
+        })
+        self.assertEqual(response.data['has_newer_page'], False)
+        self.assertEqual(
+            [r['id'] for r in response.data['results']],
+            tweet_ids[:page_size],
+        )
+        since_cursor = response.data['since_cursor']
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': self.hanyuan.id,
+            'since_cursor': since_cursor,
+        })
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['since_cursor'], since_cursor)
+
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': self.hanyuan.id,
+            'cursor': 'invalid',
+        })
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        def count_list_queries(user):
+            with CaptureQueriesContext(connection) as context:
+                response = self.eric_client.get(TWEET_LIST_API, {'user_id': user.id})
+            self.assertEqual(response.status_code, 200)
+            return len(context.captured_queries), response
+
+        self.eric_client = APIClient()
+        self.eric_client.force_authenticate(self.eric)
+
+        lonely = self.create_user('lonely')
+        self.create_tweet(lonely)
+        one_tweet_queries, _ = count_list_queries(lonely)
+
+        for tweet in self.tweets1:
+            self.create_comment(self.eric, tweet)
+            self.create_like(self.eric, tweet)
+            TweetPhoto.objects.create(
+                tweet=tweet,
+                user=self.hanyuan,
+                file=SimpleUploadedFile(
+                    name='photo.jpg',
+                    content=str.encode('a fake image'),
+                    content_type='image/jpeg',
+                ),
+            )
+        self.create_like(self.hanyuan, self.tweets1[0])
+        many_tweets_queries, response = count_list_queries(self.hanyuan)
+        self.assertEqual(many_tweets_queries, one_tweet_queries)
+
+        results = response.data['results']
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[2]['id'], self.tweets1[0].id)
+        self.assertEqual(results[2]['likes_count'], 2)
+        self.assertEqual(results[1]['likes_count'], 1)
+        for result in results:
+            self.assertEqual(result['comments_count'], 1)
+            self.assertEqual(result['has_liked'], True)
+            self.assertEqual(len(result['photo_urls']), 1)
+            self.assertEqual(result['user']['id'], self.hanyuan.id)
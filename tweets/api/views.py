@@ -1,4 +1,6 @@
+from likes.api.serializers import LikeSerializer
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from tweets.api.serializers import (
@@ -6,7 +8,9 @@ from tweets.api.serializers import (
     TweetSerializerForCreate,
     TweetSerializerForDetail,
 )
+from rest_framework.exceptions import NotFound
 from tweets.models import Tweet
+from tweets.services import TweetService
 from newsfeeds.services import NewsFeedService
 from utils.decorators import required_params
 from utils.paginations import EndlessPagination
@@ -22,8 +26,20 @@ class TweetViewSet(viewsets.GenericViewSet):
     queryset = Tweet.objects.all()
     pagination_class = EndlessPagination
 
+    def get_object(self):
+        # tweets are read through cache, see TweetService.get_tweets_by_ids
+        try:
+            tweet_id = int(self.kwargs['pk'])
+        except ValueError:
+            raise NotFound
+        tweet = TweetService.get_tweet_through_cache(tweet_id)
+        if tweet is None:
+            raise NotFound
+        self.check_object_permissions(self.request, tweet)
+        return tweet
+
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'likes']:
             return [AllowAny()]     #AllowAny() is just for readability
         # list interface can be accessed by anyone
         # other interface cannot
@@ -53,6 +69,15 @@ class TweetViewSet(viewsets.GenericViewSet):
         )
         return Response(serializer.data)
 
+    @action(methods=['GET'], detail=True)
+    def likes(self, request, pk):
+        # GET /api/tweets/<id>/likes/, the latest likes first, paginated like
+        # the tweet list
+        tweet = self.get_object()
+        likes = self.paginate_queryset(tweet.like_set)
+        serializer = LikeSerializer(likes, many=True)
+        return self.get_paginated_response(serializer.data)
+
     #@action(permission ...)
     def create(self, request):
         serializer = TweetSerializerForCreate(
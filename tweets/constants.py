@@ -10,4 +10,7 @@ TWEET_PHOTO_STATUS_CHOICES = (
     (TweetPhotoStatus.REJECTED, 'Rejected'),
 )
 
-TWEET_PHOTOS_UPLOAD_LIMIT = 9
\ No newline at end of file
+TWEET_PHOTOS_UPLOAD_LIMIT = 9
+# latest likes embedded in GET /api/tweets/<id>/, the rest are paginated by
+# GET /api/tweets/<id>/likes/
+TWEET_DETAIL_LIKES_PREVIEW_SIZE = 20
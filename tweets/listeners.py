@@ -0,0 +1,12 @@
+def cache_tweet(sender, instance, created, **kwargs):
+    # import inside the function to avoid circular import
+    from tweets.services import TweetService
+    if created:
+        TweetService.push_tweet_to_cache(instance)
+    else:
+        TweetService.invalidate_tweet(instance.id)
+
+
+def invalidate_tweet_cache(sender, instance, **kwargs):
+    from tweets.services import TweetService
+    TweetService.invalidate_tweet(instance.id)
@@ -0,0 +1,24 @@
+from comments.models import Comment
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from tweets.models import Tweet
+from utils.existence import ExistenceService
+
+
+class Command(BaseCommand):
+    help = (
+        'Load the ids of all the users, tweets and comments into the redis '
+        'bitmaps of ExistenceService, which are then used by the validation '
+        'of the write apis.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        for model_class in (User, Tweet, Comment):
+            added = ExistenceService.rebuild(model_class, options['batch_size'])
+            self.stdout.write('{} {} ids loaded'.format(
+                added,
+                model_class._meta.label_lower,
+            ))
@@ -0,0 +1,121 @@
+from comments.models import Comment
+from contextlib import ExitStack
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from likes.services import LikeService
+from tweets.models import Tweet
+from tweets.tasks import flush_counters_task
+from utils.redis_counters import RedisCounter
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount likes_count / comments_count of tweets and likes_count of '
+        'comments and fix the rows that drifted from the real numbers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # apply the deltas pending in redis first, otherwise they would be
+        # added again on top of the recounted columns
+        self.stdout.write(flush_counters_task())
+        fixed = self.reconcile(
+            Tweet,
+            ('likes_count', 'comments_count'),
+            self.count_tweet_relations,
+            batch_size,
+        )
+        self.stdout.write('{} tweets reconciled'.format(fixed))
+        fixed = self.reconcile(
+            Comment,
+            ('likes_count',),
+            self.count_comment_relations,
+            batch_size,
+        )
+        self.stdout.write('{} comments reconciled'.format(fixed))
+
+    @classmethod
+    def count_tweet_relations(cls, tweet_ids):
+        comments_counts = {
+            row['tweet_id']: row['count']
+            for row in Comment.objects.filter(
+                tweet_id__in=tweet_ids,
+            ).values('tweet_id').annotate(count=Count('id'))
+        }
+        return {
+            'likes_count': LikeService.get_likes_counts(Tweet, tweet_ids),
+            'comments_count': comments_counts,
+        }
+
+    @classmethod
+    def count_comment_relations(cls, comment_ids):
+        return {
+            'likes_count': LikeService.get_likes_counts(Comment, comment_ids),
+        }
+
+    @classmethod
+    def reconcile(cls, model_class, fields, count_relations, batch_size):
+        """
+        walk the table by primary key in batches, for each batch count the
+        relations with one GROUP BY query per field and write back only the
+        drifted rows with a single bulk_update. The cached counters of the
+        drifted rows are dropped and reloaded from the fixed columns.
+
+        Each batch is fixed under the flush locks of its counters. The
+        deltas still in redis are already in the real counts but not in the
+        columns, so they are taken off, otherwise the next flush would add
+        them a second time.
+        """
+        fixed, last_id = 0, 0
+        while True:
+            with ExitStack() as stack:
+                for field in fields:
+                    stack.enter_context(
+                        RedisCounter.hold_flush_lock(model_class, field),
+                    )
+                objects = list(
+                    model_class.objects.filter(id__gt=last_id)
+                    .order_by('id')
+                    .only('id', *fields)[:batch_size]
+                )
+                if not objects:
+                    break
+                last_id = objects[-1].id
+                fixed += cls.reconcile_batch(
+                    model_class,
+                    fields,
+                    objects,
+                    count_relations,
+                )
+        return fixed
+
+    @classmethod
+    def reconcile_batch(cls, model_class, fields, objects, count_relations):
+        object_ids = [obj.id for obj in objects]
+        counts = count_relations(object_ids)
+        deltas = {
+            field: RedisCounter.get_unflushed_deltas(model_class, field, object_ids)
+            for field in fields
+        }
+        drifted = []
+        for obj in objects:
+            changed = False
+            for field in fields:
+                column_value = counts[field].get(obj.id, 0) - deltas[field][obj.id]
+                if getattr(obj, field) != column_value:
+                    setattr(obj, field, column_value)
+                    changed = True
+            if changed:
+                drifted.append(obj)
+        if drifted:
+            model_class.objects.bulk_update(drifted, fields)
+            for field in fields:
+                RedisCounter.invalidate(
+                    model_class,
+                    field,
+                    [obj.id for obj in drifted],
+                )
+        return len(drifted)
@@ -1,7 +1,9 @@
 from django.contrib.auth.models import User
-from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from likes.models import Like
+from django.db.models.signals import post_delete, post_save
+from likes.services import LikeService
+from tweets.listeners import cache_tweet, invalidate_tweet_cache
+from utils.listeners import add_existing_id, remove_existing_id
 from utils.time_helpers import utc_now
 from tweets.constants import TweetPhotoStatus, TWEET_PHOTO_STATUS_CHOICES
 
@@ -18,6 +20,12 @@ class Tweet(models.Model):
     # updated this var when created
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # denormalized counters, so that serializing a tweet does not need to
+    # COUNT(*) likes and comments. null=True avoids rewriting the whole table
+    # when the column is added on MySQL.
+    likes_count = models.IntegerField(default=0, null=True)
+    comments_count = models.IntegerField(default=0, null=True)
+
     class Meta:
         # index_together = ((tup1), (tup2), (tup3), ...)
         index_together = (('user', 'created_at'), )
@@ -29,10 +37,7 @@ class Tweet(models.Model):
 
     @property
     def like_set(self):
-        return Like.objects.filter(
-            content_type=ContentType.objects.get_for_model(Tweet),
-            object_id=self.id,
-        ).order_by('-created_at')
+        return LikeService.get_likes(Tweet, self.id)
 
     def __str__(self):
         # Showing return content when print(tweet instance) is called
@@ -69,4 +74,10 @@ class TweetPhoto(models.Model):
         )
 
     def __str__(self):
-        return f'{self.tweet_id}: {self.file}'
\ No newline at end of file
+        return f'{self.tweet_id}: {self.file}'
+
+
+post_save.connect(cache_tweet, sender=Tweet)
+post_delete.connect(invalidate_tweet_cache, sender=Tweet)
+post_save.connect(add_existing_id, sender=Tweet)
+post_delete.connect(remove_existing_id, sender=Tweet)
@@ -1,4 +1,12 @@
-from tweets.models import TweetPhoto
+from accounts.services import UserService
+from django.core.cache import caches
+from likes.services import LikeService
+from tweets.models import Tweet, TweetPhoto
+from twitter.cache import TWEET_PATTERN
+from utils.redis_counters import RedisCounter
+from utils.redis_serializers import DjangoModelSerializer
+
+cache = caches['default']
 
 
 class TweetService(object):
@@ -15,3 +23,84 @@ class TweetService(object):
             )
             photos.append(photo)
         TweetPhoto.objects.bulk_create(photos)
+
+    @classmethod
+    def get_tweets_by_ids(cls, tweet_ids):
+        """
+        Return {tweet_id: tweet}, tweets which do not exist are left out. The
+        rows are read from the shared cache with one get_many, and the rest
+        from database with one IN query. Only the columns are cached, not the
+        related objects, so users are still loaded by UserService. The counter
+        columns of the cached rows may be older than the last counter flush,
+        the counters are read from redis by preload_tweets.
+        """
+        keys = {
+            tweet_id: TWEET_PATTERN.format(tweet_id=tweet_id)
+            for tweet_id in set(tweet_ids)
+        }
+        cached_rows = cache.get_many(keys.values())
+        tweets = {
+            tweet_id: DjangoModelSerializer.deserialize(cached_rows[key])
+            for tweet_id, key in keys.items()
+            if key in cached_rows
+        }
+        missing_ids = [tweet_id for tweet_id in keys if tweet_id not in tweets]
+        if missing_ids:
+            loaded_tweets = Tweet.objects.in_bulk(missing_ids)
+            cache.set_many({
+                keys[tweet_id]: DjangoModelSerializer.serialize(tweet)
+                for tweet_id, tweet in loaded_tweets.items()
+            })
+            tweets.update(loaded_tweets)
+        return tweets
+
+    @classmethod
+    def get_tweet_through_cache(cls, tweet_id):
+        return cls.get_tweets_by_ids([tweet_id]).get(tweet_id)
+
+    @classmethod
+    def push_tweet_to_cache(cls, tweet):
+        key = TWEET_PATTERN.format(tweet_id=tweet.id)
+        cache.set(key, DjangoModelSerializer.serialize(tweet))
+
+    @classmethod
+    def invalidate_tweet(cls, tweet_id):
+        cache.delete(TWEET_PATTERN.format(tweet_id=tweet_id))
+
+    @classmethod
+    def preload_tweets(cls, tweets, user):
+        """
+        Fill in everything TweetSerializer needs for a page of tweets with a
+        constant number of queries, instead of 5+ queries per tweet. The
+        results are cached on the tweet objects, the serializer falls back to
+        per-tweet queries for the tweets which are not preloaded.
+        user is the current login user, who may have liked the tweets.
+        """
+        tweets = [tweet for tweet in tweets if tweet is not None]
+        if not tweets:
+            return
+        tweet_ids = [tweet.id for tweet in tweets]
+
+        UserService.preload_users(tweets)
+        # the counters are read from redis with one mget each
+        likes_counts = RedisCounter.get_counts(tweets, 'likes_count')
+        comments_counts = RedisCounter.get_counts(tweets, 'comments_count')
+        liked_tweet_ids = LikeService.get_liked_object_ids(user, Tweet, tweet_ids)
+        photo_urls = cls._get_photo_urls(tweet_ids)
+
+        for tweet in tweets:
+            setattr(tweet, '_cached_likes_count', likes_counts[tweet.id])
+            setattr(tweet, '_cached_comments_count', comments_counts[tweet.id])
+            setattr(tweet, '_cached_has_liked', tweet.id in liked_tweet_ids)
+            setattr(tweet, '_cached_photo_urls', photo_urls.get(tweet.id, []))
+
+    @classmethod
+    def _get_photo_urls(cls, tweet_ids):
+        # uses the <tweet, order> index of TweetPhoto
+        photos = TweetPhoto.objects.filter(
+            tweet_id__in=tweet_ids,
+        ).order_by('tweet_id', 'order')
+        photo_urls = {}
+        for photo in photos:
+            photo_urls.setdefault(photo.tweet_id, []).append(photo.file.url)
+        return photo_urls
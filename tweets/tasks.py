@@ -0,0 +1,22 @@
+from celery import shared_task
+from comments.models import Comment
+from tweets.models import Tweet
+from utils.redis_counters import RedisCounter
+from utils.time_constants import ONE_MINUTE
+
+# (model, counter column) pairs whose increments are absorbed by redis
+COUNTER_FIELDS = (
+    (Tweet, 'likes_count'),
+    (Tweet, 'comments_count'),
+    (Comment, 'likes_count'),
+)
+
+
+# shorter than RedisCounter.FLUSH_LOCK_EXPIRE_TIME, so the lock never expires
+# while the task is still running
+@shared_task(time_limit=4 * ONE_MINUTE)
+def flush_counters_task():
+    updated = 0
+    for model_class, field in COUNTER_FIELDS:
+        updated += RedisCounter.flush(model_class, field)
+    return '{} counters flushed'.format(updated)
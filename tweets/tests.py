@@ -1,12 +1,25 @@
+from comments.models import Comment
+from django.core.management import call_command
+from io import StringIO
 from testing.testcases import TestCase
 from datetime import timedelta
 from utils.time_helpers import utc_now
-from tweets.models import TweetPhoto
+from tweets.models import Tweet, TweetPhoto
 from tweets.constants import TweetPhotoStatus
+from tweets.management.commands.reconcile_counters import (
+    Command as ReconcileCommand,
+)
+from tweets.services import TweetService
+from rest_framework.test import APIClient
+from utils.existence import ExistenceService
+from utils.redis_client import RedisClient
+from utils.redis_counters import RedisCounter
+from utils.redis_helper import RedisHelper
 
 
 class TweetTests(TestCase):
     def setUp(self):
+        self.clear_cache()
         self.hanyuan = self.create_user('hanyuan')
         self.tweet = self.create_tweet(self.hanyuan, content='Hanyuan tweets!')
 
@@ -35,4 +48,266 @@ class TweetTests(TestCase):
         )
         self.assertEqual(photo.user, self.hanyuan)
         self.assertEqual(photo.status, TweetPhotoStatus.PENDING)
-        self.assertEqual(self.tweet.tweetphoto_set.count(), 1)
\ No newline at end of file
+        self.assertEqual(self.tweet.tweetphoto_set.count(), 1)
+
+class TweetCountersTests(TestCase):
+    def setUp(self):
+        self.clear_cache()
+        self.hanyuan = self.create_user('hanyuan')
+        self.eric = self.create_user('eric')
+        self.tweet = self.create_tweet(self.hanyuan)
+
+    def test_likes_count(self):
+        self.create_like(self.hanyuan, self.tweet)
+        self.create_like(self.eric, self.tweet)
+        # liking twice does not create a new like
+        self.create_like(self.eric, self.tweet)
+        self.assertEqual(RedisCounter.get_count(self.tweet, 'likes_count'), 2)
+        # the column is updated by the flush
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 0)
+        self.assertEqual(self.flush_counters(), '1 counters flushed')
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 2)
+        self.assertEqual(RedisCounter.get_count(self.tweet, 'likes_count'), 2)
+
+        self.tweet.like_set.filter(user=self.eric).delete()
+        self.assertEqual(RedisCounter.get_count(self.tweet, 'likes_count'), 1)
+        self.flush_counters()
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 1)
+
+    def test_counter_loaded_with_pending_deltas(self):
+        self.create_like(self.eric, self.tweet)
+        self.flush_counters()
+        self.create_like(self.hanyuan, self.tweet)
+        # the cached counter is lost, it is reloaded from the column + the
+        # deltas not flushed yet
+        RedisCounter.invalidate(Tweet, 'likes_count', [self.tweet.id])
+        tweet = Tweet.objects.get(id=self.tweet.id)
+        self.assertEqual(tweet.likes_count, 1)
+        self.assertEqual(RedisCounter.get_count(tweet, 'likes_count'), 2)
+
+    def test_counter_loaded_during_flush(self):
+        self.create_like(self.eric, self.tweet)
+        RedisCounter.invalidate(Tweet, 'likes_count', [self.tweet.id])
+        # in the middle of a flush: the column is updated but the flushing
+        # hash is not deleted yet
+        conn = RedisClient.get_connection()
+        conn.rename(
+            RedisCounter._pending_key(Tweet, 'likes_count'),
+            RedisCounter._flushing_key(Tweet, 'likes_count'),
+        )
+        conn.set(RedisCounter._lock_key(Tweet, 'likes_count'), 1)
+        Tweet.objects.filter(id=self.tweet.id).update(likes_count=1)
+        # the count can not be told until the flush ends, it is not cached
+        RedisCounter.get_count(self.tweet, 'likes_count')
+        self.assertIsNone(conn.get(
+            RedisCounter._count_key(Tweet, 'likes_count', self.tweet.id),
+        ))
+        conn.delete(
+            RedisCounter._flushing_key(Tweet, 'likes_count'),
+            RedisCounter._lock_key(Tweet, 'likes_count'),
+        )
+        self.assertEqual(RedisCounter.get_count(self.tweet, 'likes_count'), 1)
+        # a missing counter is not created by increments
+        RedisCounter.invalidate(Tweet, 'likes_count', [self.tweet.id])
+        RedisCounter.incr(Tweet, 'likes_count', self.tweet.id)
+        self.assertIsNone(conn.get(
+            RedisCounter._count_key(Tweet, 'likes_count', self.tweet.id),
+        ))
+
+    def test_comments_count(self):
+        comment = self.create_comment(self.eric, self.tweet)
+        self.create_comment(self.hanyuan, self.tweet)
+        self.create_like(self.hanyuan, comment)
+        self.flush_counters()
+        self.tweet.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(self.tweet.comments_count, 2)
+        self.assertEqual(comment.likes_count, 1)
+
+        comment.delete()
+        self.assertEqual(RedisCounter.get_count(self.tweet, 'comments_count'), 1)
+        self.flush_counters()
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.comments_count, 1)
+
+    def test_reconcile_counters(self):
+        comment = self.create_comment(self.eric, self.tweet)
+        self.create_like(self.eric, self.tweet)
+        self.create_like(self.eric, comment)
+        self.flush_counters()
+        Tweet.objects.filter(id=self.tweet.id).update(
+            likes_count=10,
+            comments_count=0,
+        )
+        Comment.objects.filter(id=comment.id).update(likes_count=None)
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_counters', batch_size=1, stdout=out)
+        self.assertIn('1 tweets reconciled', out.getvalue())
+        self.assertIn('1 comments reconciled', out.getvalue())
+        self.tweet.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 1)
+        self.assertEqual(self.tweet.comments_count, 1)
+        self.assertEqual(comment.likes_count, 1)
+        self.assertEqual(RedisCounter.get_count(self.tweet, 'likes_count'), 1)
+
+    def test_reconcile_with_unflushed_deltas(self):
+        self.create_like(self.eric, self.tweet)
+        # the like is counted but its delta is not flushed yet, the column
+        # is left as it is
+        fixed = ReconcileCommand.reconcile(
+            Tweet,
+            ('likes_count',),
+            ReconcileCommand.count_tweet_relations,
+            batch_size=10,
+        )
+        self.assertEqual(fixed, 0)
+        self.flush_counters()
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 1)
+
+    def test_flush_lock_released_by_owner_only(self):
+        lock_key = RedisCounter._lock_key(Tweet, 'likes_count')
+        token = RedisHelper.acquire_lock(lock_key, 60)
+        self.assertIsNone(RedisHelper.acquire_lock(lock_key, 60))
+        # the lock expired and was taken by another flush
+        conn = RedisClient.get_connection()
+        conn.set(lock_key, 'another token')
+        RedisHelper.release_lock(lock_key, token)
+        self.assertEqual(conn.get(lock_key), b'another token')
+        RedisHelper.release_lock(lock_key, 'another token')
+        self.assertIsNone(conn.get(lock_key))
+
+
+class TweetServiceTests(TestCase):
+    def setUp(self):
+        self.clear_cache()
+        self.hanyuan = self.create_user('hanyuan')
+        self.eric = self.create_user('eric')
+
+    def test_get_tweets_by_ids(self):
+        # new tweets are cached when they are created
+        tweets = [self.create_tweet(self.hanyuan) for _ in range(3)]
+        TweetService.get_tweets_by_ids([tweet.id for tweet in tweets])
+        with self.assertNoQueries():
+            cached_tweets = TweetService.get_tweets_by_ids(
+                [tweet.id for tweet in tweets],
+            )
+        self.assertEqual(
+            {tweet_id: tweet.content for tweet_id, tweet in cached_tweets.items()},
+            {tweet.id: tweet.content for tweet in tweets},
+        )
+
+        # the rest are loaded from database with one query and cached
+        self.clear_cache()
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                set(TweetService.get_tweets_by_ids([tweets[0].id, tweets[1].id, -1])),
+                {tweets[0].id, tweets[1].id},
+            )
+        with self.assertNoQueries():
+            TweetService.get_tweet_through_cache(tweets[0].id)
+
+        # invalidated by updates and deletes
+        tweets[0].content = 'updated'
+        tweets[0].save()
+        self.assertEqual(
+            TweetService.get_tweet_through_cache(tweets[0].id).content,
+            'updated',
+        )
+        tweets[1].delete()
+        self.assertIsNone(TweetService.get_tweet_through_cache(tweets[1].id))
+
+    def test_cached_tweet_counters(self):
+        tweet = self.create_tweet(self.hanyuan)
+        self.create_like(self.eric, tweet)
+        self.flush_counters()
+        # the cached row still has likes_count = 0, the lost counter is
+        # loaded from database instead
+        RedisCounter.invalidate(Tweet, 'likes_count', [tweet.id])
+        cached_tweet = TweetService.get_tweet_through_cache(tweet.id)
+        self.assertEqual(cached_tweet.likes_count, 0)
+        self.assertEqual(RedisCounter.get_count(cached_tweet, 'likes_count'), 1)
+
+
+class ExistenceServiceTests(TestCase):
+    def setUp(self):
+        self.clear_cache()
+        self.hanyuan = self.create_user('hanyuan')
+        self.tweet = self.create_tweet(self.hanyuan)
+
+    def test_exists_before_rebuild(self):
+        self.assertFalse(ExistenceService.exists(Tweet, 0))
+        self.assertFalse(ExistenceService.exists(Tweet, self.tweet.id + 1))
+        # positive results are cached
+        self.assertTrue(ExistenceService.exists(Tweet, self.tweet.id))
+        with self.assertNoQueries():
+            self.assertTrue(ExistenceService.exists(Tweet, self.tweet.id))
+        tweet_id = self.tweet.id
+        self.tweet.delete()
+        self.assertFalse(ExistenceService.exists(Tweet, tweet_id))
+
+    def test_exists_after_rebuild(self):
+        out = StringIO()
+        call_command('rebuild_existing_ids', stdout=out)
+        self.assertIn('1 tweets.tweet ids loaded', out.getvalue())
+        self.assertIn('1 auth.user ids loaded', out.getvalue())
+
+        new_tweet = self.create_tweet(self.hanyuan)
+        with self.assertNoQueries():
+            self.assertTrue(ExistenceService.exists(Tweet, self.tweet.id))
+            self.assertTrue(ExistenceService.exists(Tweet, new_tweet.id))
+            self.assertFalse(ExistenceService.exists(Tweet, new_tweet.id + 1))
+            self.assertFalse(ExistenceService.exists(Comment, self.tweet.id))
+        new_tweet_id = new_tweet.id
+        new_tweet.delete()
+        self.assertFalse(ExistenceService.exists(Tweet, new_tweet_id))
+
+        # the comment api validates the tweet id with the bitmap
+        client = APIClient()
+        client.force_authenticate(self.hanyuan)
+        response = client.post('/api/comments/', {
+            'tweet_id': new_tweet_id,
+            'content': 'hello',
+        })
+        self.assertEqual(response.status_code, 400)
+        response = client.post('/api/comments/', {
+            'tweet_id': self.tweet.id,
+            'content': 'hello',
+        })
+        self.assertEqual(response.status_code, 201)
+
+    def test_delete_during_rebuild(self):
+        ExistenceService.rebuild(Tweet)
+        conn = RedisClient.get_connection()
+        ExistenceService._start_rebuild(conn, Tweet)
+        # the scan reads the tweet, which is deleted before its bit is set
+        tweet_id = self.tweet.id
+        self.tweet.delete()
+        conn.setbit(ExistenceService._rebuilding_key(Tweet), tweet_id, 1)
+        new_tweet = self.create_tweet(self.hanyuan)
+        # the old bitmap is used until the rebuild is done
+        self.assertFalse(ExistenceService.exists(Tweet, tweet_id))
+        self.assertTrue(ExistenceService.exists(Tweet, new_tweet.id))
+
+        ExistenceService._finish_rebuild(conn, Tweet)
+        with self.assertNoQueries():
+            self.assertFalse(ExistenceService.exists(Tweet, tweet_id))
+            self.assertTrue(ExistenceService.exists(Tweet, new_tweet.id))
+
+    def test_ids_out_of_bitmap_range(self):
+        ExistenceService.rebuild(Tweet)
+        object_id = ExistenceService.MAX_BITMAP_ID + 1
+        ExistenceService.add(Tweet, object_id)
+        self.assertFalse(RedisClient.get_connection().getbit(
+            ExistenceService._bitmap_key(Tweet),
+            object_id,
+        ))
+        # answered by the database
+        with self.assertNumQueries(1):
+            self.assertFalse(ExistenceService.exists(Tweet, object_id))
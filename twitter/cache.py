@@ -0,0 +1,42 @@
+# memcached
+USER_PATTERN = 'user:{user_id}'
+USER_PROFILE_PATTERN = 'userprofile:{user_id}'
+TWEET_PATTERN = 'tweet:{tweet_id}'
+OBJECT_EXISTS_PATTERN = 'exists:{model}:{object_id}'
+TWEET_COMMENTS_FIRST_PAGE_PATTERN = 'tweet_comments_first_page:{tweet_id}'
+
+# redis
+USER_NEWSFEEDS_PATTERN = 'user_newsfeeds:{user_id}'
+USER_FOLLOWERS_COUNT_PATTERN = 'user_followers_count:{user_id}'
+USER_FOLLOWINGS_COUNT_PATTERN = 'user_followings_count:{user_id}'
+USER_UNREAD_NOTIFICATIONS_COUNT_PATTERN = 'user_unread_notifications_count:{user_id}'
+USER_FOLLOWER_IDS_PATTERN = 'user_follower_ids:{user_id}'
+USER_FOLLOWING_IDS_PATTERN = 'user_following_ids:{user_id}'
+# counters of model fields, e.g. count:tweets.tweet:likes_count:1
+OBJECT_COUNT_PATTERN = 'count:{model}:{field}:{object_id}'
+# hashes of {object id: delta} not yet flushed into database
+PENDING_COUNTS_PATTERN = 'pending_counts:{model}:{field}'
+FLUSHING_COUNTS_PATTERN = 'flushing_counts:{model}:{field}'
+COUNTS_FLUSH_LOCK_PATTERN = 'counts_flush_lock:{model}:{field}'
+# list of the notification events not delivered yet, see inbox/services.py
+NOTIFICATION_QUEUE_KEY = 'notification_queue'
+# hyperloglog of the actors of an aggregated notification, see
+# NotificationService._aggregate
+NOTIFICATION_ACTORS_PATTERN = (
+    'notification_actors:{recipient_id}:{verb}:{content_type_id}:{object_id}'
+)
+# hash of {user_id:content_type_id:object_id: like or cancel} not yet saved
+PENDING_LIKE_INTENTS_KEY = 'pending_like_intents'
+FLUSHING_LIKE_INTENTS_KEY = 'flushing_like_intents'
+LIKE_INTENTS_FLUSH_LOCK_KEY = 'like_intents_flush_lock'
+# set of the likes a flush is inserting into a shard, see LikeIntents._apply
+APPLYING_LIKE_INTENTS_PATTERN = 'applying_like_intents:{alias}'
+# bitmaps of the existing ids of a model, bit N is set if the object N exists
+EXISTING_IDS_PATTERN = 'existing_ids:{model}'
+EXISTING_IDS_READY_PATTERN = 'existing_ids_ready:{model}'
+# the bitmap being rebuilt and the ids deleted meanwhile, see
+# ExistenceService.rebuild
+REBUILDING_EXISTING_IDS_PATTERN = 'rebuilding_existing_ids:{model}'
+DELETED_DURING_REBUILD_IDS_PATTERN = 'deleted_during_rebuild_ids:{model}'
+# hash of the progress of backfill_like_shards from a source database
+LIKE_BACKFILL_PATTERN = 'like_backfill:{source}'
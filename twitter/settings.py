@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+from kombu import Queue
 from pathlib import Path
 
 import sys
@@ -111,6 +112,21 @@ DATABASES = {
     }
 }
 
+# Likes are sharded by the id of the liked object into LIKE_SHARDS databases,
+# see likes/routers.py. Run migrate with --database for each of them, then
+# backfill_like_shards to copy the likes saved in default before sharding,
+# see likes/management/commands/backfill_like_shards.py for the deploy order.
+LIKE_SHARDS = ['likes_0', 'likes_1']
+for like_shard in LIKE_SHARDS:
+    DATABASES[like_shard] = dict(
+        DATABASES['default'],
+        NAME='twitter_{}'.format(like_shard),
+    )
+DATABASE_ROUTERS = ['likes.routers.LikeShardRouter']
+# queue likes / cancels in redis and save them in batches, for viral tweets
+# see likes/intents.py
+LIKE_WRITE_BEHIND = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -164,6 +180,100 @@ AWS_S3_REGION_NAME = 'us-west-1'
 # AWS_SECRET_ACCESS_KEY = 'YOUR_SECRET_ACCESS_KEY'
 
 MEDIA_ROOT = 'media/'
+
+# Redis
+# sudo apt-get install redis; pip install redis
+# when testing, an in-process fakeredis is used instead of a real redis-server
+REDIS_HOST = '127.0.0.1'
+REDIS_PORT = 6379
+REDIS_DB = 0 if TESTING else 1
+REDIS_KEY_EXPIRE_TIME = 7 * 86400  # in seconds
+# only the latest REDIS_LIST_LENGTH_LIMIT objects of a list are kept in cache,
+# older objects are read from database
+REDIS_LIST_LENGTH_LIMIT = 1000 if not TESTING else 20
+
+# Memcached
+# django cache used for small objects read everywhere, e.g. user profiles.
+# When testing, a local memory cache is used instead of a memcached server.
+# 'local' is a small cache in the memory of each process in front of the
+# shared one. It can only be invalidated in the process which made the
+# change, so its entries only live for a short time.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+        'TIMEOUT': 86400,
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'local',
+        'TIMEOUT': 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+} if not TESTING else {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+        'TIMEOUT': 86400,
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'local',
+        'TIMEOUT': 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Newsfeeds
+# tweets of the users who have at least NEWSFEED_CELEBRITY_THRESHOLD
+# followers are not fanned out, their followers pull them when reading the
+# newsfeeds instead
+NEWSFEED_CELEBRITY_THRESHOLD = 100000
+
+# Celery
+# run the workers with:
+# celery -A twitter worker -l INFO -Q default,newsfeeds
+# and the periodic tasks with:
+# celery -A twitter beat -l INFO
+# redis is used as the broker. When testing, tasks are executed eagerly in
+# the current process and the in-memory broker is never really used.
+CELERY_BROKER_URL = 'redis://127.0.0.1:6379/2' if not TESTING else 'memory://'
+CELERY_TIMEZONE = 'UTC'
+CELERY_TASK_ALWAYS_EAGER = TESTING
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_QUEUES = (
+    Queue('default', routing_key='default'),
+    Queue('newsfeeds', routing_key='newsfeeds'),
+)
+CELERY_TASK_ROUTES = {
+    'newsfeeds.tasks.*': {'queue': 'newsfeeds'},
+}
+CELERY_BEAT_SCHEDULE = {
+    # apply the like / comment counters absorbed by redis to the database
+    'flush-counters': {
+        'task': 'tweets.tasks.flush_counters_task',
+        'schedule': 10.0,
+    },
+    # save the likes and cancels queued when LIKE_WRITE_BEHIND is on
+    'flush-like-intents': {
+        'task': 'likes.tasks.flush_like_intents_task',
+        'schedule': 0.5,
+    },
+    # insert the queued notifications in batches
+    'deliver-notifications': {
+        'task': 'inbox.tasks.deliver_notifications_task',
+        'schedule': 1.0,
+    },
+    # drop the cached unread notification counts which drifted
+    'reconcile-unread-counts': {
+        'task': 'inbox.tasks.reconcile_unread_counts_task',
+        'schedule': 600.0,
+    },
+}
+# without a celery worker (tests / local dev), deliver the queued
+# notifications in process right after queuing them
+NOTIFICATIONS_DELIVER_INLINE = TESTING
+
 try:
     from .local_settings import *
 except:
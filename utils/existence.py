@@ -0,0 +1,192 @@
+from django.core.cache import caches
+from twitter.cache import (
+    DELETED_DURING_REBUILD_IDS_PATTERN,
+    EXISTING_IDS_PATTERN,
+    EXISTING_IDS_READY_PATTERN,
+    OBJECT_EXISTS_PATTERN,
+    REBUILDING_EXISTING_IDS_PATTERN,
+)
+from utils.redis_client import RedisClient
+
+cache = caches['default']
+
+# set the bit of an id, also in the bitmap being rebuilt if any, where the
+# deleted ids are recorded too
+SET_BIT_SCRIPT = """
+redis.call('setbit', KEYS[1], ARGV[1], ARGV[2])
+if redis.call('exists', KEYS[2]) == 1 then
+    redis.call('setbit', KEYS[2], ARGV[1], ARGV[2])
+    if ARGV[2] == '0' then
+        redis.call('sadd', KEYS[3], ARGV[1])
+    end
+end
+"""
+
+# clear the ids deleted during the rebuild, which the scan may have set back,
+# and replace the bitmap with the rebuilt one
+FINISH_REBUILD_SCRIPT = """
+for _, object_id in ipairs(redis.call('smembers', KEYS[3])) do
+    redis.call('setbit', KEYS[2], object_id, 0)
+end
+redis.call('rename', KEYS[2], KEYS[1])
+redis.call('del', KEYS[3])
+redis.call('set', KEYS[4], 1)
+"""
+
+
+class ExistenceService(object):
+    """
+    Tells if an object exists by its id, for the validation of the write apis
+    (e.g. the tweet of a new comment), without querying the database in the
+    common case of a valid id.
+
+    The ids of a model are kept in a redis bitmap, bit N is set when object N
+    is created and cleared when it is deleted (see utils/listeners.py). A
+    bitmap has no false positives and supports deletes, unlike a bloom
+    filter. It only knows the objects created after the listeners were
+    connected, so it is not used until rebuild() has scanned the table once.
+    Before that, or for ids out of its range, the database is queried and
+    the positive results are cached.
+    """
+
+    # a bitmap takes max id / 8 bytes, 16MB at most
+    MAX_BITMAP_ID = 2 ** 27 - 1
+
+    @classmethod
+    def _model_name(cls, model_class):
+        return model_class._meta.label_lower
+
+    @classmethod
+    def _bitmap_key(cls, model_class):
+        return EXISTING_IDS_PATTERN.format(model=cls._model_name(model_class))
+
+    @classmethod
+    def _ready_key(cls, model_class):
+        return EXISTING_IDS_READY_PATTERN.format(model=cls._model_name(model_class))
+
+    @classmethod
+    def _rebuilding_key(cls, model_class):
+        return REBUILDING_EXISTING_IDS_PATTERN.format(
+            model=cls._model_name(model_class),
+        )
+
+    @classmethod
+    def _deleted_ids_key(cls, model_class):
+        return DELETED_DURING_REBUILD_IDS_PATTERN.format(
+            model=cls._model_name(model_class),
+        )
+
+    @classmethod
+    def _cache_key(cls, model_class, object_id):
+        return OBJECT_EXISTS_PATTERN.format(
+            model=cls._model_name(model_class),
+            object_id=object_id,
+        )
+
+    @classmethod
+    def exists(cls, model_class, object_id):
+        if object_id < 1:
+            return False
+        if object_id <= cls.MAX_BITMAP_ID:
+            conn = RedisClient.get_connection()
+            pipeline = conn.pipeline()
+            pipeline.exists(cls._ready_key(model_class))
+            pipeline.getbit(cls._bitmap_key(model_class), object_id)
+            is_ready, bit = pipeline.execute()
+            if is_ready:
+                return bool(bit)
+
+        key = cls._cache_key(model_class, object_id)
+        if cache.get(key):
+            return True
+        exists = model_class.objects.filter(id=object_id).exists()
+        # only the positive results are cached, a missing id may be created
+        # later
+        if exists:
+            cache.set(key, True)
+        return exists
+
+    @classmethod
+    def _set_bit(cls, model_class, object_id, value):
+        if object_id > cls.MAX_BITMAP_ID:
+            return
+        conn = RedisClient.get_connection()
+        script = conn.register_script(SET_BIT_SCRIPT)
+        script(
+            keys=[
+                cls._bitmap_key(model_class),
+                cls._rebuilding_key(model_class),
+                cls._deleted_ids_key(model_class),
+            ],
+            args=[object_id, value],
+        )
+
+    @classmethod
+    def add(cls, model_class, object_id):
+        cls._set_bit(model_class, object_id, 1)
+
+    @classmethod
+    def remove(cls, model_class, object_id):
+        cache.delete(cls._cache_key(model_class, object_id))
+        cls._set_bit(model_class, object_id, 0)
+
+    @classmethod
+    def rebuild(cls, model_class, batch_size=10000):
+        """
+        Set the bits of all the existing ids into a new bitmap, walking the
+        table by primary key, then replace the bitmap with it. The listeners
+        update the new bitmap too meanwhile, and record the deleted ids, whose
+        bits the scan may have set back after they were read. Return the
+        number of ids set.
+        """
+        conn = RedisClient.get_connection()
+        rebuilding_key = cls._rebuilding_key(model_class)
+        cls._start_rebuild(conn, model_class)
+        added, last_id = 0, 0
+        while True:
+            object_ids = list(
+                model_class.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not object_ids:
+                break
+            pipeline = conn.pipeline()
+            for object_id in object_ids:
+                if object_id <= cls.MAX_BITMAP_ID:
+                    pipeline.setbit(rebuilding_key, object_id, 1)
+            pipeline.execute()
+            added += len(object_ids)
+            last_id = object_ids[-1]
+        cls._finish_rebuild(conn, model_class)
+        return added
+
+    @classmethod
+    def _start_rebuild(cls, conn, model_class):
+        rebuilding_key = cls._rebuilding_key(model_class)
+        pipeline = conn.pipeline()
+        pipeline.delete(rebuilding_key, cls._deleted_ids_key(model_class))
+        # bit 0 is never an id, it makes the new bitmap exist for the
+        # listeners
+        pipeline.setbit(rebuilding_key, 0, 0)
+        pipeline.execute()
+
+    @classmethod
+    def _finish_rebuild(cls, conn, model_class):
+        script = conn.register_script(FINISH_REBUILD_SCRIPT)
+        script(keys=[
+            cls._bitmap_key(model_class),
+            cls._rebuilding_key(model_class),
+            cls._deleted_ids_key(model_class),
+            cls._ready_key(model_class),
+        ])
+
+    @classmethod
+    def clear(cls, model_class):
+        conn = RedisClient.get_connection()
+        conn.delete(
+            cls._ready_key(model_class),
+            cls._bitmap_key(model_class),
+            cls._rebuilding_key(model_class),
+            cls._deleted_ids_key(model_class),
+        )
@@ -0,0 +1,18 @@
+from django.core.serializers.json import DjangoJSONEncoder
+import datetime
+
+
+class JSONEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder cuts datetime down to milliseconds. created_at is used as
+    the pagination cursor, so the microseconds must be kept, otherwise objects
+    loaded from cache cannot be compared with the ones in database.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            r = o.isoformat()
+            if r.endswith('+00:00'):
+                r = r[:-6] + 'Z'
+            return r
+        return super(JSONEncoder, self).default(o)
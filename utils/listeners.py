@@ -0,0 +1,11 @@
+from utils.existence import ExistenceService
+
+
+def add_existing_id(sender, instance, created, **kwargs):
+    if not created:
+        return
+    ExistenceService.add(sender, instance.id)
+
+
+def remove_existing_id(sender, instance, **kwargs):
+    ExistenceService.remove(sender, instance.id)
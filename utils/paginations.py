@@ -1,34 +1,245 @@
+import base64
+import binascii
+
+from dateutil import parser
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import BasePagination
 from rest_framework.response import Response
 
 
+INVALID_CURSOR_MESSAGE = 'Invalid cursor'
+
+
+def encode_cursor(created_at, object_id):
+    """
+    Opaque cursor of a (created_at, id) keyset position, the id breaks the
+    ties between rows created at the same time. object_id can be None for
+    objects not stored in database, then only created_at is compared.
+    """
+    value = '{}|{}'.format(
+        created_at.isoformat(),
+        '' if object_id is None else object_id,
+    )
+    return base64.urlsafe_b64encode(value.encode('ascii')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    # raise 404 like rest_framework.pagination.CursorPagination does
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii')
+        created_at, object_id = value.split('|')
+        return (
+            _parse_datetime(created_at),
+            int(object_id) if object_id else None,
+        )
+    except (binascii.Error, UnicodeError, ValueError, OverflowError):
+        raise NotFound(INVALID_CURSOR_MESSAGE)
+
+
+def filter_before(queryset, created_at, object_id=None, field='created_at', id_field='id'):
+    """
+    Rows after (created_at, object_id) in (-created_at, -id) order. Served by
+    the (..., created_at) indexes, the id only matters for equal timestamps.
+    InnoDB secondary indexes end with the primary key, so ties on id are in
+    index order too. Ties on any other id_field are not, the rows sharing
+    the timestamp are sorted after the index range scan.
+    field is the name of the time column, e.g. timestamp of Notification.
+    id_field is the column breaking the ties, e.g. tweet_id of NewsFeed.
+    """
+    if object_id is None:
+        return queryset.filter(**{field + '__lt': created_at})
+    return queryset.filter(
+        Q(**{field + '__lt': created_at}) |
+        Q(**{field: created_at, id_field + '__lt': object_id}),
+    )
+
+
+def filter_after(queryset, created_at, object_id=None, field='created_at', id_field='id'):
+    if object_id is None:
+        return queryset.filter(**{field + '__gt': created_at})
+    return queryset.filter(
+        Q(**{field + '__gt': created_at}) |
+        Q(**{field: created_at, id_field + '__gt': object_id}),
+    )
+
+
+def filter_before_cursor(queryset, cursor, field='created_at'):
+    return filter_before(queryset, *decode_cursor(cursor), field=field)
+
+
+def filter_after_cursor(queryset, cursor, field='created_at'):
+    return filter_after(queryset, *decode_cursor(cursor), field=field)
+
+
+def _is_before(obj, created_at, object_id=None, id_field='id'):
+    if obj.created_at != created_at:
+        return obj.created_at < created_at
+    obj_id = getattr(obj, id_field)
+    return object_id is not None and obj_id is not None and obj_id < object_id
+
+
+def _is_after(obj, created_at, object_id=None, id_field='id'):
+    if obj.created_at != created_at:
+        return obj.created_at > created_at
+    obj_id = getattr(obj, id_field)
+    return object_id is not None and obj_id is not None and obj_id > object_id
+
+
+def _parse_datetime(value):
+    value = parser.isoparse(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.utc)
+    return value
+
+
 class EndlessPagination(BasePagination):
+    """
+    Keyset pagination on (created_at, id), the latest objects first.
+    ?cursor=<next_cursor> pulls the page older than the cursor.
+    ?since_cursor=<since_cursor> pulls the objects newer than the cursor, at
+    most page_size of them. They are the ones right after the cursor, so
+    pulling again with the new since_cursor never skips any object, and
+    has_newer_page tells if there are more to pull.
+    The legacy created_at__lt / created_at__gt params are still accepted, they
+    only compare created_at.
+    id_field is the column breaking the ties of created_at, in the cursors
+    too.
+    """
     page_size = 20
+    id_field = 'id'
+    cursor_query_param = 'cursor'
+    since_cursor_query_param = 'since_cursor'
 
     def __init__(self):
         super(EndlessPagination, self).__init__()
         self.has_next_page = False
+        self.has_newer_page = False
+        self.is_newer_pull = False
+        self.since_cursor = None
+        # the objects of the current page, the cursors are taken from them
+        self.page = []
 
     def to_html(self):
         pass
 
+    def _get_positions(self, request):
+        """
+        return the (created_at, id) positions the page is older / newer than
+        """
+        params = request.query_params
+        before, after = None, None
+        if self.since_cursor_query_param in params:
+            self.since_cursor = params[self.since_cursor_query_param]
+            after = decode_cursor(self.since_cursor)
+        elif 'created_at__gt' in params:
+            after = (_parse_datetime(params['created_at__gt']), None)
+        elif self.cursor_query_param in params:
+            before = decode_cursor(params[self.cursor_query_param])
+        elif 'created_at__lt' in params:
+            before = (_parse_datetime(params['created_at__lt']), None)
+        self.is_newer_pull = after is not None
+        return before, after
+
     def paginate_queryset(self, queryset, request, view=None):
-        if 'created_at__gt' in request.query_params:
-            created_at__gt = request.query_params['created_at__gt']
-            queryset = queryset.filter(created_at__gt=created_at__gt)
+        # one query per page: page_size + 1 rows tell if there is one more page
+        before, after = self._get_positions(request)
+        if after is not None:
+            objects = list(
+                filter_after(queryset, *after, id_field=self.id_field)
+                .order_by('created_at', self.id_field)[:self.page_size + 1]
+            )
+            self.has_next_page = False
+            self.has_newer_page = len(objects) > self.page_size
+            self.page = objects[:self.page_size][::-1]
+            return self.page
+
+        if before is not None:
+            queryset = filter_before(queryset, *before, id_field=self.id_field)
+        objects = list(
+            queryset.order_by('-created_at', '-' + self.id_field)[:self.page_size + 1]
+        )
+        self.has_next_page = len(objects) > self.page_size
+        self.page = objects[:self.page_size]
+        return self.page
+
+    def paginate_ordered_list(self, reverse_ordered_list, request):
+        """
+        Same as paginate_queryset, but works on a list which is already sorted
+        by (created_at, id_field) in descending order
+        """
+        before, after = self._get_positions(request)
+        if after is not None:
+            newer_objects = []
+            for obj in reverse_ordered_list:
+                if not _is_after(obj, *after, id_field=self.id_field):
+                    break
+                newer_objects.append(obj)
             self.has_next_page = False
-            return queryset.order_by('-created_at')
+            self.has_newer_page = len(newer_objects) > self.page_size
+            self.page = newer_objects[-self.page_size:]
+            return self.page
+
+        index = 0
+        if before is not None:
+            for index, obj in enumerate(reverse_ordered_list):
+                if _is_before(obj, *before, id_field=self.id_field):
+                    break
+            else:
+                # no object is older than the cursor
+                # this else belongs to for, see python for-else syntax
+                reverse_ordered_list = []
+        self.has_next_page = len(reverse_ordered_list) > index + self.page_size
+        self.page = reverse_ordered_list[index: index + self.page_size]
+        return self.page
+
+    def paginate_cached_list(self, cached_list, request):
+        """
+        Paginate the objects loaded from cache. Return None if the requested
+        page goes beyond the cached objects, then the caller has to read it
+        from database.
+        """
+        paginated_list = self.paginate_ordered_list(cached_list, request)
+        is_cache_full = len(cached_list) >= settings.REDIS_LIST_LENGTH_LIMIT
+        # pulling the latest objects, the latest ones are always in cache,
+        # unless all the cached objects are newer than the cursor. Then there
+        # might be objects between the cursor and the cache in database.
+        if self.is_newer_pull:
+            if is_cache_full and cached_list and \
+                    paginated_list and paginated_list[-1] is cached_list[-1]:
+                return None
+            return paginated_list
+        # there are still cached objects after this page
+        if self.has_next_page:
+            return paginated_list
+        # cache is not full, which means all the objects are in cache
+        if not is_cache_full:
+            return paginated_list
+        # there might be objects in database which are not loaded into cache
+        return None
 
-        if 'created_at__lt' in request.query_params:
-            created_at__lt = request.query_params['created_at__lt']
-            queryset = queryset.filter(created_at__lt=created_at__lt)
+    def get_next_cursor(self):
+        if not self.has_next_page or not self.page:
+            return None
+        last = self.page[-1]
+        return encode_cursor(last.created_at, getattr(last, self.id_field))
 
-        queryset = queryset.order_by('-created_at')[:self.page_size + 1]
-        self.has_next_page = len(queryset) > self.page_size
-        return queryset[:self.page_size]
+    def get_since_cursor(self):
+        # nothing newer this time, pull from the same position next time
+        if not self.page:
+            return self.since_cursor
+        first = self.page[0]
+        return encode_cursor(first.created_at, getattr(first, self.id_field))
 
     def get_paginated_response(self, data):
-        return Response({
+        response = {
             'has_next_page': self.has_next_page,
+            'next_cursor': self.get_next_cursor(),
+            'since_cursor': self.get_since_cursor(),
             'results': data,
-        })
\ No newline at end of file
+        }
+        if self.is_newer_pull:
+            response['has_newer_page'] = self.has_newer_page
+        return Response(response)
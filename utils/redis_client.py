@@ -0,0 +1,33 @@
+from django.conf import settings
+import redis
+
+
+class RedisClient:
+    conn = None
+
+    @classmethod
+    def get_connection(cls):
+        # singleton: only one connection is created per process, and it is
+        # reused by every request
+        if cls.conn:
+            return cls.conn
+        if settings.TESTING:
+            # fakeredis keeps everything in the memory of the test process, so
+            # unit tests do not depend on a running redis-server
+            import fakeredis
+            cls.conn = fakeredis.FakeStrictRedis()
+            return cls.conn
+        cls.conn = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+        )
+        return cls.conn
+
+    @classmethod
+    def clear(cls):
+        # clear all keys in redis, for testing purpose
+        if not settings.TESTING:
+            raise Exception("You can not flush redis in production environment")
+        conn = cls.get_connection()
+        conn.flushdb()
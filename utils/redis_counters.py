@@ -0,0 +1,299 @@
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from twitter.cache import (
+    COUNTS_FLUSH_LOCK_PATTERN,
+    FLUSHING_COUNTS_PATTERN,
+    OBJECT_COUNT_PATTERN,
+    PENDING_COUNTS_PATTERN,
+)
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
+from utils.time_constants import ONE_MINUTE
+import time
+
+
+# column value + the pending and flushing deltas, set into the counter if it
+# is still missing. Done in one step, so no increment can come in between
+# reading the deltas and setting the counter.
+LOAD_COUNT_SCRIPT = """
+local count = tonumber(ARGV[2])
+    + tonumber(redis.call('hget', KEYS[2], ARGV[1]) or 0)
+    + tonumber(redis.call('hget', KEYS[3], ARGV[1]) or 0)
+if redis.call('set', KEYS[1], count, 'EX', ARGV[3], 'NX') then
+    return count
+end
+return tonumber(redis.call('get', KEYS[1]))
+"""
+
+
+class RedisCounter(object):
+    """
+    Counters of denormalized integer columns (e.g. Tweet.likes_count) kept in
+    redis. Increments only touch redis: the counter itself, if it is cached,
+    and a pending hash of {object id: delta}. flush() applies the pending
+    deltas to the database in batches, so a hot row is updated once per flush
+    instead of once per like.
+
+    The count of an object is its database column + the deltas that are
+    pending or being flushed. A missing counter is loaded under the flush
+    lock, since in the middle of a flush the column may already include the
+    flushing deltas.
+    """
+
+    FLUSH_LOCK_EXPIRE_TIME = 5 * ONE_MINUTE
+
+    @classmethod
+    def _model_name(cls, model_class):
+        return model_class._meta.label_lower
+
+    @classmethod
+    def _count_key(cls, model_class, field, object_id):
+        return OBJECT_COUNT_PATTERN.format(
+            model=cls._model_name(model_class),
+            field=field,
+            object_id=object_id,
+        )
+
+    @classmethod
+    def _pending_key(cls, model_class, field):
+        return PENDING_COUNTS_PATTERN.format(
+            model=cls._model_name(model_class),
+            field=field,
+        )
+
+    @classmethod
+    def _flushing_key(cls, model_class, field):
+        return FLUSHING_COUNTS_PATTERN.format(
+            model=cls._model_name(model_class),
+            field=field,
+        )
+
+    @classmethod
+    def _lock_key(cls, model_class, field):
+        return COUNTS_FLUSH_LOCK_PATTERN.format(
+            model=cls._model_name(model_class),
+            field=field,
+        )
+
+    @classmethod
+    def incr(cls, model_class, field, object_id, amount=1, pipeline=None):
+        """
+        Pass pipeline to run it in the transaction of the pipeline, it is
+        then executed by the caller.
+        """
+        conn = RedisClient.get_connection()
+        is_own_pipeline = pipeline is None
+        if is_own_pipeline:
+            pipeline = conn.pipeline()
+        # a missing counter is not created here, it is loaded with the
+        # database value + pending deltas on its next read
+        RedisHelper.incr_count(
+            cls._count_key(model_class, field, object_id),
+            amount,
+            pipeline=pipeline,
+        )
+        pipeline.hincrby(cls._pending_key(model_class, field), object_id, amount)
+        if is_own_pipeline:
+            pipeline.execute()
+
+    @classmethod
+    def decr(cls, model_class, field, object_id, amount=1):
+        cls.incr(model_class, field, object_id, -amount)
+
+    @classmethod
+    def get_counts(cls, objects, field):
+        """
+        return {object id: count} of the objects with one mget. The column
+        values of the objects are not used, they may be older than the last
+        flush, e.g. objects loaded from cache.
+        """
+        objects = [obj for obj in objects if obj is not None]
+        if not objects:
+            return {}
+        return cls.get_counts_by_ids(
+            objects[0].__class__,
+            field,
+            [obj.id for obj in objects],
+        )
+
+    @classmethod
+    def get_counts_by_ids(cls, model_class, field, object_ids):
+        """
+        return {object id: count} of the objects with one mget, the counters
+        missing in cache are loaded with one IN query. Objects that do not
+        exist are left out.
+        """
+        if not object_ids:
+            return {}
+        conn = RedisClient.get_connection()
+        keys = [
+            cls._count_key(model_class, field, object_id)
+            for object_id in object_ids
+        ]
+
+        counts, missing_ids = {}, []
+        for object_id, value in zip(object_ids, conn.mget(keys)):
+            if value is None:
+                missing_ids.append(object_id)
+            else:
+                counts[object_id] = int(value)
+        if missing_ids:
+            counts.update(cls._load_counts(conn, model_class, field, missing_ids))
+        return counts
+
+    @classmethod
+    def _load_counts(cls, conn, model_class, field, object_ids):
+        # the column values are read under the flush lock, so that they and
+        # the flushing deltas are either both before or both after a flush
+        lock_key = cls._lock_key(model_class, field)
+        token = RedisHelper.acquire_lock(lock_key, cls.FLUSH_LOCK_EXPIRE_TIME)
+        try:
+            column_values = dict(model_class.objects.filter(
+                id__in=object_ids,
+            ).values_list('id', field))
+            if token is None:
+                # a flush is running, the count may be off by the flushing
+                # deltas until it ends, so it is not cached
+                return cls._count_without_caching(
+                    conn,
+                    model_class,
+                    field,
+                    column_values,
+                )
+            script = conn.register_script(LOAD_COUNT_SCRIPT)
+            pipeline = conn.pipeline()
+            for object_id, column_value in column_values.items():
+                script(
+                    keys=[
+                        cls._count_key(model_class, field, object_id),
+                        cls._pending_key(model_class, field),
+                        cls._flushing_key(model_class, field),
+                    ],
+                    args=[
+                        object_id,
+                        column_value or 0,
+                        settings.REDIS_KEY_EXPIRE_TIME,
+                    ],
+                    client=pipeline,
+                )
+            return dict(zip(column_values.keys(), pipeline.execute()))
+        finally:
+            if token is not None:
+                RedisHelper.release_lock(lock_key, token)
+
+    @classmethod
+    def _count_without_caching(cls, conn, model_class, field, column_values):
+        deltas = cls.get_unflushed_deltas(
+            model_class,
+            field,
+            list(column_values.keys()),
+        )
+        return {
+            object_id: (column_value or 0) + deltas[object_id]
+            for object_id, column_value in column_values.items()
+        }
+
+    @classmethod
+    def get_unflushed_deltas(cls, model_class, field, object_ids):
+        """
+        return {object id: the pending + flushing deltas not in the column yet}
+        """
+        if not object_ids:
+            return {}
+        conn = RedisClient.get_connection()
+        pipeline = conn.pipeline()
+        pipeline.hmget(cls._pending_key(model_class, field), object_ids)
+        pipeline.hmget(cls._flushing_key(model_class, field), object_ids)
+        pending_deltas, flushing_deltas = pipeline.execute()
+        return {
+            object_id: int(pending or 0) + int(flushing or 0)
+            for object_id, pending, flushing in zip(
+                object_ids,
+                pending_deltas,
+                flushing_deltas,
+            )
+        }
+
+    @classmethod
+    def get_count(cls, obj, field):
+        return cls.get_counts([obj], field)[obj.id]
+
+    @classmethod
+    def invalidate(cls, model_class, field, object_ids):
+        if not object_ids:
+            return
+        conn = RedisClient.get_connection()
+        conn.delete(*[
+            cls._count_key(model_class, field, object_id)
+            for object_id in object_ids
+        ])
+
+    @classmethod
+    def flush(cls, model_class, field, batch_size=1000):
+        """
+        Apply the pending deltas to the database, return the number of rows
+        updated. The pending hash is renamed first, so the increments coming
+        in during the flush go to a new pending hash. Rows with the same delta
+        are updated together by one UPDATE ... SET field = field + delta.
+        If the database update fails, the flushing hash is kept and retried by
+        the next flush.
+        """
+        conn = RedisClient.get_connection()
+        # only one flush of the same counter at a time, otherwise the same
+        # flushing hash would be applied twice
+        lock_key = cls._lock_key(model_class, field)
+        token = RedisHelper.acquire_lock(lock_key, cls.FLUSH_LOCK_EXPIRE_TIME)
+        if token is None:
+            return 0
+        try:
+            return cls._flush(conn, model_class, field, batch_size)
+        finally:
+            RedisHelper.release_lock(lock_key, token)
+
+    @classmethod
+    @contextmanager
+    def hold_flush_lock(cls, model_class, field, wait_interval=0.1):
+        """
+        Wait for the running flush of the counter to end, then keep it from
+        being flushed (and its missing counters from being cached) until the
+        block exits. The pending deltas can still grow meanwhile.
+        """
+        lock_key = cls._lock_key(model_class, field)
+        token = RedisHelper.acquire_lock(lock_key, cls.FLUSH_LOCK_EXPIRE_TIME)
+        while token is None:
+            time.sleep(wait_interval)
+            token = RedisHelper.acquire_lock(lock_key, cls.FLUSH_LOCK_EXPIRE_TIME)
+        try:
+            yield
+        finally:
+            RedisHelper.release_lock(lock_key, token)
+
+    @classmethod
+    def _flush(cls, conn, model_class, field, batch_size):
+        pending_key = cls._pending_key(model_class, field)
+        flushing_key = cls._flushing_key(model_class, field)
+
+        if not conn.exists(flushing_key):
+            if not conn.exists(pending_key):
+                return 0
+            conn.rename(pending_key, flushing_key)
+
+        ids_by_delta = {}
+        for object_id, delta in conn.hgetall(flushing_key).items():
+            delta = int(delta)
+            if delta != 0:
+                ids_by_delta.setdefault(delta, []).append(int(object_id))
+
+        updated = 0
+        with transaction.atomic():
+            for delta, object_ids in ids_by_delta.items():
+                for start in range(0, len(object_ids), batch_size):
+                    updated += model_class.objects.filter(
+                        id__in=object_ids[start:start + batch_size],
+                    ).update(**{field: F(field) + delta})
+            # dropped only once the updates are committed, if the commit
+            # fails the same deltas are retried by the next flush
+            transaction.on_commit(lambda: conn.delete(flushing_key))
+        return updated
@@ -0,0 +1,201 @@
+from django.conf import settings
+from uuid import uuid4
+from utils.redis_client import RedisClient
+from utils.redis_serializers import DjangoModelSerializer
+
+
+# incrby only if the counter is cached, in one step, so that the counter can
+# not expire or be loaded between the check and the increment
+INCR_IF_EXISTS_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('incrby', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+# delete the lock only if it is still held with the token, a lock that expired
+# and was taken by someone else is left alone
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisHelper:
+
+    @classmethod
+    def _load_objects_to_cache(cls, key, objects):
+        conn = RedisClient.get_connection()
+
+        serialized_list = [
+            DjangoModelSerializer.serialize(obj)
+            for obj in objects
+        ]
+        if serialized_list:
+            # objects are already ordered, rpush keeps the order in the list
+            conn.rpush(key, *serialized_list)
+            conn.expire(key, settings.REDIS_KEY_EXPIRE_TIME)
+
+    @classmethod
+    def load_objects(cls, key, queryset):
+        """
+        Return at most REDIS_LIST_LENGTH_LIMIT objects of the queryset.
+        Read from cache if the key exists, otherwise load them from database
+        and write them into cache.
+        """
+        conn = RedisClient.get_connection()
+
+        # cache hit, no database query at all
+        if conn.exists(key):
+            serialized_list = conn.lrange(key, 0, -1)
+            return [
+                DjangoModelSerializer.deserialize(serialized_data)
+                for serialized_data in serialized_list
+            ]
+
+        # cache miss, only the latest REDIS_LIST_LENGTH_LIMIT objects are
+        # cached. queryset is evaluated only once here.
+        objects = list(queryset[:settings.REDIS_LIST_LENGTH_LIMIT])
+        cls._load_objects_to_cache(key, objects)
+        return objects
+
+    @classmethod
+    def push_objects(cls, key_object_pairs):
+        """
+        Push each object to the head of the list under its key.
+        lpushx only pushes when the list already exists. A missing key means
+        the list is not loaded yet (or has expired), and it will be loaded
+        from database with the full data on its next read. Pushing into a
+        missing key would create a list that only has this single object.
+        """
+        conn = RedisClient.get_connection()
+        pipeline = conn.pipeline()
+        for key, obj in key_object_pairs:
+            pipeline.lpushx(key, DjangoModelSerializer.serialize(obj))
+            pipeline.ltrim(key, 0, settings.REDIS_LIST_LENGTH_LIMIT - 1)
+        pipeline.execute()
+
+    @classmethod
+    def push_object(cls, key, obj):
+        cls.push_objects([(key, obj)])
+
+    @classmethod
+    def get_counts(cls, keys, load_counts):
+        """
+        keys is a dict of {object id: counter key}. The counters missing in
+        cache are loaded by load_counts(missing_ids), which returns a dict of
+        {object id: count}, and are written into cache.
+        """
+        conn = RedisClient.get_connection()
+        object_ids = list(keys.keys())
+        if not object_ids:
+            return {}
+
+        counts = {}
+        missing_ids = []
+        values = conn.mget([keys[object_id] for object_id in object_ids])
+        for object_id, value in zip(object_ids, values):
+            if value is None:
+                missing_ids.append(object_id)
+            else:
+                counts[object_id] = int(value)
+
+        if missing_ids:
+            loaded_counts = load_counts(missing_ids)
+            pipeline = conn.pipeline()
+            for object_id in missing_ids:
+                counts[object_id] = loaded_counts.get(object_id, 0)
+                # nx: do not overwrite a counter loaded by another request
+                pipeline.set(
+                    keys[object_id],
+                    counts[object_id],
+                    ex=settings.REDIS_KEY_EXPIRE_TIME,
+                    nx=True,
+                )
+            pipeline.execute()
+        return counts
+
+    @classmethod
+    def incr_count(cls, key, amount=1, pipeline=None):
+        """
+        A missing counter is not created here, otherwise it would start from 0
+        instead of the real count. It is loaded from database on its next read.
+        Pass pipeline to run it in the transaction of the pipeline.
+        """
+        conn = RedisClient.get_connection()
+        script = conn.register_script(INCR_IF_EXISTS_SCRIPT)
+        script(keys=[key], args=[amount], client=pipeline or conn)
+
+    @classmethod
+    def decr_count(cls, key, amount=1):
+        cls.incr_count(key, -amount)
+
+    @classmethod
+    def acquire_lock(cls, key, expire_time):
+        """
+        Return the token of the lock, or None if it is held by someone else.
+        The token is needed to release the lock.
+        """
+        conn = RedisClient.get_connection()
+        token = uuid4().hex
+        if conn.set(key, token, ex=expire_time, nx=True):
+            return token
+        return None
+
+    @classmethod
+    def release_lock(cls, key, token):
+        conn = RedisClient.get_connection()
+        script = conn.register_script(RELEASE_LOCK_SCRIPT)
+        script(keys=[key], args=[token])
+
+    # an empty set can not be stored in redis, every cached id set contains
+    # this placeholder so that "no ids" is still a cache hit. 0 is never a
+    # valid primary key.
+    ID_SET_PLACEHOLDER = 0
+
+    @classmethod
+    def _load_id_set_to_cache(cls, conn, key, load_ids):
+        object_ids = set(load_ids())
+        pipeline = conn.pipeline()
+        pipeline.sadd(key, cls.ID_SET_PLACEHOLDER, *object_ids)
+        pipeline.expire(key, settings.REDIS_KEY_EXPIRE_TIME)
+        pipeline.execute()
+        return object_ids
+
+    @classmethod
+    def load_id_set(cls, key, load_ids):
+        """
+        Return the set of ids cached under key, load_ids() loads them from
+        database on cache miss.
+        """
+        conn = RedisClient.get_connection()
+        members = conn.smembers(key)
+        if not members:
+            return cls._load_id_set_to_cache(conn, key, load_ids)
+        object_ids = {int(member) for member in members}
+        object_ids.discard(cls.ID_SET_PLACEHOLDER)
+        return object_ids
+
+    @classmethod
+    def filter_id_set_members(cls, key, object_ids, load_ids):
+        """
+        Return the ids of object_ids which are in the id set under key,
+        without reading the whole set out of redis.
+        """
+        object_ids = list(object_ids)
+        if not object_ids:
+            return set()
+        conn = RedisClient.get_connection()
+        if not conn.exists(key):
+            return cls._load_id_set_to_cache(conn, key, load_ids) & set(object_ids)
+
+        pipeline = conn.pipeline()
+        for object_id in object_ids:
+            pipeline.sismember(key, object_id)
+        return {
+            object_id
+            for object_id, is_member in zip(object_ids, pipeline.execute())
+            if is_member
+        }
@@ -0,0 +1,16 @@
+from django.core import serializers
+from utils.json_encoder import JSONEncoder
+
+
+class DjangoModelSerializer:
+
+    @classmethod
+    def serialize(cls, instance):
+        # django serializers only accept a QuerySet or a list as input
+        return serializers.serialize('json', [instance], cls=JSONEncoder)
+
+    @classmethod
+    def deserialize(cls, serialized_data):
+        # .object is needed to get the original model instance, otherwise a
+        # DeserializedObject is returned
+        return list(serializers.deserialize('json', serialized_data))[0].object
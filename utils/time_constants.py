@@ -0,0 +1,2 @@
+ONE_MINUTE = 60
+ONE_HOUR = 60 * ONE_MINUTE